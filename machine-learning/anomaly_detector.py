@@ -4,77 +4,185 @@ Uses IsolationForest to detect outliers in sensor readings.
 """
 
 import json
-import joblib
 import os
+import queue
 import sys
+import threading
+import time
+from collections import deque
 from pathlib import Path
-from typing import Dict, List
+from typing import Deque, Dict, List, Optional, TextIO, Tuple
 
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 
+from anomaly_partitions import (
+    DEFAULT_CLIMATE_CLUSTERS,
+    GLOBAL_PARTITION,
+    get_partitioned_models,
+    train_partitioned_detectors,
+)
+from chunked_training import RESERVOIR_SIZE, sensor_columns, train_detector_chunked
+from compact_dtypes import compact_dtypes_enabled, compact_frame, read_training_csv
+from model_bundle import load_bundle, write_bundle
+from panel_prefilter import PanelStatsStore, prefilter_scores
+from resource_profile import stage
+from temporal_features import (
+    TEMPORAL_BASE_FEATURES,
+    TEMPORAL_WINDOWS,
+    TemporalFeatureStore,
+    add_temporal_features,
+    temporal_feature_names,
+)
+from thread_budget import apply_thread_budget, cap_estimator_jobs, get_budget
+from wire_format import parse_format_flag, read_request, write_response
+
 MODELS_DIR = Path(__file__).parent / "models"
-ANOMALY_MODEL_PATH = MODELS_DIR / "anomaly_detector.pkl"
-SCALER_PATH = MODELS_DIR / "anomaly_scaler.pkl"
+ANOMALY_BUNDLE_PATH = MODELS_DIR / "anomaly.bundle"
+CONTAMINATION = 0.05
+
+# Streaming mode: a micro-batch is scored when it is full or its oldest
+# reading has waited this long
+STREAM_MAX_BATCH = 256
+STREAM_MAX_WAIT_SECONDS = 0.05
+STREAM_QUEUE_SIZE = 10000  # Readings buffered before the reader blocks
+STREAM_STATS_INTERVAL_SECONDS = 10.0
+STREAM_LAG_WINDOW = 10000  # Most recent readings in the queue lag percentiles
+
+
+SENSOR_FEATURE_CANDIDATES = [
+    "T2M",
+    "RH2M",
+    "WS10M",
+    "WD10M",
+    "ghi",
+    "dni",
+    "dhi",
+    "poa_global",
+]
+
+
+def _default_data_path() -> str:
+    return os.path.join(
+        os.path.dirname(__file__),
+        "dataForML",
+        "POWER_Point_Hourly_20250902_20251104_040d79N_073d95W_LST_prepared.csv",
+    )
 
 
-def train_anomaly_detector(data_csv_path: str = None):
+def load_sensor_data(data_path: str, compact: bool = False) -> pd.DataFrame:
     """
-    Train anomaly detector on historical sensor data.
-
-    Args:
-        data_csv_path: Path to CSV with sensor readings (temp, voltage, current, irradiance)
+    Read a prepared CSV or a synthetic corpus directory (already stored in
+    compact dtypes; see compact_dtypes for the CSV).
     """
-    if data_csv_path is None:
-        data_csv_path = os.path.join(
-            os.path.dirname(__file__),
-            "dataForML",
-            "POWER_Point_Hourly_20250902_20251104_040d79N_073d95W_LST_prepared.csv",
-        )
+    if os.path.isdir(data_path):
+        from synthetic_corpus import load_corpus
 
-    print(f"Loading data from {data_csv_path}...")
-    df = pd.read_csv(data_csv_path)
+        return load_corpus(data_path)
+    return read_training_csv(data_path, compact)
 
-    # Select sensor-like features
-    sensor_features = []
-    for col in ["T2M", "RH2M", "WS10M", "WD10M", "ghi", "dni", "dhi", "poa_global"]:
-        if col in df.columns:
-            sensor_features.append(col)
 
+def select_sensor_features(df: pd.DataFrame) -> List[str]:
+    """Sensor-like columns available in the data, in a fixed order."""
+    sensor_features = [col for col in SENSOR_FEATURE_CANDIDATES if col in df.columns]
     if not sensor_features:
         raise ValueError("No sensor features found in data")
+    return sensor_features
+
 
-    X = df[sensor_features].dropna()
-    print(f"Training on {len(X)} samples with features: {sensor_features}")
+def fit_detector(X, n_jobs: int):
+    """
+    Standardize X and fit an IsolationForest on it.
 
-    # Standardize features
+    Returns:
+        (model, scaler, X_scaled)
+    """
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
 
-    # Train Isolation Forest
     # contamination=0.05 means we expect ~5% of data to be anomalies
     model = IsolationForest(
-        contamination=0.05,
+        contamination=CONTAMINATION,
         random_state=42,
         n_estimators=100,
         max_samples="auto",
-        n_jobs=-1,
+        n_jobs=n_jobs,
     )
     model.fit(X_scaled)
+    return model, scaler, X_scaled
+
+
+def train_anomaly_detector(
+    data_csv_path: str = None, temporal: bool = False, compact: Optional[bool] = None
+):
+    """
+    Train anomaly detector on historical sensor data.
+
+    Args:
+        data_csv_path: Path to CSV with sensor readings (temp, voltage, current, irradiance)
+        temporal: Also train on per-panel lag, delta and rolling window
+            features (see temporal_features); readings must then be in time
+            order within each panel
+        compact: Train on float32 features (see compact_dtypes; default:
+            SOLAR_ML_COMPACT_DTYPES)
+    """
+    compact = compact_dtypes_enabled(compact)
+    if data_csv_path is None:
+        data_csv_path = _default_data_path()
+
+    print(f"Loading data from {data_csv_path}...")
+    with stage("data_loading"):
+        df = load_sensor_data(data_csv_path, compact)
+
+    # Select sensor-like features
+    sensor_features = select_sensor_features(df)
+
+    metadata = {}
+    with stage("feature_engineering"):
+        if temporal:
+            base = [f for f in TEMPORAL_BASE_FEATURES if f in sensor_features]
+            df = add_temporal_features(
+                df.dropna(subset=sensor_features), base, TEMPORAL_WINDOWS
+            )
+            sensor_features = sensor_features + temporal_feature_names(
+                base, TEMPORAL_WINDOWS
+            )
+            metadata["temporal"] = {
+                "base_features": base,
+                "windows": list(TEMPORAL_WINDOWS),
+            }
+        if compact:
+            compact_frame(df)
+        X = df[sensor_features].dropna()
+        print(f"Training on {len(X)} samples with features: {sensor_features}")
+
+    # Standardize features and train Isolation Forest
+    with stage("fit"):
+        model, scaler, X_scaled = fit_detector(X, n_jobs=get_budget("training"))
 
     # Save model and scaler
-    os.makedirs(MODELS_DIR, exist_ok=True)
-    joblib.dump(model, ANOMALY_MODEL_PATH)
-    joblib.dump(scaler, SCALER_PATH)
-    joblib.dump(sensor_features, MODELS_DIR / "anomaly_features.pkl")
+    with stage("serialize"):
+        write_bundle(
+            ANOMALY_BUNDLE_PATH,
+            "anomaly",
+            {"model": model, "scaler": scaler},
+            features=sensor_features,
+            metadata={
+                "model_type": "IsolationForest",
+                "training_rows": len(X),
+                "contamination_rate": CONTAMINATION,
+                "data_path": str(data_csv_path),
+                **metadata,
+            },
+        )
 
-    print(f"Anomaly detector saved to {ANOMALY_MODEL_PATH}")
-    print(f"Scaler saved to {SCALER_PATH}")
+    print(f"Anomaly detector and scaler saved to {ANOMALY_BUNDLE_PATH}")
 
     # Test on training data to show stats
-    predictions = model.predict(X_scaled)
+    with stage("predict"):
+        predictions = model.predict(X_scaled)
     anomaly_count = (predictions == -1).sum()
     print(
         f"Detected {anomaly_count} anomalies in training data ({anomaly_count/len(X)*100:.2f}%)"
@@ -83,53 +191,290 @@ def train_anomaly_detector(data_csv_path: str = None):
     return model, scaler, sensor_features
 
 
-def detect_anomalies(sensor_data: List[Dict]) -> Dict:
+def train_anomaly_detector_chunked(
+    data_path: str = None, sample_size: int = RESERVOIR_SIZE
+):
+    """
+    Train the anomaly detector without loading the whole source: the scaler
+    sees every row, the forest a reservoir sample of sample_size rows, and
+    the contamination threshold is set from a streamed scoring pass (see
+    chunked_training).
+
+    Args:
+        data_path: Prepared CSV or synthetic corpus directory
+        sample_size: Rows kept for fitting the forest
+    """
+    if data_path is None:
+        data_path = _default_data_path()
+
+    sensor_features = select_sensor_features(
+        pd.DataFrame(columns=sensor_columns(data_path))
+    )
+    print(
+        f"Streaming {data_path} with features {sensor_features} "
+        f"(sample of {sample_size} rows)..."
+    )
+    with stage("fit"):
+        model, scaler, stats = train_detector_chunked(
+            data_path,
+            sensor_features,
+            CONTAMINATION,
+            n_jobs=get_budget("training"),
+            sample_size=sample_size,
+        )
+
+    with stage("serialize"):
+        write_bundle(
+            ANOMALY_BUNDLE_PATH,
+            "anomaly",
+            {"model": model, "scaler": scaler},
+            features=sensor_features,
+            metadata={
+                "model_type": "IsolationForest",
+                "training_rows": stats["training_rows"],
+                "contamination_rate": CONTAMINATION,
+                "data_path": str(data_path),
+                "chunked_training": stats,
+            },
+        )
+
+    print(f"Anomaly detector and scaler saved to {ANOMALY_BUNDLE_PATH}")
+    print(
+        f"Detected {stats['flagged_share'] * 100:.2f}% anomalies in training data "
+        f"({stats['training_rows']} rows)"
+    )
+    return model, scaler, sensor_features
+
+
+def train_partitioned_anomaly_detectors(
+    data_path: str = None,
+    partition_by: str = "site",
+    n_clusters: int = DEFAULT_CLIMATE_CLUSTERS,
+) -> Dict:
+    """
+    Train one anomaly detector per site or per climate cluster.
+
+    Args:
+        data_path: Prepared CSV or synthetic corpus directory with readings
+            from several sites (latitude/longitude or site_id columns)
+        partition_by: "site" or "climate"
+        n_clusters: Number of climate clusters
+    """
+    if data_path is None:
+        from synthetic_corpus import CORPUS_DIR
+
+        data_path = str(CORPUS_DIR) if CORPUS_DIR.exists() else _default_data_path()
+
+    print(f"Loading data from {data_path}...")
+    with stage("data_loading"):
+        df = load_sensor_data(data_path)
+
+    with stage("fit"):
+        return train_partitioned_detectors(
+            df,
+            select_sensor_features(df),
+            partition_by=partition_by,
+            n_clusters=n_clusters,
+            data_path=str(data_path),
+        )
+
+
+def input_features(bundle) -> List[str]:
+    """Features a reading must carry: the bundle's, minus derived temporal ones."""
+    temporal = bundle.metadata.get("temporal")
+    if temporal is None:
+        return bundle.features
+    derived = set(
+        temporal_feature_names(temporal["base_features"], temporal["windows"])
+    )
+    return [f for f in bundle.features if f not in derived]
+
+
+def load_temporal_store(bundle) -> Optional[TemporalFeatureStore]:
+    """The saved per-panel buffers if the bundle uses temporal features."""
+    temporal = bundle.metadata.get("temporal")
+    if temporal is None:
+        return None
+    return TemporalFeatureStore.load(temporal["base_features"], temporal["windows"])
+
+
+def with_temporal_features(
+    df: pd.DataFrame, store: Optional[TemporalFeatureStore]
+) -> pd.DataFrame:
+    if store is None:
+        return df
+    return add_temporal_features(df, store.base_features, store.windows, store)
+
+
+def score_samples(model, X_scaled: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score standardized readings with a single pass over the forest.
+
+    Returns:
+        (predictions, scores): -1 for anomaly and 1 for normal, and the
+        decision scores (more negative = more anomalous). Same as
+        model.predict / model.decision_function, which would each walk the
+        trees.
+    """
+    scores = model.decision_function(X_scaled)
+    predictions = np.where(scores < 0, -1, 1)
+    return predictions, scores
+
+
+def score_readings(
+    df: pd.DataFrame,
+    global_bundle,
+    panel_ids: Optional[List] = None,
+    store: Optional[PanelStatsStore] = None,
+):
+    """
+    Score readings with the global model or, when partitioned models exist and
+    the readings carry a site, with their partition's model. Readings are
+    grouped so each model is called once.
+
+    Returns:
+        (predictions, scores, cleared, partitions): cleared is None unless a
+        pre-filter store is given; partitions (the model used per reading) is
+        None when partitioned models are not in play
+    """
+    n_rows = len(df)
+    models = get_partitioned_models()
+    partitions = models.partitions_of(df) if models is not None else None
+    if partitions is None:
+        groups = {GLOBAL_PARTITION: np.arange(n_rows)}
+    else:
+        keys, inverse = np.unique(partitions, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        groups = dict(zip(keys, np.split(order, np.cumsum(np.bincount(inverse))[:-1])))
+
+    predictions = np.ones(n_rows, dtype=int)
+    scores = np.full(n_rows, np.nan)
+    cleared = np.zeros(n_rows, dtype=bool)
+    for partition, rows in groups.items():
+        bundle = models.bundle(partition) if partitions is not None else None
+        if bundle is None:
+            bundle = global_bundle
+            if partitions is not None:
+                partitions[rows] = GLOBAL_PARTITION
+        model = cap_estimator_jobs(bundle.get("model"), get_budget("serving"))
+        X = df[bundle.features].to_numpy()[rows]
+
+        if store is not None:
+            (
+                predictions[rows],
+                scores[rows],
+                cleared[rows],
+            ) = prefilter_scores(model, bundle, X, [panel_ids[i] for i in rows], store)
+        else:
+            predictions[rows], scores[rows] = score_samples(model, bundle.scale(X))
+
+    return predictions, scores, (cleared if store is not None else None), partitions
+
+
+def detect_anomalies(
+    sensor_data: List[Dict], columnar: bool = False, prefilter: bool = False
+) -> Dict:
     """
     Detect anomalies in sensor readings.
 
     Args:
-        sensor_data: List of dicts with sensor readings
+        sensor_data: List of dicts with sensor readings, or a dict of arrays
+            with one entry per feature
+        columnar: Return the per-reading results as a dict of arrays instead
+            of one dict per reading
+        prefilter: Clear readings that are normal for their panel (requires a
+            "panel_id" per reading) before the IsolationForest sees them; see
+            panel_prefilter. Cleared readings have no anomaly score.
 
     Returns:
         Dict with anomaly predictions and scores
     """
-    # Load model and scaler
-    if not ANOMALY_MODEL_PATH.exists():
+    # Load model bundle
+    if not ANOMALY_BUNDLE_PATH.exists():
         return {
             "error": "Anomaly detector model not found. Please train first.",
-            "model_path": str(ANOMALY_MODEL_PATH),
+            "model_path": str(ANOMALY_BUNDLE_PATH),
         }
 
-    model = joblib.load(ANOMALY_MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    feature_names = joblib.load(MODELS_DIR / "anomaly_features.pkl")
+    bundle = load_bundle(ANOMALY_BUNDLE_PATH)
+    feature_names = bundle.features
 
     # Convert to DataFrame
     df = pd.DataFrame(sensor_data)
 
     # Extract features in correct order
-    missing_features = [f for f in feature_names if f not in df.columns]
+    required_features = input_features(bundle)
+    missing_features = [f for f in required_features if f not in df.columns]
     if missing_features:
         return {
             "error": f"Missing features: {missing_features}",
-            "required_features": feature_names,
+            "required_features": required_features,
+        }
+    values = df[required_features].apply(pd.to_numeric, errors="coerce")
+    invalid_features = [
+        f for f in required_features if not np.isfinite(values[f].to_numpy(float)).all()
+    ]
+    if invalid_features:
+        return {
+            "error": f"Missing or non-numeric values in: {invalid_features}",
+            "required_features": required_features,
         }
 
-    X = df[feature_names].values
-
-    # Standardize
-    X_scaled = scaler.transform(X)
+    store = None
+    if prefilter:
+        if "panel_id" not in df.columns:
+            return {"error": "The pre-filter needs a 'panel_id' for every reading"}
+        store = PanelStatsStore.load(feature_names)
 
-    # Predict: -1 for anomaly, 1 for normal
-    predictions = model.predict(X_scaled)
+    # Lag/rolling features continue from the panels' earlier readings
+    temporal_store = load_temporal_store(bundle)
+    df = with_temporal_features(df, temporal_store)
 
-    # Decision scores (more negative = more anomalous)
-    scores = model.decision_function(X_scaled)
+    # Standardize and score, per site partition when partitioned models exist
+    predictions, scores, cleared, partitions = score_readings(
+        df, bundle, df["panel_id"].tolist() if prefilter else None, store
+    )
+    # The panels' state only advances once the readings have been scored
+    if temporal_store is not None:
+        temporal_store.save()
+    if store is not None:
+        store.save()
+
+    if columnar:
+        is_anomaly = predictions == -1
+        anomaly_count = int(is_anomaly.sum())
+        results = {
+            "index": np.arange(len(scores)),
+            "is_anomaly": is_anomaly,
+            "anomaly_score": scores,
+            "confidence": 1 / (1 + np.exp(scores)),
+        }
+        if cleared is not None:
+            results["prefiltered"] = cleared
+        if partitions is not None:
+            results["partition"] = partitions
+        return {
+            "status": "success",
+            "total_samples": len(scores),
+            "anomalies_detected": anomaly_count,
+            "anomaly_rate": anomaly_count / len(scores) if len(scores) else 0.0,
+            "results": results,
+            **_prefilter_summary(cleared),
+            "model_info": _model_info(bundle, feature_names, partitions),
+        }
 
     results = []
     for i, (pred, score) in enumerate(zip(predictions, scores)):
-        results.append(
-            {
+        if cleared is not None and cleared[i]:
+            result = {
+                "index": i,
+                "is_anomaly": False,
+                "anomaly_score": None,
+                "confidence": None,
+                "prefiltered": True,
+            }
+        else:
+            result = {
                 "index": i,
                 "is_anomaly": bool(pred == -1),
                 "anomaly_score": float(score),
@@ -137,7 +482,9 @@ def detect_anomalies(sensor_data: List[Dict]) -> Dict:
                     1 / (1 + np.exp(score))
                 ),  # Convert to 0-1 probability
             }
-        )
+        if partitions is not None:
+            result["partition"] = str(partitions[i])
+        results.append(result)
 
     anomaly_count = sum(1 for r in results if r["is_anomaly"])
 
@@ -147,30 +494,326 @@ def detect_anomalies(sensor_data: List[Dict]) -> Dict:
         "anomalies_detected": anomaly_count,
         "anomaly_rate": anomaly_count / len(results) if results else 0.0,
         "results": results,
-        "model_info": {
-            "model_type": "IsolationForest",
-            "features_used": feature_names,
-            "contamination_rate": 0.05,
-        },
+        **_prefilter_summary(cleared),
+        "model_info": _model_info(bundle, feature_names, partitions),
+    }
+
+
+def _prefilter_summary(cleared: Optional[np.ndarray]) -> Dict:
+    if cleared is None:
+        return {}
+    return {
+        "prefiltered_samples": int(cleared.sum()),
+        "prefiltered_share": float(cleared.mean()) if len(cleared) else 0.0,
     }
 
 
+def _model_info(
+    bundle, feature_names: List[str], partitions: Optional[np.ndarray] = None
+) -> Dict:
+    info = {
+        "model_type": "IsolationForest",
+        "features_used": feature_names,
+        "contamination_rate": bundle.metadata.get("contamination_rate", CONTAMINATION),
+    }
+    if partitions is not None:
+        info["partitions_used"] = sorted(set(partitions.tolist()))
+        info["partition_cache"] = get_partitioned_models().cache_info()
+    return info
+
+
+class StreamStats:
+    """Throughput and queue lag of the streaming consumer."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.readings = 0
+        self.batches = 0
+        self.errors = 0
+        self.anomalies = 0
+        self.prefiltered = 0
+        # Seconds from read to verdict of the latest readings
+        self.lags: Deque[float] = deque(maxlen=STREAM_LAG_WINDOW)
+        self.max_lag = 0.0
+
+    def record(self, received_at: List[float], verdicts: List[Dict]):
+        now = time.perf_counter()
+        self.readings += len(verdicts)
+        self.batches += 1
+        self.errors += sum(1 for v in verdicts if "error" in v)
+        self.anomalies += sum(1 for v in verdicts if v.get("is_anomaly"))
+        self.prefiltered += sum(1 for v in verdicts if v.get("prefiltered"))
+        lags = [now - t for t in received_at]
+        self.lags.extend(lags)
+        self.max_lag = max([self.max_lag] + lags)
+
+    def summary(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        lags_ms = np.array(self.lags) * 1000 if self.lags else np.zeros(1)
+        return {
+            "readings": self.readings,
+            "batches": self.batches,
+            "anomalies": self.anomalies,
+            "errors": self.errors,
+            "prefiltered": self.prefiltered,
+            "mean_batch_size": self.readings / self.batches if self.batches else 0.0,
+            "elapsed_seconds": elapsed,
+            "throughput_per_second": self.readings / elapsed if elapsed > 0 else 0.0,
+            "queue_lag_ms": {
+                "p50": float(np.percentile(lags_ms, 50)),
+                "p95": float(np.percentile(lags_ms, 95)),
+                "max": self.max_lag * 1000,
+                "window": len(self.lags),
+            },
+        }
+
+
+def _read_stream(stream: TextIO, readings: queue.Queue):
+    """Reader thread: queue every non-empty line with its arrival time."""
+    try:
+        for line in stream:
+            if line.strip():
+                readings.put((time.perf_counter(), line))
+    finally:
+        readings.put(None)  # End of stream
+
+
+def _next_batch(
+    readings: queue.Queue, max_batch: int, max_wait: float
+) -> Tuple[List[Tuple[float, str]], bool]:
+    """
+    Block for the next reading, then collect more until the batch is full or
+    max_wait has passed since that first reading arrived.
+
+    Returns:
+        (batch, end_of_stream)
+    """
+    first = readings.get()
+    if first is None:
+        return [], True
+
+    batch = [first]
+    deadline = first[0] + max_wait
+    while len(batch) < max_batch:
+        timeout = deadline - time.perf_counter()
+        try:
+            item = (
+                readings.get(timeout=timeout) if timeout > 0 else readings.get_nowait()
+            )
+        except queue.Empty:
+            break
+        if item is None:
+            return batch, True
+        batch.append(item)
+    return batch, False
+
+
+def score_stream_batch(
+    lines: List[str],
+    first_index: int,
+    store: Optional[PanelStatsStore] = None,
+    temporal_store: Optional[TemporalFeatureStore] = None,
+) -> List[Dict]:
+    """
+    Score a micro-batch of NDJSON readings in one vectorized call.
+
+    Each reading gets a verdict carrying its stream index (and its "id", if
+    it had one); readings that are not valid JSON or lack a feature get an
+    error verdict instead of failing the batch. With a panel statistics
+    store, readings are pre-filtered per "panel_id" first. A bundle trained
+    on temporal features needs the temporal_store that run_stream keeps.
+    """
+    bundle = load_bundle(ANOMALY_BUNDLE_PATH)  # Reloaded only if retrained
+    feature_names = input_features(bundle)
+
+    verdicts: List[Optional[Dict]] = [None] * len(lines)
+    valid_rows, valid_positions, panel_ids = [], [], []
+    for position, line in enumerate(lines):
+        verdict = {"index": first_index + position}
+        try:
+            reading = json.loads(line)
+            if not isinstance(reading, dict):
+                raise ValueError("Expected a JSON object per line")
+        except ValueError as e:
+            verdicts[position] = {**verdict, "error": f"Invalid JSON input: {e}"}
+            continue
+
+        if "id" in reading:
+            verdict["id"] = reading["id"]
+        missing = [f for f in feature_names if reading.get(f) is None]
+        if store is not None and reading.get("panel_id") is None:
+            missing.append("panel_id")
+        if missing:
+            verdicts[position] = {**verdict, "error": f"Missing features: {missing}"}
+            continue
+
+        verdicts[position] = verdict
+        valid_rows.append(reading)
+        valid_positions.append(position)
+        panel_ids.append(reading.get("panel_id"))
+
+    if valid_rows:
+        df = with_temporal_features(pd.DataFrame(valid_rows), temporal_store)
+        predictions, scores, cleared, partitions = score_readings(
+            df, bundle, panel_ids, store
+        )
+        if cleared is None:
+            cleared = np.zeros(len(valid_rows), dtype=bool)
+        if partitions is not None:
+            for position, partition in zip(valid_positions, partitions.tolist()):
+                verdicts[position]["partition"] = partition
+        confidences = 1 / (1 + np.exp(scores))
+        for position, pred, score, confidence, skip in zip(
+            valid_positions, predictions, scores, confidences, cleared
+        ):
+            if skip:
+                verdicts[position].update(
+                    {
+                        "is_anomaly": False,
+                        "anomaly_score": None,
+                        "confidence": None,
+                        "prefiltered": True,
+                    }
+                )
+                continue
+            verdicts[position].update(
+                {
+                    "is_anomaly": bool(pred == -1),
+                    "anomaly_score": float(score),
+                    "confidence": float(confidence),
+                }
+            )
+
+    return verdicts
+
+
+def run_stream(
+    input_stream: TextIO = sys.stdin,
+    output_stream: TextIO = sys.stdout,
+    max_batch: int = STREAM_MAX_BATCH,
+    max_wait: float = STREAM_MAX_WAIT_SECONDS,
+    prefilter: bool = False,
+) -> Dict:
+    """
+    Streaming consumer: read NDJSON sensor readings until end of input and
+    write one NDJSON verdict per reading, in input order.
+
+    A reader thread keeps pulling lines while a micro-batch is being scored.
+    Throughput and queue lag are reported on stderr periodically and at the
+    end of the stream. With prefilter, the per-panel statistics (and, for a
+    bundle trained on temporal features, the per-panel buffers) are saved at
+    the same points.
+
+    Returns:
+        The final StreamStats summary
+    """
+    if not ANOMALY_BUNDLE_PATH.exists():
+        raise FileNotFoundError(
+            f"Anomaly detector model not found at {ANOMALY_BUNDLE_PATH}. "
+            "Please train first."
+        )
+    bundle = load_bundle(ANOMALY_BUNDLE_PATH)
+    bundle.get("model")  # Load before the first reading
+    store = PanelStatsStore.load(bundle.features) if prefilter else None
+    temporal_store = load_temporal_store(bundle)
+
+    readings: queue.Queue = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    reader = threading.Thread(
+        target=_read_stream, args=(input_stream, readings), daemon=True
+    )
+    reader.start()
+
+    stats = StreamStats()
+    next_report = time.perf_counter() + STREAM_STATS_INTERVAL_SECONDS
+    end_of_stream = False
+    while not end_of_stream:
+        batch, end_of_stream = _next_batch(readings, max_batch, max_wait)
+        if not batch:
+            continue
+
+        received_at = [t for t, _ in batch]
+        verdicts = score_stream_batch(
+            [line for _, line in batch], stats.readings, store, temporal_store
+        )
+        output_stream.write("".join(json.dumps(v) + "\n" for v in verdicts))
+        output_stream.flush()
+        stats.record(received_at, verdicts)
+
+        if time.perf_counter() >= next_report:
+            print(json.dumps({"stream_stats": stats.summary()}), file=sys.stderr)
+            for state in (store, temporal_store):
+                if state is not None:
+                    state.save()
+            next_report = time.perf_counter() + STREAM_STATS_INTERVAL_SECONDS
+
+    for state in (store, temporal_store):
+        if state is not None:
+            state.save()
+    summary = stats.summary()
+    print(json.dumps({"stream_stats": summary}), file=sys.stderr)
+    return summary
+
+
 def main():
     """
     Main entry point for CLI and stdin/stdout interface.
     Modes:
-      - train: Train the anomaly detector
+      - train [data_path] [--temporal]: Train the anomaly detector, optionally
+        on temporal features as well (see temporal_features)
+      - train-chunked [data_path] [sample_size]: Train on a source too large
+        for memory (see chunked_training)
+      - train-partitioned [data_path] [site|climate] [n_clusters]: Train one
+        detector per site or climate cluster (see anomaly_partitions)
+      - stream: Score an unbounded NDJSON stream of readings (stdin -> stdout)
       - predict: Detect anomalies in provided sensor data (JSON via stdin)
+    Prediction mode accepts --format json|columnar|binary (see wire_format).
+    Prediction and stream modes accept --prefilter (see panel_prefilter).
     """
-    if len(sys.argv) > 1 and sys.argv[1] == "train":
+    try:
+        fmt, args = parse_format_flag(sys.argv[1:])
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    prefilter = "--prefilter" in args
+    temporal = "--temporal" in args
+    args = [arg for arg in args if arg not in ("--prefilter", "--temporal")]
+
+    if args and args[0] == "train":
         # Training mode
-        data_path = sys.argv[2] if len(sys.argv) > 2 else None
-        train_anomaly_detector(data_path)
+        apply_thread_budget("training")
+        data_path = args[1] if len(args) > 1 else None
+        train_anomaly_detector(data_path, temporal=temporal)
+        return
+
+    if args and args[0] == "train-chunked":
+        apply_thread_budget("training")
+        data_path = args[1] if len(args) > 1 and args[1] else None
+        sample_size = int(args[2]) if len(args) > 2 else RESERVOIR_SIZE
+        train_anomaly_detector_chunked(data_path, sample_size)
+        return
+
+    if args and args[0] == "train-partitioned":
+        apply_thread_budget("training")
+        data_path = args[1] if len(args) > 1 and args[1] else None
+        partition_by = args[2] if len(args) > 2 else "site"
+        n_clusters = int(args[3]) if len(args) > 3 else DEFAULT_CLIMATE_CLUSTERS
+        train_partitioned_anomaly_detectors(data_path, partition_by, n_clusters)
+        return
+
+    if args and args[0] == "stream":
+        # Streaming mode: one JSON reading per line in, one verdict per line out
+        apply_thread_budget("serving")
+        try:
+            run_stream(prefilter=prefilter)
+        except FileNotFoundError as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
         return
 
     # Prediction mode (default)
+    apply_thread_budget("serving")
     try:
-        input_data = json.loads(sys.stdin.read())
+        input_data = read_request(fmt, "sensor_data")
 
         # Expect input like: {"sensor_data": [{...}, {...}]}
         if "sensor_data" not in input_data:
@@ -184,8 +827,10 @@ def main():
             )
             sys.exit(1)
 
-        result = detect_anomalies(input_data["sensor_data"])
-        print(json.dumps(result, indent=2))
+        result = detect_anomalies(
+            input_data["sensor_data"], columnar=fmt != "json", prefilter=prefilter
+        )
+        write_response(result, fmt)
 
     except json.JSONDecodeError as e:
         print(json.dumps({"error": f"Invalid JSON input: {str(e)}"}))
@@ -0,0 +1,270 @@
+"""
+Partitioned Anomaly Models
+One IsolationForest per site (or per climate cluster of sites), trained in
+parallel and stored as anomaly bundles under a partition index, so each site
+is judged against its own normal conditions rather than the New York data
+the global model was trained on.
+
+At serve time partition bundles are loaded lazily into a size-bounded LRU
+cache; readings from sites without a partition use the global model.
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from model_bundle import ModelBundle, write_bundle
+from thread_budget import get_budget
+
+MODELS_DIR = Path(__file__).parent / "models"
+PARTITIONS_DIR = MODELS_DIR / "anomaly_partitions"
+PARTITION_INDEX_PATH = PARTITIONS_DIR / "index.json"
+
+# Partition bundles kept in memory at once
+PARTITION_CACHE_SIZE = int(os.environ.get("SOLAR_ML_ANOMALY_CACHE_SIZE", 32))
+GLOBAL_PARTITION = "global"
+MIN_PARTITION_ROWS = 200  # Smaller partitions are left to the global model
+DEFAULT_CLIMATE_CLUSTERS = 8
+# Per-site means used to group sites into climate clusters
+CLIMATE_FEATURES = ["abs_latitude", "ghi", "temp_air", "humidity"]
+
+
+def site_keys(df: pd.DataFrame) -> Optional[np.ndarray]:
+    """
+    Site of every row: its "site_id" if present, else its coordinates rounded
+    to 0.01 degrees. None when the rows carry neither.
+    """
+    if "site_id" in df.columns:
+        return df["site_id"].astype(str).to_numpy()
+    if {"latitude", "longitude"}.issubset(df.columns):
+        return np.array(
+            [
+                f"{lat:.2f},{lon:.2f}"
+                for lat, lon in zip(df["latitude"].tolist(), df["longitude"].tolist())
+            ]
+        )
+    return None
+
+
+def assign_partitions(
+    df: pd.DataFrame, sites: np.ndarray, partition_by: str, n_clusters: int
+) -> Dict[str, str]:
+    """Map every site to its partition ("site" or "climate" partitioning)."""
+    unique_sites = np.unique(sites)
+    if partition_by == "site":
+        return {site: site for site in unique_sites}
+    if partition_by != "climate":
+        raise ValueError(f"Unknown partitioning: {partition_by}. Use site or climate")
+
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
+    climate = df.assign(abs_latitude=df["latitude"].abs(), _site=sites)
+    missing = [c for c in CLIMATE_FEATURES if c not in climate.columns]
+    if missing:
+        raise ValueError(f"Climate partitioning needs columns {missing}")
+    summary = climate.groupby("_site")[CLIMATE_FEATURES].mean()
+
+    n_clusters = min(n_clusters, len(summary))
+    labels = KMeans(n_clusters=n_clusters, n_init=10, random_state=42).fit_predict(
+        StandardScaler().fit_transform(summary)
+    )
+    return {site: f"climate-{label}" for site, label in zip(summary.index, labels)}
+
+
+def _train_partition(
+    partition: str, X: np.ndarray, features: List[str], path: str, sites: int
+) -> Dict:
+    """Fit and save one partition's detector (runs in a worker process)."""
+    from anomaly_detector import CONTAMINATION, fit_detector
+
+    model, scaler, _ = fit_detector(X, n_jobs=1)
+    write_bundle(
+        Path(path),
+        "anomaly",
+        {"model": model, "scaler": scaler},
+        features=features,
+        metadata={
+            "model_type": "IsolationForest",
+            "partition": partition,
+            "training_rows": len(X),
+            "sites": sites,
+            "contamination_rate": CONTAMINATION,
+        },
+    )
+    return {"file": Path(path).name, "rows": len(X), "sites": sites}
+
+
+def train_partitioned_detectors(
+    df: pd.DataFrame,
+    features: List[str],
+    partition_by: str = "site",
+    n_clusters: int = DEFAULT_CLIMATE_CLUSTERS,
+    output_dir: Path = PARTITIONS_DIR,
+    workers: Optional[int] = None,
+    data_path: Optional[str] = None,
+) -> Dict:
+    """
+    Train one detector per partition in parallel and write the partition
+    index.
+
+    Returns:
+        The partition index
+    """
+    start = time.time()
+    sites = site_keys(df)
+    if sites is None:
+        raise ValueError(
+            "Partitioned training needs a site_id or latitude/longitude columns"
+        )
+    site_partitions = assign_partitions(df, sites, partition_by, n_clusters)
+    row_partitions = np.array([site_partitions[s] for s in sites])
+
+    X_all = df[features].to_numpy(dtype=float)
+    valid = ~np.isnan(X_all).any(axis=1)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    jobs = {}
+    for number, partition in enumerate(np.unique(row_partitions)):
+        rows = (row_partitions == partition) & valid
+        if rows.sum() < MIN_PARTITION_ROWS:
+            print(f"  Skipping {partition}: {rows.sum()} rows")
+            continue
+        jobs[partition] = (
+            X_all[rows],
+            str(output_dir / f"partition_{number:05d}.bundle"),
+            len(np.unique(sites[rows])),
+        )
+
+    workers = workers or get_budget("training")
+    print(f"Training {len(jobs)} {partition_by} partitions on {workers} workers...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            partition: executor.submit(
+                _train_partition, partition, X, features, path, n_sites
+            )
+            for partition, (X, path, n_sites) in jobs.items()
+        }
+        partitions = {
+            partition: future.result() for partition, future in futures.items()
+        }
+
+    index = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "partition_by": partition_by,
+        "n_clusters": n_clusters if partition_by == "climate" else None,
+        "features": features,
+        "data_path": data_path,
+        "sites": {
+            site: partition
+            for site, partition in site_partitions.items()
+            if partition in partitions
+        },
+        "partitions": partitions,
+    }
+    tmp_path = output_dir / (PARTITION_INDEX_PATH.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, output_dir / PARTITION_INDEX_PATH.name)
+
+    # Bundles from earlier runs that the new index no longer references
+    current = {entry["file"] for entry in partitions.values()}
+    for path in output_dir.glob("partition_*.bundle"):
+        if path.name not in current:
+            path.unlink()
+
+    print(
+        f"Saved {len(partitions)} partition models and index to {output_dir} "
+        f"in {time.time() - start:.1f}s"
+    )
+    return index
+
+
+class PartitionedAnomalyModels:
+    """Partition index plus an LRU cache of loaded partition bundles."""
+
+    def __init__(
+        self,
+        index_path: Path = PARTITION_INDEX_PATH,
+        cache_size: int = PARTITION_CACHE_SIZE,
+    ):
+        self.index_path = Path(index_path)
+        with open(self.index_path) as f:
+            self.index = json.load(f)
+        self.cache_size = max(1, cache_size)
+        self._cache: "OrderedDict[str, ModelBundle]" = OrderedDict()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def partitions_of(self, df: pd.DataFrame) -> Optional[np.ndarray]:
+        """
+        Partition of every reading (GLOBAL_PARTITION for unseen sites), or
+        None when the readings carry no site information.
+        """
+        sites = site_keys(df)
+        if sites is None:
+            return None
+        site_partitions = self.index["sites"]
+        return np.array([site_partitions.get(s, GLOBAL_PARTITION) for s in sites])
+
+    def bundle(self, partition: str) -> Optional[ModelBundle]:
+        """The partition's bundle, or None if it should use the global model."""
+        entry = self.index["partitions"].get(partition)
+        if entry is None:
+            return None
+        if partition in self._cache:
+            self._cache.move_to_end(partition)
+            self.hits += 1
+            return self._cache[partition]
+
+        # Not load_bundle: its cache is unbounded and would defeat eviction
+        bundle = ModelBundle(self.index_path.parent / entry["file"])
+        self.loads += 1
+        self._cache[partition] = bundle
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+        return bundle
+
+    def cache_info(self) -> Dict:
+        return {
+            "partition_by": self.index["partition_by"],
+            "partitions": len(self.index["partitions"]),
+            "cached": len(self._cache),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+_models: Optional[PartitionedAnomalyModels] = None
+_models_signature = None
+
+
+def get_partitioned_models() -> Optional[PartitionedAnomalyModels]:
+    """
+    The process-wide partitioned models, reloaded when the index changes, or
+    None if no partitioned models have been trained.
+    """
+    global _models, _models_signature
+
+    if not PARTITION_INDEX_PATH.exists():
+        _models = None
+        return None
+    stat = PARTITION_INDEX_PATH.stat()
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if _models is None or signature != _models_signature:
+        _models = PartitionedAnomalyModels()
+        _models_signature = signature
+    return _models
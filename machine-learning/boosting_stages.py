@@ -0,0 +1,36 @@
+"""
+Residual Boosting Stages
+Incremental updates of a fitted gradient boosting model without touching its
+internals: each update is a separate HistGradientBoostingRegressor fitted on
+the residuals of the model so far (what warm-started iterations would fit),
+and predictions are the sum of every stage.
+"""
+
+import numpy as np
+
+
+class ResidualStagesRegressor:
+    """A fitted base regressor plus residual stages fitted after it."""
+
+    def __init__(self, base, stages=()):
+        # Named like sklearn ensembles so cap_estimator_jobs reaches the stages
+        self.estimators_ = [base, *stages]
+
+    @property
+    def base(self):
+        return self.estimators_[0]
+
+    @property
+    def n_stages(self) -> int:
+        return len(self.estimators_) - 1
+
+    def add_stage(self, stage):
+        """Append a fitted stage (fitted on the current model's residuals)."""
+        self.estimators_.append(stage)
+        return self
+
+    def predict(self, X) -> np.ndarray:
+        prediction = self.base.predict(X)
+        for stage in self.estimators_[1:]:
+            prediction = prediction + stage.predict(X)
+        return prediction
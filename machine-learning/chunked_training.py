@@ -0,0 +1,169 @@
+"""
+Chunked Anomaly Detector Training
+Trains the IsolationForest on sensor archives too large to load at once. The
+source is read in chunks; the StandardScaler is fitted with exact running
+moments (partial_fit), the forest on a uniform reservoir sample, and the
+contamination threshold from a second, streamed scoring pass. Peak memory is
+set by the chunk and sample sizes, not the archive size.
+"""
+
+import os
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+CHUNK_ROWS = 100_000
+RESERVOIR_SIZE = 100_000
+# IsolationForest.score_samples lies in [-1, 0]; this many bins resolve the
+# threshold to 5e-5
+SCORE_HISTOGRAM_BINS = 20_000
+
+
+def sensor_columns(data_path: str) -> List[str]:
+    """Column names of a prepared CSV or synthetic corpus, without loading it."""
+    if os.path.isdir(data_path):
+        from synthetic_corpus import iter_corpus
+
+        return list(next(iter_corpus(data_path)).columns)
+    return list(pd.read_csv(data_path, nrows=0).columns)
+
+
+def iter_sensor_chunks(
+    data_path: str, features: List[str], chunk_rows: int = CHUNK_ROWS
+) -> Iterator[np.ndarray]:
+    """
+    Yield the feature columns of a CSV or corpus directory in chunks of at
+    most chunk_rows complete (NaN-free) rows.
+    """
+    if os.path.isdir(data_path):
+        from synthetic_corpus import iter_corpus
+
+        frames = iter_corpus(data_path, features)
+    else:
+        frames = pd.read_csv(data_path, usecols=features, chunksize=chunk_rows)
+
+    for frame in frames:
+        X = frame[features].to_numpy(dtype=float)
+        X = X[~np.isnan(X).any(axis=1)]
+        for start in range(0, len(X), chunk_rows):
+            yield X[start : start + chunk_rows]
+
+
+class ReservoirSample:
+    """Uniform fixed-size sample of a stream of rows (Algorithm R)."""
+
+    def __init__(self, size: int, n_features: int, seed: int = 42):
+        self.size = size
+        self.rows = np.empty((size, n_features))
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, X: np.ndarray):
+        n_fill = min(max(self.size - self.seen, 0), len(X))
+        self.rows[self.seen : self.seen + n_fill] = X[:n_fill]
+        self.seen += n_fill
+        X = X[n_fill:]
+        if len(X) == 0:
+            return
+
+        # Row i of the stream replaces a random slot with probability size/(i+1)
+        stream_index = self.seen + np.arange(len(X))
+        slots = self.rng.integers(0, stream_index + 1)
+        keep = slots < self.size
+        slots, X = slots[keep], X[keep]
+        # When a slot is hit twice the later row wins, as in the serial algorithm
+        last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+        self.rows[slots[last]] = X[last]
+        self.seen += len(stream_index)
+
+    def sample(self) -> np.ndarray:
+        return self.rows[: min(self.seen, self.size)]
+
+
+class ScoreHistogram:
+    """Fixed-bin histogram of IsolationForest.score_samples for quantiles."""
+
+    def __init__(self, bins: int = SCORE_HISTOGRAM_BINS):
+        self.edges = np.linspace(-1.0, 0.0, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def add(self, scores: np.ndarray):
+        self.counts += np.histogram(
+            np.clip(scores, self.edges[0], self.edges[-1]), bins=self.edges
+        )[0]
+
+    def quantile(self, q: float) -> float:
+        """q-quantile, linearly interpolated inside its bin."""
+        cumulative = np.cumsum(self.counts)
+        target = q * cumulative[-1]
+        i = int(np.searchsorted(cumulative, target))
+        before = cumulative[i - 1] if i > 0 else 0
+        fraction = (target - before) / max(self.counts[i], 1)
+        return float(self.edges[i] + fraction * (self.edges[i + 1] - self.edges[i]))
+
+    def share_below(self, value: float) -> float:
+        i = int(np.searchsorted(self.edges, value)) - 1
+        return float(self.counts[: max(i, 0)].sum() / max(self.counts.sum(), 1))
+
+
+def train_detector_chunked(
+    data_path: str,
+    features: List[str],
+    contamination: float,
+    n_jobs: int,
+    sample_size: int = RESERVOIR_SIZE,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Tuple[IsolationForest, StandardScaler, Dict]:
+    """
+    Fit the scaler and forest in two passes over the source.
+
+    Returns:
+        (model, scaler, stats) where stats holds the row counts, the
+        streamed threshold and the share of rows it flags
+    """
+    start = time.time()
+    scaler = StandardScaler()
+    reservoir = ReservoirSample(sample_size, len(features))
+    for X in iter_sensor_chunks(data_path, features, chunk_rows):
+        scaler.partial_fit(X)
+        reservoir.add(X)
+    if reservoir.seen == 0:
+        raise ValueError(f"No complete rows with features {features} in {data_path}")
+    print(
+        f"  Pass 1: {reservoir.seen} rows, {len(reservoir.sample())} sampled "
+        f"({time.time() - start:.1f}s)"
+    )
+
+    model = IsolationForest(
+        contamination=contamination,
+        random_state=42,
+        n_estimators=100,
+        max_samples="auto",
+        n_jobs=n_jobs,
+    )
+    model.fit(scaler.transform(reservoir.sample()))
+
+    # The sample-based offset_ is replaced with one from every row's score
+    histogram = ScoreHistogram()
+    for X in iter_sensor_chunks(data_path, features, chunk_rows):
+        histogram.add(model.score_samples(scaler.transform(X)))
+    sample_offset = float(model.offset_)
+    model.offset_ = histogram.quantile(contamination)
+    print(f"  Pass 2: threshold {model.offset_:.5f} ({time.time() - start:.1f}s)")
+
+    return (
+        model,
+        scaler,
+        {
+            "training_rows": reservoir.seen,
+            "sample_rows": len(reservoir.sample()),
+            "chunk_rows": chunk_rows,
+            "threshold": model.offset_,
+            "sample_threshold": sample_offset,
+            "flagged_share": histogram.share_below(model.offset_),
+        },
+    )
@@ -0,0 +1,318 @@
+"""
+Cleaning Schedule Optimizer
+Plans cleaning dates per panel over a horizon instead of answering "clean
+now?" with fixed thresholds. Each panel's efficiency loss curve (loss vs days
+since cleaning) comes from the maintenance model, and dynamic programming
+picks the cleaning days that minimize lost energy value plus cleaning cost.
+
+The loss curves of the whole fleet are predicted in one batched call. The
+forest only splits days_since_cleaning at a few thresholds, so the model is
+evaluated once per interval between thresholds rather than once per day.
+"""
+
+import json
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from maintenance_predictor import MAINTENANCE_BUNDLE_PATH, _feature_matrix
+from model_bundle import load_bundle
+from thread_budget import apply_thread_budget, cap_estimator_jobs, get_budget
+from wire_format import parse_format_flag, read_request, write_response
+
+DEFAULT_HORIZON_DAYS = 180
+DEFAULT_CLEANING_COST = 25.0  # Per cleaning visit
+DEFAULT_ENERGY_VALUE = 0.15  # Per kWh
+DEFAULT_SYSTEM_CAPACITY_KW = 5.0
+PEAK_SUN_HOURS = 4.5  # Daily energy = capacity * peak sun hours
+DAYS_FEATURE = "days_since_cleaning"
+
+
+def _day_thresholds(model, bundle) -> Optional[np.ndarray]:
+    """Sorted days_since_cleaning split thresholds (scaled) of a forest."""
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None:
+        return None
+    column = bundle.features.index(DAYS_FEATURE)
+    return np.unique(
+        np.concatenate(
+            [
+                tree.tree_.threshold[tree.tree_.feature == column]
+                for tree in np.ravel(estimators)
+            ]
+        )
+    )
+
+
+def _scaled_days(bundle, days: np.ndarray) -> np.ndarray:
+    params = bundle.manifest["scaler"]
+    column = bundle.features.index(DAYS_FEATURE)
+    return (days - params["mean"][column]) / params["scale"][column]
+
+
+def _day_classes(model, bundle, days: np.ndarray) -> np.ndarray:
+    """
+    Group days that every tree treats identically (same side of every
+    days_since_cleaning split). Returns a class label per day.
+    """
+    thresholds = _day_thresholds(model, bundle)
+    if thresholds is None:
+        return np.arange(len(days))
+    # A tree sends x left when x <= threshold: days with the same number of
+    # thresholds below them take the same path everywhere
+    return np.searchsorted(thresholds, _scaled_days(bundle, days), side="left")
+
+
+def settled_day(model, bundle) -> Optional[int]:
+    """
+    First whole day past the forest's largest days_since_cleaning split:
+    the predicted loss is the same for every later day. None for models
+    without trees.
+    """
+    thresholds = _day_thresholds(model, bundle)
+    if thresholds is None:
+        return None
+    if not len(thresholds):
+        return 0
+    params = bundle.manifest["scaler"]
+    column = bundle.features.index(DAYS_FEATURE)
+    last = thresholds[-1] * params["scale"][column] + params["mean"][column]
+    return max(int(np.floor(last)) + 1, 0)
+
+
+def loss_curves(model, bundle, X: np.ndarray, max_days: int) -> np.ndarray:
+    """
+    Predicted efficiency loss (%) of every panel for 0..max_days days since
+    cleaning, with the panels' other features held fixed.
+
+    Returns:
+        Array of shape (panels, max_days + 1)
+    """
+    days = np.arange(max_days + 1, dtype=float)
+    classes = _day_classes(model, bundle, days)
+    _, representatives, day_class = np.unique(
+        classes, return_index=True, return_inverse=True
+    )
+
+    column = bundle.features.index(DAYS_FEATURE)
+    grid = np.repeat(X, len(representatives), axis=0)
+    grid[:, column] = np.tile(days[representatives], len(X))
+    predicted = model.predict(bundle.scale(grid)).reshape(len(X), -1)
+    return np.clip(predicted[:, day_class], 0, None)
+
+
+def plan_cleanings(
+    current_loss: np.ndarray,
+    fresh_loss: np.ndarray,
+    daily_value: np.ndarray,
+    cleaning_cost: float,
+):
+    """
+    Optimal cleaning days for every panel by dynamic programming.
+
+    Args:
+        current_loss: (panels, horizon) loss on each day if never cleaned
+        fresh_loss: (panels, horizon) loss k days after a cleaning
+        daily_value: (panels,) value of a day's full energy output
+        cleaning_cost: Cost of one cleaning
+
+    Returns:
+        (first, following, plan_cost, idle_cost): the first cleaning day
+        (horizon = never), the next cleaning day after each day (horizon =
+        none), the optimal cost and the cost of never cleaning
+    """
+    n_panels, horizon = current_loss.shape
+    scale = daily_value[:, None] / 100
+    # segment[:, k]: value lost over the k days after a cleaning
+    segment = np.concatenate(
+        [np.zeros((n_panels, 1)), np.cumsum(fresh_loss * scale, axis=1)], axis=1
+    )
+    idle = np.concatenate(
+        [np.zeros((n_panels, 1)), np.cumsum(current_loss * scale, axis=1)], axis=1
+    )
+
+    # best[:, c]: cheapest cost from day c onwards given a cleaning on day c,
+    # including that cleaning; best[:, horizon] = 0 (end of the horizon)
+    best = np.zeros((n_panels, horizon + 1))
+    following = np.full((n_panels, horizon), horizon, dtype=np.int32)
+    for day in range(horizon - 1, -1, -1):
+        lengths = np.arange(1, horizon - day + 1)
+        options = segment[:, lengths] + best[:, day + lengths]
+        choice = np.argmin(options, axis=1)
+        best[:, day] = cleaning_cost + options[np.arange(n_panels), choice]
+        following[:, day] = day + lengths[choice]
+
+    first_options = idle[:, : horizon + 1] + best
+    first = np.argmin(first_options, axis=1)
+    plan_cost = first_options[np.arange(n_panels), first]
+    return first, following, plan_cost, idle[:, horizon]
+
+
+def schedule_cleanings(
+    panel_data,
+    horizon_days: int = DEFAULT_HORIZON_DAYS,
+    cleaning_cost: float = DEFAULT_CLEANING_COST,
+    energy_value: float = DEFAULT_ENERGY_VALUE,
+    aggregates_only: bool = False,
+    columnar: bool = False,
+) -> Dict:
+    """
+    Plan cleanings for a fleet of panels.
+
+    Args:
+        panel_data: List of dicts (or a dict of arrays) with the maintenance
+            features and optionally panel_id, system_capacity_kw or
+            daily_energy_kwh
+        horizon_days: Planning horizon
+        cleaning_cost: Cost of one cleaning, in the currency of energy_value
+        energy_value: Value of one kWh
+        aggregates_only: Omit the per-panel plans
+        columnar: Give the plans as a dict of per-panel arrays (for the
+            columnar and binary wire formats); panel i's cleaning days are
+            the cleanings[i] values of cleaning_days from
+            cleaning_days_offset[i]
+
+    Returns:
+        Dict with per-panel cleaning days and fleet totals
+    """
+    if not MAINTENANCE_BUNDLE_PATH.exists():
+        return {
+            "error": "Maintenance predictor model not found. Please train first.",
+            "model_path": str(MAINTENANCE_BUNDLE_PATH),
+        }
+    bundle = load_bundle(MAINTENANCE_BUNDLE_PATH)
+    model = cap_estimator_jobs(bundle.get("model"), get_budget("serving"))
+
+    df = pd.DataFrame(panel_data)
+    if df.empty:
+        return {"error": "No panels provided"}
+    X, error = _feature_matrix(df, bundle.features)
+    if error:
+        return error
+    X = X.astype(float)
+
+    capacity = (
+        df["system_capacity_kw"].fillna(DEFAULT_SYSTEM_CAPACITY_KW).to_numpy(float)
+        if "system_capacity_kw" in df.columns
+        else np.full(len(df), DEFAULT_SYSTEM_CAPACITY_KW)
+    )
+    daily_energy = capacity * PEAK_SUN_HOURS
+    if "daily_energy_kwh" in df.columns:
+        measured = df["daily_energy_kwh"].to_numpy(dtype=float)
+        daily_energy = np.where(np.isnan(measured), daily_energy, measured)
+
+    since = np.maximum(X[:, bundle.features.index(DAYS_FEATURE)], 0)
+    last_day = settled_day(model, bundle)
+    if last_day is not None:
+        # The curves are flat past the last split, so longer gaps add nothing
+        since = np.minimum(since, last_day)
+    since = since.astype(int)
+    days = np.arange(horizon_days)
+    curves = loss_curves(model, bundle, X, int(since.max()) + horizon_days)
+    rows = np.arange(len(df))[:, None]
+    first, following, plan_cost, idle_cost = plan_cleanings(
+        curves[rows, since[:, None] + days],
+        curves[:, :horizon_days],
+        daily_energy * energy_value,
+        cleaning_cost,
+    )
+
+    # Walk the plans forward to list each panel's cleaning days
+    cleanings: List[List[int]] = [[] for _ in range(len(df))]
+    day = first.copy()
+    active = day < horizon_days
+    while active.any():
+        for i in np.flatnonzero(active):
+            cleanings[i].append(int(day[i]))
+        day[active] = following[active, day[active]]
+        active = day < horizon_days
+    n_cleanings = np.array([len(c) for c in cleanings])
+
+    result = {
+        "status": "success",
+        "total_panels": len(df),
+        "horizon_days": horizon_days,
+        "cleaning_cost": cleaning_cost,
+        "energy_value_per_kwh": energy_value,
+        "total_cleanings": int(n_cleanings.sum()),
+        "panels_cleaned": int((n_cleanings > 0).sum()),
+        "cleanings_within_30_days": int(((first < 30) & (first < horizon_days)).sum()),
+        "total_cost_with_plan": float(plan_cost.sum()),
+        "total_cost_without_cleaning": float(idle_cost.sum()),
+        "net_benefit": float((idle_cost - plan_cost).sum()),
+    }
+    if not aggregates_only and columnar:
+        offsets = np.concatenate([[0], np.cumsum(n_cleanings)])
+        result["plans"] = {
+            "panel_id": (
+                df["panel_id"].to_numpy().astype(str)
+                if "panel_id" in df.columns
+                else np.arange(len(df))
+            ),
+            "next_cleaning_in_days": np.where(first < horizon_days, first, -1),
+            "cleanings": n_cleanings,
+            "cleaning_days_offset": offsets[:-1],
+            "cleaning_days": np.array(
+                [day for days in cleanings for day in days], dtype=np.int64
+            ),
+            "cost_with_plan": plan_cost,
+            "cost_without_cleaning": idle_cost,
+        }
+    elif not aggregates_only:
+        panel_ids = (
+            df["panel_id"].tolist() if "panel_id" in df.columns else range(len(df))
+        )
+        result["plans"] = [
+            {
+                "panel_id": panel_id,
+                "cleaning_days": cleanings[i],
+                "next_cleaning_in_days": cleanings[i][0] if cleanings[i] else None,
+                "cost_with_plan": float(plan_cost[i]),
+                "cost_without_cleaning": float(idle_cost[i]),
+            }
+            for i, panel_id in enumerate(panel_ids)
+        ]
+    return result
+
+
+def main():
+    """
+    CLI: python cleaning_scheduler.py [--aggregates] [--format json|columnar|binary]
+    Reads {"panel_data": [...], "horizon_days": 180, "cleaning_cost": 25,
+    "energy_value_per_kwh": 0.15} from stdin (all but panel_data optional).
+    """
+    try:
+        fmt, args = parse_format_flag(sys.argv[1:])
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+    apply_thread_budget("serving")
+    try:
+        request = read_request(fmt, "panel_data")
+        if "panel_data" not in request:
+            print(json.dumps({"error": "Expected 'panel_data' key in input JSON"}))
+            sys.exit(1)
+        result = schedule_cleanings(
+            request["panel_data"],
+            horizon_days=int(request.get("horizon_days", DEFAULT_HORIZON_DAYS)),
+            cleaning_cost=float(request.get("cleaning_cost", DEFAULT_CLEANING_COST)),
+            energy_value=float(
+                request.get("energy_value_per_kwh", DEFAULT_ENERGY_VALUE)
+            ),
+            aggregates_only="--aggregates" in args,
+            columnar=fmt != "json",
+        )
+        write_response(result, fmt, results_key="plans")
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {str(e)}"}))
+        sys.exit(1)
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Clear-Sky Irradiance Cache
+The irradiance a location would get under a cloudless sky (pvlib
+Location.get_clearsky: Ineichen with the Linke turbidity climatology), as a
+reference for prediction (an upper bound on plausible energy) and anomaly
+screening (the clear-sky index of a reading).
+
+A full year of hourly values is computed once per location, rounded to
+LOCATION_ROUNDING_DEG, and kept as a float16 profile (8760 hours x GHI, DNI,
+DHI, sun zenith and azimuth; ~88 KB) on disk with least-recently-used
+eviction, with the most recent profiles also held in memory. Lookups take
+per-reading locations and timestamps and interpolate between hours.
+"""
+
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# Written at serving time, so outside the source tree by default
+CLEAR_SKY_DIR = Path(
+    os.environ.get(
+        "SOLAR_ML_CLEAR_SKY_CACHE",
+        Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+        / "solar-ml"
+        / "clear_sky",
+    )
+)
+LOCATION_ROUNDING_DEG = 0.25
+MAX_DISK_PROFILES = 2000  # ~176 MB
+MAX_MEMORY_PROFILES = 64
+PROFILE_YEAR = 2025  # Any non-leap year: clear sky barely changes across years
+HOURS_PER_YEAR = 8760
+PROFILE_COLUMNS = ["ghi", "dni", "dhi", "sun_zenith", "sun_azimuth"]
+INTERPOLATED_COLUMNS = ["ghi", "dni", "dhi", "sun_zenith"]  # Not the azimuth
+GROUND_ALBEDO = 0.2
+
+
+def round_location(lat, lon):
+    """Latitude/longitude snapped to the profile grid."""
+    step = LOCATION_ROUNDING_DEG
+    return (
+        np.round(np.asarray(lat, dtype=float) / step) * step,
+        np.round(np.asarray(lon, dtype=float) / step) * step,
+    )
+
+
+def compute_profile(lat: float, lon: float) -> np.ndarray:
+    """(8760, PROFILE_COLUMNS) clear-sky year at a location, hourly in UTC."""
+    from pvlib.location import Location
+
+    times = pd.date_range(
+        f"{PROFILE_YEAR}-01-01", periods=HOURS_PER_YEAR, freq="h", tz="UTC"
+    )
+    location = Location(lat, lon, tz="UTC")
+    position = location.get_solarposition(times)
+    clear = location.get_clearsky(times, solar_position=position)
+    return np.column_stack(
+        [
+            clear["ghi"],
+            clear["dni"],
+            clear["dhi"],
+            position["apparent_zenith"],
+            position["azimuth"],
+        ]
+    ).astype(np.float16)
+
+
+class ClearSkyCache:
+    """Clear-sky profiles by rounded location: memory, then disk, then pvlib."""
+
+    def __init__(
+        self,
+        directory: Path = CLEAR_SKY_DIR,
+        max_disk: int = MAX_DISK_PROFILES,
+        max_memory: int = MAX_MEMORY_PROFILES,
+    ):
+        self.directory = Path(directory)
+        self.max_disk = max_disk
+        self.max_memory = max_memory
+        self.memory: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.computed = 0
+        self.evicted = 0
+
+    def _path(self, lat: float, lon: float) -> Path:
+        return self.directory / f"{lat:+08.3f}_{lon:+09.3f}.npy"
+
+    def profile(self, lat: float, lon: float) -> np.ndarray:
+        """Profile of the grid point nearest lat/lon."""
+        lat, lon = (float(v) for v in round_location(lat, lon))
+        key = (lat, lon)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        path = self._path(lat, lon)
+        try:
+            profile = np.load(path)
+            os.utime(path)  # Recently used, for eviction
+            self.disk_hits += 1
+        except (FileNotFoundError, ValueError):
+            profile = compute_profile(lat, lon)
+            self.computed += 1
+            self._store(path, profile)
+
+        self.memory[key] = profile
+        if len(self.memory) > self.max_memory:
+            self.memory.popitem(last=False)
+        return profile
+
+    def _store(self, path: Path, profile: np.ndarray):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npy")
+        np.save(tmp_path, profile)
+        os.replace(tmp_path, path)
+
+        profiles = list(self.directory.glob("*.npy"))
+        if len(profiles) > self.max_disk:
+            profiles.sort(key=lambda p: p.stat().st_mtime)
+            for old in profiles[: len(profiles) - self.max_disk]:
+                old.unlink(missing_ok=True)
+                self.evicted += 1
+
+    def cache_info(self) -> Dict:
+        return {
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "computed": self.computed,
+            "evicted": self.evicted,
+            "in_memory": len(self.memory),
+        }
+
+
+_cache = None
+
+
+def get_clear_sky_cache() -> ClearSkyCache:
+    """Process-wide cache."""
+    global _cache
+    if _cache is None:
+        _cache = ClearSkyCache()
+    return _cache
+
+
+def _hour_of_year(times: pd.DatetimeIndex) -> np.ndarray:
+    """Fractional hour of a 365-day year (29 February reuses 28 February)."""
+    day = times.dayofyear.to_numpy() - 1
+    day -= times.is_leap_year & (day >= 59)
+    return (
+        day * 24
+        + times.hour.to_numpy()
+        + times.minute.to_numpy() / 60
+        + times.second.to_numpy() / 3600
+    )
+
+
+def clear_sky_irradiance(lat, lon, times, local_time: bool = False) -> Dict:
+    """
+    Clear-sky GHI, DNI, DHI and sun zenith at each (location, timestamp).
+
+    Args:
+        lat, lon: Scalars, or arrays with one location per timestamp
+        times: Timestamps; timezone-aware ones are converted to UTC, naive
+            ones are taken as UTC
+        local_time: The timestamps' wall-clock times are local time at each
+            location (as in NASA POWER LST exports and the synthetic corpus),
+            whatever their timezone label; taken as solar time, longitude / 15
+            hours ahead of UTC
+
+    Returns:
+        Dict of arrays, one value per timestamp
+    """
+    times = pd.DatetimeIndex(pd.to_datetime(times))
+    if local_time:
+        times = times.tz_localize(None) if times.tz is not None else times
+    elif times.tz is not None:
+        times = times.tz_convert("UTC").tz_localize(None)
+
+    n = len(times)
+    lat = np.broadcast_to(np.asarray(lat, dtype=float), (n,))
+    lon = np.broadcast_to(np.asarray(lon, dtype=float), (n,))
+    hour = _hour_of_year(times)
+    if local_time:
+        hour = hour - lon / 15
+    hour = np.mod(hour, HOURS_PER_YEAR)
+    before = np.floor(hour).astype(np.int64)
+    after = (before + 1) % HOURS_PER_YEAR
+    weight = (hour - before)[:, None]
+
+    columns = [PROFILE_COLUMNS.index(c) for c in INTERPOLATED_COLUMNS]
+    out = np.full((n, len(columns)), np.nan)
+    cache = get_clear_sky_cache()
+    grid = np.column_stack(round_location(lat, lon))
+    unique, inverse = np.unique(grid, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    for u, (site_lat, site_lon) in enumerate(unique):
+        rows = np.flatnonzero(inverse == u)
+        profile = cache.profile(site_lat, site_lon)[:, columns].astype(np.float64)
+        out[rows] = (1 - weight[rows]) * profile[before[rows]] + weight[rows] * profile[
+            after[rows]
+        ]
+    return {name: out[:, i] for i, name in enumerate(INTERPOLATED_COLUMNS)}
+
+
+def annual_clear_sky_poa(lat, lon, tilt, azimuth) -> np.ndarray:
+    """
+    Clear-sky plane-of-array insolation over a year (kWh/m²) for each system,
+    by isotropic transposition of its location's profile.
+    """
+    lat, lon, tilt, azimuth = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(v, dtype=float)) for v in (lat, lon, tilt, azimuth))
+    )
+    cache = get_clear_sky_cache()
+    out = np.empty(len(lat))
+    for i in range(len(lat)):
+        profile = cache.profile(lat[i], lon[i]).astype(np.float64)
+        ghi, dni, dhi, zenith, sun_azimuth = profile.T
+        zenith, sun_azimuth = np.radians(zenith), np.radians(sun_azimuth)
+        surface_tilt, surface_azimuth = np.radians(tilt[i]), np.radians(azimuth[i])
+        cos_aoi = np.cos(zenith) * np.cos(surface_tilt) + np.sin(zenith) * np.sin(
+            surface_tilt
+        ) * np.cos(sun_azimuth - surface_azimuth)
+        poa = (
+            dni * np.clip(cos_aoi, 0, None)
+            + dhi * (1 + np.cos(surface_tilt)) / 2
+            + ghi * GROUND_ALBEDO * (1 - np.cos(surface_tilt)) / 2
+        )
+        out[i] = poa.sum() / 1000
+    return out
@@ -0,0 +1,292 @@
+"""
+Compact Training Dtypes
+Opt-in mode that keeps the training frames in float32 (continuous features)
+and small integers (YEAR/MO/DY/HR), as the synthetic corpus already stores
+them, instead of pandas' float64/int64 defaults. It roughly halves the memory
+of the power, anomaly and maintenance training data. Tree models bin or
+split on float32 internally anyway. Targets stay float64, so metrics are
+computed on the original values.
+
+Enabled with SOLAR_ML_COMPACT_DTYPES=1, or the compact argument of the
+loaders. The benchmark runs every training path in both modes and reports
+peak memory, fit time and the metric differences:
+    python compact_dtypes.py benchmark [data_path]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+FLOAT_DTYPE = np.float32
+# Same as synthetic_corpus.COLUMN_DTYPES
+CALENDAR_DTYPES = {"YEAR": np.int16, "MO": np.int8, "DY": np.int8, "HR": np.int8}
+# Rows read to infer which CSV columns are numeric
+DTYPE_SAMPLE_ROWS = 1000
+
+# Largest metric change between the modes still counted as unchanged
+R2_TOLERANCE = 1e-3  # Absolute
+# MAE change as a share of the target's standard deviation (relative to the
+# MAE itself it is noisy for near-perfect models)
+MAE_TOLERANCE = 0.005
+FLAG_AGREEMENT_TOLERANCE = 0.99  # Share of anomaly flags that must agree
+
+
+def compact_dtypes_enabled(compact: Optional[bool] = None) -> bool:
+    """The compact argument if given, otherwise SOLAR_ML_COMPACT_DTYPES."""
+    if compact is not None:
+        return compact
+    return os.environ.get("SOLAR_ML_COMPACT_DTYPES", "0").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+
+
+def compact_frame(df: pd.DataFrame, keep: Iterable[str] = ()) -> pd.DataFrame:
+    """
+    Downcast df's columns in place, one at a time (so at most one column is
+    copied at once): calendar fields to small ints, other floats to float32.
+    Columns in keep are left as they are.
+    """
+    keep = set(keep)
+    for col in df.columns:
+        if col in keep:
+            continue
+        dtype = df[col].dtype
+        if col in CALENDAR_DTYPES and dtype.kind in "iuf" and df[col].notna().all():
+            df[col] = df[col].astype(CALENDAR_DTYPES[col])
+        elif dtype.kind == "f" and dtype != FLOAT_DTYPE:
+            df[col] = df[col].astype(FLOAT_DTYPE)
+    return df
+
+
+def read_training_csv(
+    path, compact: Optional[bool] = None, keep: Iterable[str] = ()
+) -> pd.DataFrame:
+    """
+    pd.read_csv, parsing numeric columns straight into compact dtypes in
+    compact mode (no float64 frame is built first).
+    """
+    if not compact_dtypes_enabled(compact):
+        return pd.read_csv(path)
+
+    keep = set(keep)
+    sample = pd.read_csv(path, nrows=DTYPE_SAMPLE_ROWS)
+    dtypes = {
+        col: CALENDAR_DTYPES.get(col, FLOAT_DTYPE)
+        for col in sample.columns
+        if col not in keep and sample[col].dtype.kind in "iuf"
+    }
+    try:
+        return pd.read_csv(path, dtype=dtypes)
+    except (ValueError, OverflowError):
+        # A column the sample got wrong (e.g. text or gaps further down)
+        return compact_frame(pd.read_csv(path), keep)
+
+
+def frame_mb(df) -> float:
+    """Memory of a DataFrame or Series in MB."""
+    usage = df.memory_usage(deep=True)
+    return float(np.sum(usage)) / (1024 * 1024)
+
+
+def _profile_power(data_path: str) -> Dict:
+    from thread_budget import get_budget
+    from train_and_finalize import (
+        TARGET_COLS,
+        build_models,
+        evaluate_model,
+        load_and_engineer,
+        make_feature_target,
+    )
+
+    df = load_and_engineer(data_path)
+    X, y = make_feature_target(df)
+    split_idx = int(len(df) * 0.8)
+    X_train, X_test = X.iloc[:split_idx], X.iloc[split_idx:]
+    y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
+
+    fit_seconds = {}
+    metrics = {}
+    scales = {target: float(y_test[target].std()) for target in TARGET_COLS}
+    for name, model in build_models(n_jobs=get_budget("training")).items():
+        scores, _, _, fit_seconds[name] = evaluate_model(
+            model, X_train, X_test, y_train, y_test
+        )
+        for target in TARGET_COLS:
+            metrics[f"{name}/r2/{target}"] = scores.r2[target]
+            metrics[f"{name}/mae/{target}"] = scores.mae[target]
+    return {
+        "frame_mb": frame_mb(df),
+        "features_mb": frame_mb(X),
+        "fit_seconds": fit_seconds,
+        "metrics": metrics,
+        "scales": scales,
+    }
+
+
+def _profile_anomaly(data_path: str, models_dir: Path) -> Dict:
+    import anomaly_detector
+
+    anomaly_detector.ANOMALY_BUNDLE_PATH = models_dir / "anomaly.bundle"
+    start = time.perf_counter()
+    model, scaler, features = anomaly_detector.train_anomaly_detector(data_path)
+    seconds = time.perf_counter() - start
+    peak = _peak_rss_mb()
+
+    # Flags on the same float64 readings, to compare the two modes' models
+    probe = anomaly_detector.load_sensor_data(data_path)[features].dropna().iloc[:5000]
+    flags = model.predict(scaler.transform(probe.to_numpy(dtype=np.float64)))
+    return {
+        "peak_rss_mb": peak,
+        "fit_seconds": {"isolation_forest": seconds},
+        "flags": (flags == -1).astype(int).tolist(),
+    }
+
+
+def _profile_maintenance(data_path: str, models_dir: Path) -> Dict:
+    import maintenance_predictor
+    from model_bundle import load_bundle
+
+    maintenance_predictor.MAINTENANCE_BUNDLE_PATH = models_dir / "maintenance.bundle"
+    start = time.perf_counter()
+    maintenance_predictor.train_maintenance_predictor(data_path)
+    seconds = time.perf_counter() - start
+    metadata = load_bundle(maintenance_predictor.MAINTENANCE_BUNDLE_PATH).metadata
+    return {
+        "fit_seconds": {"random_forest": seconds},
+        "metrics": {"random_forest/r2/test": metadata["test_r2"]},
+    }
+
+
+def _peak_rss_mb() -> Optional[float]:
+    from resource_profile import max_rss_mb
+
+    return max_rss_mb()
+
+
+def _profile_worker(workload: str, compact: bool, data_path: str) -> Dict:
+    """One training path in one mode, in a fresh process (for its peak RSS)."""
+    import contextlib
+
+    os.environ["SOLAR_ML_COMPACT_DTYPES"] = "1" if compact else "0"
+    # Imported up front so the baseline includes the libraries
+    import anomaly_detector  # noqa: F401
+    import maintenance_predictor  # noqa: F401
+    import train_and_finalize  # noqa: F401
+    from resource_profile import current_rss_mb
+    from thread_budget import apply_thread_budget
+
+    apply_thread_budget("training")
+    baseline = current_rss_mb()
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(sys.stderr):
+        if workload == "power":
+            result = _profile_power(data_path)
+        elif workload == "anomaly":
+            result = _profile_anomaly(data_path, Path(tmp))
+        else:
+            result = _profile_maintenance(data_path, Path(tmp))
+    result.setdefault("peak_rss_mb", _peak_rss_mb())
+    result["baseline_rss_mb"] = baseline
+    return result
+
+
+def _compare(default: Dict, compact: Dict) -> Dict:
+    """Metric differences between the modes and whether they are in tolerance."""
+    differences = {}
+    within = True
+    for name, value in default.get("metrics", {}).items():
+        other = compact["metrics"][name]
+        if "/mae/" in name:
+            scale = default["scales"][name.rsplit("/", 1)[1]]
+            change = abs(other - value) / max(scale, 1e-12)
+            ok = change <= MAE_TOLERANCE
+        else:
+            change = abs(other - value)
+            ok = change <= R2_TOLERANCE
+        differences[name] = change
+        within &= ok
+    if "flags" in default:
+        agreement = float(
+            np.mean(np.array(default["flags"]) == np.array(compact["flags"]))
+        )
+        differences["flag_agreement"] = agreement
+        within &= agreement >= FLAG_AGREEMENT_TOLERANCE
+    return {"differences": differences, "within_tolerance": bool(within)}
+
+
+def benchmark(data_path: Optional[str] = None) -> Dict:
+    """
+    Train every path (power, anomaly, maintenance) in the default and the
+    compact mode, each run in its own process, and compare.
+    """
+    from anomaly_detector import _default_data_path
+
+    data_path = data_path or _default_data_path()
+    context = get_context("spawn")
+    report = {"data_path": str(data_path), "workloads": {}}
+    for workload in ("power", "anomaly", "maintenance"):
+        # The maintenance data generator reads a CSV
+        path = (
+            _default_data_path()
+            if workload == "maintenance" and os.path.isdir(data_path)
+            else data_path
+        )
+        runs = {}
+        for mode, compact in (("float64", False), ("compact", True)):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs[mode] = executor.submit(
+                    _profile_worker, workload, compact, path
+                ).result()
+
+        default, compact = runs["float64"], runs["compact"]
+        data_mb = {
+            mode: run["peak_rss_mb"] - run["baseline_rss_mb"]
+            for mode, run in runs.items()
+        }
+        summary = {
+            mode: {
+                key: value
+                for key, value in run.items()
+                if key not in ("metrics", "scales", "flags")
+            }
+            for mode, run in runs.items()
+        }
+        report["workloads"][workload] = {
+            **summary,
+            "peak_rss_reduction_mb": default["peak_rss_mb"] - compact["peak_rss_mb"],
+            "training_rss_reduction_pct": (
+                (1 - data_mb["compact"] / data_mb["float64"]) * 100
+                if data_mb["float64"] > 0
+                else None
+            ),
+            **_compare(default, compact),
+        }
+    return report
+
+
+def main():
+    """
+    CLI:
+      python compact_dtypes.py benchmark [data_path]
+          Peak memory, fit time and metric differences of every training path
+          with and without compact dtypes
+    """
+    args = sys.argv[1:]
+    if not args or args[0] != "benchmark":
+        print(main.__doc__)
+        sys.exit(1)
+    print(json.dumps(benchmark(args[1] if len(args) > 1 else None), indent=2))
+
+
+if __name__ == "__main__":
+    main()
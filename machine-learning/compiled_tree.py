@@ -0,0 +1,106 @@
+"""
+Compiled Decision Tree
+A fitted sklearn regression tree flattened into plain arrays so that predicting
+a single row is a short Python loop with no sklearn input validation.
+"""
+
+from typing import List
+
+import numpy as np
+
+# Up to this many rows are walked one by one; larger batches are vectorized
+SMALL_BATCH_ROWS = 8
+
+
+class CompiledTreeRegressor:
+    """Multi-output regression tree that predicts without importing sklearn."""
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        children_left: np.ndarray,
+        children_right: np.ndarray,
+        value: np.ndarray,
+        feature_names: List[str],
+    ):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.children_left = np.asarray(children_left, dtype=np.int32)
+        self.children_right = np.asarray(children_right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.n_features_in_ = len(feature_names)
+        self._build_lookup()
+
+    @classmethod
+    def from_sklearn(cls, tree, feature_names: List[str]) -> "CompiledTreeRegressor":
+        """Compile a fitted DecisionTreeRegressor."""
+        t = tree.tree_
+        return cls(
+            feature=t.feature,
+            threshold=t.threshold,
+            children_left=t.children_left,
+            children_right=t.children_right,
+            value=t.value.reshape(t.node_count, -1),
+            feature_names=feature_names,
+        )
+
+    def _build_lookup(self):
+        # Python lists are much faster than NumPy scalars to index one at a time
+        self._nodes = list(
+            zip(
+                self.feature.tolist(),
+                self.threshold.tolist(),
+                self.children_left.tolist(),
+                self.children_right.tolist(),
+            )
+        )
+        self._values = self.value.tolist()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_nodes"], state["_values"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_lookup()
+
+    @property
+    def node_count(self) -> int:
+        return len(self.feature)
+
+    def predict(self, X) -> np.ndarray:
+        """Predict targets for a 2-D array or DataFrame with the fitted columns."""
+        if hasattr(X, "to_numpy"):
+            X = X.to_numpy()
+        # sklearn trees split on float32 inputs
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        if len(X) <= SMALL_BATCH_ROWS:
+            nodes = self._nodes
+            out = []
+            for row in X.tolist():
+                node = 0
+                feature, threshold, left, right = nodes[0]
+                while left != -1:
+                    node = left if row[feature] <= threshold else right
+                    feature, threshold, left, right = nodes[node]
+                out.append(self._values[node])
+            return np.array(out)
+
+        node = np.zeros(len(X), dtype=np.int32)
+        rows = np.arange(len(X))
+        active = self.children_left[node] != -1
+        while active.any():
+            idx = rows[active]
+            current = node[idx]
+            go_left = X[idx, self.feature[current]] <= self.threshold[current]
+            node[idx] = np.where(
+                go_left, self.children_left[current], self.children_right[current]
+            )
+            active[idx] = self.children_left[node[idx]] != -1
+        return self.value[node]
@@ -0,0 +1,247 @@
+"""
+Power Model Distillation
+Trains a small, fast student model that mimics the gradient boosting teacher on
+a dense synthetic sample of model inputs and reports the latency/accuracy
+trade-off against the teacher. The student is stored in the power bundle and
+can be served instead of the teacher (see predict_service.MODEL_COMPONENT).
+"""
+
+import io
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+from sklearn.tree import DecisionTreeRegressor
+
+from compiled_tree import CompiledTreeRegressor
+from predict_service import build_features
+
+TEACHER_COMPONENT = "hist_gradient_boosting"
+STUDENT_COMPONENT = "student"
+
+STUDENT_MAX_DEPTH = 14
+STUDENT_MAX_LEAF_NODES = 4096  # Caps the student at 2 * 4096 - 1 nodes
+STUDENT_MIN_SAMPLES_LEAF = 2
+
+# Sobol sample over the raw serving inputs (2**17 points)
+SYNTHETIC_LOG2_SIZE = 17
+SERVING_INPUT_RANGES = {
+    "lat": (-60.0, 60.0),
+    "lon": (-180.0, 180.0),
+    "tilt": (0.0, 90.0),
+    "azimuth": (0.0, 360.0),
+    "system_capacity_kw": (1.0, 20.0),
+    "panel_age": (0.0, 25.0),
+    "days_since_cleaning": (0.0, 120.0),
+}
+# Jittered copies of the training rows cover the measured-weather region
+JITTER_REPEATS = 500
+JITTER_SCALE = 0.05  # Fraction of each feature's standard deviation
+JITTER_MAX_BASE_ROWS = 2000  # Larger training sets are subsampled first
+FIDELITY_HOLDOUT_FRACTION = 0.1
+
+LATENCY_TARGET_US = 100.0
+MAX_ADDED_MAPE = 1.0  # Percentage points over the teacher's MAPE
+
+
+def synthetic_inputs(X_train: pd.DataFrame, seed: int = 42) -> pd.DataFrame:
+    """
+    Build the distillation inputs: a Sobol sample of the serving input space
+    featurized with predict_service.build_features, plus jittered training rows.
+    """
+    rng = np.random.default_rng(seed)
+
+    sampler = qmc.Sobol(d=len(SERVING_INPUT_RANGES), seed=seed)
+    unit = sampler.random_base2(m=SYNTHETIC_LOG2_SIZE)
+    lower, upper = np.array(list(SERVING_INPUT_RANGES.values())).T
+    points = qmc.scale(unit, lower, upper)
+    serving = build_features(**dict(zip(SERVING_INPUT_RANGES, points.T)))
+
+    base_rows = X_train
+    if len(base_rows) > JITTER_MAX_BASE_ROWS:
+        base_rows = X_train.sample(JITTER_MAX_BASE_ROWS, random_state=seed)
+    base = np.repeat(base_rows.to_numpy(dtype=float), JITTER_REPEATS, axis=0)
+    noise = rng.standard_normal(base.shape) * (
+        X_train.std().fillna(0).to_numpy() * JITTER_SCALE
+    )
+    jittered = pd.DataFrame(base + noise, columns=X_train.columns)
+
+    return pd.concat([serving[X_train.columns], jittered], ignore_index=True)
+
+
+def measure_latency_us(model, X: pd.DataFrame, repeats: int = 200) -> float:
+    """Median wall time of one predict call on X, in microseconds."""
+    model.predict(X)  # Warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+
+def serialized_mb(model) -> float:
+    """Size of the model's joblib payload (as stored in a bundle) in MB."""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def _mape(actual: np.ndarray, pred: np.ndarray) -> float:
+    non_zero = actual != 0
+    if not non_zero.any():
+        return 0.0
+    return float(
+        np.mean(np.abs((actual[non_zero] - pred[non_zero]) / actual[non_zero])) * 100
+    )
+
+
+def distill_student(
+    teacher,
+    X_train: pd.DataFrame,
+    X_test: pd.DataFrame,
+    y_test: pd.DataFrame,
+) -> Tuple[Optional[CompiledTreeRegressor], Dict]:
+    """
+    Distill the teacher into a compiled multi-output decision tree.
+
+    Returns:
+        (student, report) where report holds the fidelity to the teacher, the
+        MAPE of both models on the test set, their predict latencies and
+        sizes. The student is None (rejected) unless it is smaller than the
+        teacher.
+    """
+    targets = list(y_test.columns)
+    X_synth = synthetic_inputs(X_train)
+    y_synth = teacher.predict(X_synth)
+
+    split_idx = int(len(X_synth) * (1 - FIDELITY_HOLDOUT_FRACTION))
+    order = np.random.default_rng(0).permutation(len(X_synth))
+    fit_idx, holdout_idx = order[:split_idx], order[split_idx:]
+
+    tree = DecisionTreeRegressor(
+        max_depth=STUDENT_MAX_DEPTH,
+        max_leaf_nodes=STUDENT_MAX_LEAF_NODES,
+        min_samples_leaf=STUDENT_MIN_SAMPLES_LEAF,
+        random_state=42,
+    )
+    tree.fit(X_synth.to_numpy()[fit_idx], y_synth[fit_idx])
+    student = CompiledTreeRegressor.from_sklearn(tree, list(X_train.columns))
+
+    synth_pred = student.predict(X_synth.iloc[holdout_idx])
+    teacher_test = teacher.predict(X_test)
+    student_test = student.predict(X_test)
+
+    test_mape = {"teacher": {}, "student": {}, "added": {}}
+    fidelity = {}
+    for i, target in enumerate(targets):
+        actual = y_test[target].to_numpy()
+        test_mape["teacher"][target] = _mape(actual, teacher_test[:, i])
+        test_mape["student"][target] = _mape(actual, student_test[:, i])
+        test_mape["added"][target] = (
+            test_mape["student"][target] - test_mape["teacher"][target]
+        )
+        fidelity[target] = _mape(y_synth[holdout_idx, i], synth_pred[:, i])
+
+    single_row = X_test.iloc[[0]]
+    latency = {
+        "teacher_single_us": measure_latency_us(teacher, single_row),
+        "student_single_us": measure_latency_us(student, single_row),
+        "teacher_batch_per_row_us": measure_latency_us(teacher, X_test, repeats=20)
+        / len(X_test),
+        "student_batch_per_row_us": measure_latency_us(student, X_test, repeats=20)
+        / len(X_test),
+    }
+
+    size_mb = {"teacher": serialized_mb(teacher), "student": serialized_mb(student)}
+    accepted = size_mb["student"] < size_mb["teacher"]
+
+    report = {
+        "teacher": TEACHER_COMPONENT,
+        "student_type": "CompiledTreeRegressor",
+        "student_node_count": student.node_count,
+        "student_max_depth": STUDENT_MAX_DEPTH,
+        "student_max_leaf_nodes": STUDENT_MAX_LEAF_NODES,
+        "size_mb": size_mb,
+        "accepted": accepted,
+        "synthetic_rows": len(X_synth),
+        "fidelity_mape_vs_teacher": fidelity,
+        "test_mape": test_mape,
+        "latency": latency,
+        "speedup_single": latency["teacher_single_us"] / latency["student_single_us"],
+        "targets": {
+            "latency_us": LATENCY_TARGET_US,
+            "max_added_mape": MAX_ADDED_MAPE,
+        },
+        "meets_targets": bool(
+            latency["student_single_us"] < LATENCY_TARGET_US
+            and max(test_mape["added"].values()) < MAX_ADDED_MAPE
+        ),
+    }
+
+    print(
+        f"  Student: {student.node_count} nodes, "
+        f"{size_mb['student']:.2f} MB vs teacher {size_mb['teacher']:.2f} MB, "
+        f"{latency['student_single_us']:.1f} µs vs teacher "
+        f"{latency['teacher_single_us']:.1f} µs per request, "
+        f"added MAPE {max(test_mape['added'].values()):+.3f} pts"
+    )
+    if not accepted:
+        print("  Student rejected: not smaller than the teacher")
+        return None, report
+    return student, report
+
+
+def main():
+    """
+    Re-distill the student from the published teacher and store it in the
+    power bundle.
+    """
+    import json
+
+    from model_bundle import load_bundle, write_bundle
+    from train_and_finalize import (
+        DEFAULT_DATA_FILE,
+        POWER_BUNDLE_PATH,
+        load_and_engineer,
+        make_feature_target,
+    )
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DATA_FILE
+    df = load_and_engineer(csv_path)
+    X, y = make_feature_target(df)
+    split_idx = int(len(df) * 0.8)
+
+    bundle = load_bundle(POWER_BUNDLE_PATH)
+    print("Distilling low-latency student model...")
+    student, report = distill_student(
+        bundle.get(TEACHER_COMPONENT),
+        X.iloc[:split_idx],
+        X.iloc[split_idx:],
+        y.iloc[split_idx:],
+    )
+
+    if student is None:
+        print(json.dumps(report, indent=2))
+        print("Student not smaller than the teacher; bundle left unchanged")
+        sys.exit(1)
+
+    components = {name: bundle.get(name) for name in bundle.component_names()}
+    components[STUDENT_COMPONENT] = student
+    write_bundle(
+        POWER_BUNDLE_PATH,
+        "power",
+        components,
+        features=bundle.features,
+        metadata={**bundle.metadata, "student_report": report},
+    )
+    print(json.dumps(report, indent=2))
+    print(f"Student saved to {POWER_BUNDLE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
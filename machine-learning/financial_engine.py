@@ -0,0 +1,372 @@
+"""
+Financial Projection Engine
+Year-by-year cash flows, NPV, IRR, payback and LCOE of a solar installation
+for many financing scenarios at once (tariff escalation, discount rate,
+degradation, system cost, subsidy, loan terms), as (scenario x year) NumPy
+arrays, so sales can compare hundreds of quotes for one predicted annual
+energy in a single call.
+
+Year 0 is the installation (the buyer's share of the net cost, the rest
+financed by the loan); years 1..horizon earn the degraded energy at the
+escalated tariff, less O&M and loan repayments.
+"""
+
+import json
+import sys
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from wire_format import parse_format_flag, read_request, write_response
+
+# Scenario fields and the value used when a scenario omits them
+SCENARIO_DEFAULTS = {
+    "annual_energy_kwh": 6000.0,  # First-year energy (usually the prediction)
+    "system_capacity_kw": 5.0,
+    "tariff_inr_per_kwh": 6.5,
+    "tariff_escalation": 0.0,  # Per year
+    "discount_rate": 0.08,
+    "degradation_rate": 0.005,  # Per year
+    "system_cost_inr_per_kw": 50000.0,
+    "subsidy_inr": 0.0,
+    "om_cost_fraction": 0.01,  # Of the system cost, per year
+    "loan_fraction": 0.0,  # Of the net (post-subsidy) cost
+    "loan_rate": 0.10,
+    "loan_years": 5,
+    "horizon_years": 25,
+}
+MAX_HORIZON_YEARS = 50
+# IRR search range, Newton start and steps, and the bisection steps for
+# rows Newton does not settle (2**-50 of the range: well below 0.01%)
+IRR_BOUNDS = (-0.99, 1.0)
+IRR_GUESS = 0.1
+IRR_NEWTON_STEPS = 8
+IRR_TOLERANCE = 1e-9  # |NPV at the IRR| relative to the total cash flow
+IRR_BISECTIONS = 50
+METRICS = ["npv_inr", "irr", "payback_years", "lcoe_inr_per_kwh", "total_savings_inr"]
+
+
+def scenario_frame(scenarios, **overrides) -> pd.DataFrame:
+    """
+    Scenarios as a DataFrame with every SCENARIO_DEFAULTS column.
+
+    Args:
+        scenarios: List of dicts or dict of arrays (one value per scenario)
+        overrides: Values for fields the scenarios omit (e.g. the predicted
+            annual_energy_kwh shared by all of them)
+    """
+    df = pd.DataFrame(scenarios)
+    unknown = sorted(set(df.columns) - set(SCENARIO_DEFAULTS))
+    if unknown:
+        raise ValueError(f"Unknown scenario fields: {unknown}")
+    for name, default in SCENARIO_DEFAULTS.items():
+        value = overrides.get(name, default)
+        if name not in df.columns:
+            df[name] = value
+        else:
+            df[name] = df[name].fillna(value)
+    df = df[list(SCENARIO_DEFAULTS)].astype(float)
+
+    horizon = df["horizon_years"]
+    if ((horizon < 1) | (horizon > MAX_HORIZON_YEARS)).any():
+        raise ValueError(f"horizon_years must be between 1 and {MAX_HORIZON_YEARS}")
+    if (df["discount_rate"] <= -1).any():
+        raise ValueError("discount_rate must be above -1")
+    return df
+
+
+def cash_flows(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Cash flow matrices for a scenario_frame.
+
+    Returns:
+        Dict of (scenarios, years + 1) arrays, column 0 being the
+        installation year: energy_kwh, savings_inr, om_inr, loan_inr and
+        net_inr (savings - O&M - loan repayment, the upfront payment in
+        year 0); plus the net_cost_inr of each scenario
+    """
+    col = {name: df[name].to_numpy()[:, None] for name in SCENARIO_DEFAULTS}
+    years = np.arange(int(df["horizon_years"].max()) + 1)[None, :]
+    operating = (years >= 1) & (years <= col["horizon_years"])
+    growth = np.maximum(years - 1, 0)
+
+    energy = np.where(
+        operating,
+        col["annual_energy_kwh"] * (1 - col["degradation_rate"]) ** growth,
+        0.0,
+    )
+    tariff = col["tariff_inr_per_kwh"] * (1 + col["tariff_escalation"]) ** growth
+    savings = energy * tariff
+
+    system_cost = col["system_cost_inr_per_kw"] * col["system_capacity_kw"]
+    net_cost = system_cost - col["subsidy_inr"]
+    om = np.where(operating, col["om_cost_fraction"] * system_cost, 0.0)
+
+    # Level annuity payments; a zero rate repays the principal evenly
+    principal = col["loan_fraction"] * net_cost
+    term = np.maximum(col["loan_years"], 1)
+    rate = col["loan_rate"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = np.where(
+            rate == 0,
+            principal / term,
+            principal * rate / (1 - (1 + rate) ** -term),
+        )
+    loan = np.where((years >= 1) & (years <= term), payment, 0.0)
+
+    net = savings - om - loan
+    net[:, 0] = -(net_cost - principal)[:, 0]
+    return {
+        "energy_kwh": energy,
+        "savings_inr": savings,
+        "om_inr": om,
+        "loan_inr": loan,
+        "net_inr": net,
+        "net_cost_inr": net_cost[:, 0],
+    }
+
+
+def _present_value(flows: np.ndarray, rate: np.ndarray) -> np.ndarray:
+    """Sum of flows[:, t] / (1 + rate)^t per row, by Horner's rule."""
+    factor = 1 / (1 + rate)
+    total = np.zeros(len(flows))
+    for t in range(flows.shape[1] - 1, -1, -1):
+        total = total * factor + flows[:, t]
+    return total
+
+
+def _bisect_rate(flows: np.ndarray) -> np.ndarray:
+    """IRR by bisection within IRR_BOUNDS; NaN where the NPV keeps its sign."""
+    low = np.full(len(flows), IRR_BOUNDS[0])
+    high = np.full(len(flows), IRR_BOUNDS[1])
+    npv_low = _present_value(flows, low)
+    found = np.sign(npv_low) != np.sign(_present_value(flows, high))
+    for _ in range(IRR_BISECTIONS):
+        mid = (low + high) / 2
+        npv_mid = _present_value(flows, mid)
+        same = np.sign(npv_mid) == np.sign(npv_low)
+        low = np.where(same, mid, low)
+        npv_low = np.where(same, npv_mid, npv_low)
+        high = np.where(same, high, mid)
+    return np.where(found, (low + high) / 2, np.nan)
+
+
+def internal_rate_of_return(flows: np.ndarray) -> np.ndarray:
+    """
+    IRR of every row of a (scenarios, years) cash flow matrix: Newton steps
+    on all rows at once, with bisection for the rows that do not converge
+    within IRR_BOUNDS; NaN where there is no IRR (e.g. the investment is
+    never recovered).
+    """
+    rate = np.full(len(flows), IRR_GUESS)
+    for _ in range(IRR_NEWTON_STEPS):
+        # NPV and its derivative in x = 1 / (1 + rate), by Horner's rule
+        x = 1 / (1 + rate)
+        npv = np.zeros(len(flows))
+        slope = np.zeros(len(flows))
+        for t in range(flows.shape[1] - 1, -1, -1):
+            slope = slope * x + npv
+            npv = npv * x + flows[:, t]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # dNPV/drate = dNPV/dx * -x^2
+            rate = rate + npv / (slope * x * x)
+        rate = np.where(np.isfinite(rate), rate, IRR_BOUNDS[1] * 2)
+        rate = np.clip(rate, IRR_BOUNDS[0], IRR_BOUNDS[1] * 2)
+
+    scale = np.abs(flows).sum(axis=1)
+    converged = (
+        (rate > IRR_BOUNDS[0])
+        & (rate < IRR_BOUNDS[1])
+        & (np.abs(_present_value(flows, rate)) <= IRR_TOLERANCE * scale)
+    )
+    if not converged.all():
+        rate[~converged] = _bisect_rate(flows[~converged])
+    return rate
+
+
+def payback_years(flows: np.ndarray) -> np.ndarray:
+    """
+    Years until the cumulative net cash flow turns non-negative for good
+    (loan repayments can push it back below zero), interpolated within the
+    year; NaN if it ends negative.
+    """
+    cumulative = np.cumsum(flows, axis=1)
+    negative = cumulative < 0
+    years = flows.shape[1]
+    # Last year still in deficit (-1 if never)
+    last = years - 1 - np.argmax(negative[:, ::-1], axis=1)
+    last = np.where(negative.any(axis=1), last, -1)
+    rows = np.arange(len(flows))
+    following = np.minimum(last + 1, years - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = -cumulative[rows, np.maximum(last, 0)] / flows[rows, following]
+    return np.where(last < 0, 0.0, np.where(last == years - 1, np.nan, last + fraction))
+
+
+def project_finances(
+    scenarios, include_cash_flows: bool = False, **overrides
+) -> Dict[str, np.ndarray]:
+    """
+    Financial metrics of every scenario.
+
+    Args:
+        scenarios: List of dicts or dict of arrays with SCENARIO_DEFAULTS
+            fields
+        include_cash_flows: Also return the (scenarios, years + 1) matrices
+            of cash_flows
+        overrides: Values for fields the scenarios omit
+
+    Returns:
+        Dict of per-scenario arrays: npv_inr, irr (fraction), payback_years,
+        lcoe_inr_per_kwh and total_savings_inr (undiscounted energy savings
+        over the horizon),
+        plus the cash flow matrices if requested
+    """
+    df = scenario_frame(scenarios, **overrides)
+    flows = cash_flows(df)
+    rate = df["discount_rate"].to_numpy()
+    net = flows["net_inr"]
+
+    # LCOE: discounted lifetime cost (net of subsidy, before financing) over
+    # discounted lifetime energy
+    lifetime_cost = flows["net_cost_inr"] + _present_value(flows["om_inr"], rate)
+    lifetime_energy = _present_value(flows["energy_kwh"], rate)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lcoe = np.where(lifetime_energy > 0, lifetime_cost / lifetime_energy, np.nan)
+
+    result = {
+        "npv_inr": _present_value(net, rate),
+        "irr": internal_rate_of_return(net),
+        "payback_years": payback_years(net),
+        "lcoe_inr_per_kwh": lcoe,
+        "total_savings_inr": flows["savings_inr"].sum(axis=1),
+    }
+    if include_cash_flows:
+        result.update(
+            {f"{name}_by_year": flows[name] for name in flows if name != "net_cost_inr"}
+        )
+    return result
+
+
+def summarize(result: Dict[str, np.ndarray]) -> Dict:
+    """Distribution of every metric across scenarios (NaNs ignored)."""
+    summary = {"scenarios": len(result["npv_inr"])}
+    for name in METRICS:
+        values = result[name][np.isfinite(result[name])]
+        if not len(values):
+            summary[name] = None
+            continue
+        p10, p50, p90 = np.percentile(values, [10, 50, 90])
+        summary[name] = {
+            "mean": float(values.mean()),
+            "min": float(values.min()),
+            "p10": float(p10),
+            "median": float(p50),
+            "p90": float(p90),
+            "max": float(values.max()),
+            "defined": int(len(values)),
+        }
+    summary["positive_npv_share"] = float((result["npv_inr"] > 0).mean())
+    return summary
+
+
+def evaluate_scenarios(request: Dict, columnar: bool = False) -> Dict:
+    """
+    Service entry point.
+
+    Args:
+        request: {"scenarios": [...], "include_cash_flows": bool} plus
+            optional shared fields (e.g. "annual_energy_kwh" from
+            predict_service) applied to scenarios that omit them
+        columnar: Return the per-scenario results as a dict of arrays
+
+    Returns:
+        Dict with the summary and per-scenario results
+    """
+    overrides = {name: request[name] for name in SCENARIO_DEFAULTS if name in request}
+    try:
+        result = project_finances(
+            request["scenarios"],
+            include_cash_flows=bool(request.get("include_cash_flows")),
+            **overrides,
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+
+    summary = {"status": "success", "summary": summarize(result)}
+    if columnar:
+        per_scenario = {
+            name: values for name, values in result.items() if values.ndim == 1
+        }
+        return {"results": per_scenario, **summary}
+
+    results = []
+    for i in range(len(result["npv_inr"])):
+        row = {"index": i}
+        for name, values in result.items():
+            value = values[i]
+            if values.ndim > 1:
+                row[name] = np.round(value, 2).tolist()
+            else:
+                row[name] = float(value) if np.isfinite(value) else None
+        results.append(row)
+    return {**summary, "results": results}
+
+
+def main():
+    """
+    CLI:
+      python financial_engine.py [--format json|columnar|binary]
+          Evaluates {"scenarios": [...], "annual_energy_kwh": ...} from stdin
+      python financial_engine.py benchmark [n_scenarios]
+          Times random scenarios
+    """
+    try:
+        fmt, args = parse_format_flag(sys.argv[1:])
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+    if args and args[0] == "benchmark":
+        import time
+
+        n = int(args[1]) if len(args) > 1 else 10000
+        rng = np.random.default_rng(42)
+        scenarios = {
+            "tariff_inr_per_kwh": rng.uniform(4, 10, n),
+            "tariff_escalation": rng.uniform(0, 0.05, n),
+            "discount_rate": rng.uniform(0.04, 0.12, n),
+            "degradation_rate": rng.uniform(0.003, 0.01, n),
+            "system_cost_inr_per_kw": rng.uniform(40000, 70000, n),
+            "subsidy_inr": rng.choice([0, 30000, 78000], n),
+            "loan_fraction": rng.choice([0, 0.5, 0.8], n),
+            "loan_years": rng.integers(3, 11, n),
+        }
+        start = time.perf_counter()
+        result = project_finances(scenarios)
+        elapsed = time.perf_counter() - start
+        print(
+            json.dumps(
+                {"scenarios": n, "seconds": elapsed, "summary": summarize(result)},
+                indent=2,
+            )
+        )
+        return
+
+    try:
+        request = read_request(fmt, "scenarios")
+        if "scenarios" not in request:
+            print(json.dumps({"error": "Expected 'scenarios' key in input JSON"}))
+            sys.exit(1)
+        write_response(evaluate_scenarios(request, columnar=fmt != "json"), fmt)
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {str(e)}"}))
+        sys.exit(1)
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Sphere Geometry
+Great-circle distances and the 3D embedding used to search latitude/longitude
+points with a KD-tree (straight-line chords preserve the order of
+great-circle distances), shared by the route planner and weather
+interpolation.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def to_unit_sphere(coords: np.ndarray) -> np.ndarray:
+    """Latitude/longitude to 3D points on a sphere of radius EARTH_RADIUS_KM."""
+    lat, lon = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    return EARTH_RADIUS_KM * np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+
+
+def chord_km(distance_km: float) -> float:
+    """Straight-line distance through the sphere for a great-circle distance."""
+    return 2 * EARTH_RADIUS_KM * np.sin(min(distance_km / (2 * EARTH_RADIUS_KM), 1))
+
+
+def arc_km(chord: np.ndarray) -> np.ndarray:
+    """Great-circle distance for straight-line chords (inverse of chord_km)."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / (2 * EARTH_RADIUS_KM), 0, 1))
+
+
+def haversine_km(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Great-circle distance between rows of a and b (degrees)."""
+    lat1, lon1, lat2, lon2 = map(
+        np.radians, (a[..., 0], a[..., 1], b[..., 0], b[..., 1])
+    )
+    h = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
@@ -12,6 +12,81 @@ from datetime import datetime
 import os
 
 
+# Standard test conditions: 25°C, efficiency ~15%
+PANEL_EFFICIENCY = 0.15
+TEMP_COEFFICIENT = -0.004  # Power loss per degree C above 25°C
+INVERTER_EFFICIENCY = 0.96
+TEMP_MODEL_PARAMS = pvlib.temperature.TEMPERATURE_MODEL_PARAMETERS['sapm']['open_rack_glass_glass']
+
+
+def simulate_pv_system(ghi, dni, dhi, temp_air, wind_speed,
+                       sun_zenith, sun_azimuth,
+                       tilt, azimuth, system_capacity_kw):
+    """
+    Run the irradiance -> cell temperature -> power chain for hourly data.
+    
+    Every argument may be a scalar or a NumPy array; arrays are broadcast
+    against each other (e.g. weather of shape (sites, 1, hours) against
+    system configurations of shape (sites, configs, 1)).
+    
+    Returns:
+        dict: POA irradiance components, cell temperature, DC/AC power,
+        hourly energy and performance ratio as NumPy arrays
+    """
+    # Calculate plane of array (POA) irradiance
+    poa_irradiance = pvlib.irradiance.get_total_irradiance(
+        surface_tilt=tilt,
+        surface_azimuth=azimuth,
+        dni=dni,
+        ghi=ghi,
+        dhi=dhi,
+        solar_zenith=sun_zenith,
+        solar_azimuth=sun_azimuth
+    )
+    poa_global = np.asarray(poa_irradiance['poa_global'])
+    
+    # Calculate cell temperature using SAPM model
+    cell_temperature = pvlib.temperature.sapm_cell(
+        poa_global=poa_global,
+        temp_air=temp_air,
+        wind_speed=wind_speed,
+        a=TEMP_MODEL_PARAMS['a'],
+        b=TEMP_MODEL_PARAMS['b'],
+        deltaT=TEMP_MODEL_PARAMS['deltaT']
+    )
+    
+    # Temperature correction factor
+    temp_correction = 1 + TEMP_COEFFICIENT * (cell_temperature - 25)
+    
+    # Calculate DC power output
+    dc_power_kw = (poa_global / 1000) * system_capacity_kw * PANEL_EFFICIENCY * temp_correction
+    dc_power_kw = np.clip(dc_power_kw, 0, None)
+    
+    # AC power (assuming 96% inverter efficiency)
+    ac_power_kw = dc_power_kw * INVERTER_EFFICIENCY
+    
+    # Calculate performance metrics
+    with np.errstate(divide='ignore', invalid='ignore'):
+        performance_ratio = np.where(
+            ghi > 0,
+            ac_power_kw / ((ghi / 1000) * system_capacity_kw * PANEL_EFFICIENCY),
+            0
+        )
+    
+    return {
+        'poa_global': poa_global,
+        'poa_direct': np.asarray(poa_irradiance['poa_direct']),
+        'poa_diffuse': np.asarray(poa_irradiance['poa_diffuse']),
+        'poa_sky_diffuse': np.asarray(poa_irradiance['poa_sky_diffuse']),
+        'poa_ground_diffuse': np.asarray(poa_irradiance['poa_ground_diffuse']),
+        'cell_temperature': np.asarray(cell_temperature),
+        'dc_power_kw': dc_power_kw,
+        'ac_power_kw': ac_power_kw,
+        'energy_kwh': ac_power_kw * 1.0,  # 1 hour intervals
+        'performance_ratio': performance_ratio,
+    }
+
+
 def prepare_ml_training_data(csv_path, output_path=None, 
                              latitude=40.79, longitude=-73.95,
                              tilt=30, azimuth=180, 
@@ -77,63 +152,21 @@ def prepare_ml_training_data(csv_path, output_path=None,
     df['sun_azimuth'] = solar_position['azimuth'].values
     df['sun_zenith'] = solar_position['apparent_zenith'].values
     
-    print("Calculating POA irradiance...")
-    # Calculate plane of array (POA) irradiance
-    poa_irradiance = pvlib.irradiance.get_total_irradiance(
-        surface_tilt=tilt,
-        surface_azimuth=azimuth,
-        dni=df['dni'],
-        ghi=df['ghi'],
-        dhi=df['dhi'],
-        solar_zenith=df['sun_zenith'],
-        solar_azimuth=df['sun_azimuth']
-    )
-    
-    df['poa_global'] = poa_irradiance['poa_global'].values
-    df['poa_direct'] = poa_irradiance['poa_direct'].values
-    df['poa_diffuse'] = poa_irradiance['poa_diffuse'].values
-    df['poa_sky_diffuse'] = poa_irradiance['poa_sky_diffuse'].values
-    df['poa_ground_diffuse'] = poa_irradiance['poa_ground_diffuse'].values
-    
-    print("Calculating cell temperature...")
-    # Calculate cell temperature using SAPM model
-    temp_model_params = pvlib.temperature.TEMPERATURE_MODEL_PARAMETERS['sapm']['open_rack_glass_glass']
-    cell_temp = pvlib.temperature.sapm_cell(
-        poa_global=df['poa_global'],
-        temp_air=df['temp_air'],
-        wind_speed=df['wind_speed'],
-        a=temp_model_params['a'],
-        b=temp_model_params['b'],
-        deltaT=temp_model_params['deltaT']
-    )
-    df['cell_temperature'] = cell_temp.values
-    
-    print("Calculating power output...")
-    # Calculate power output with temperature coefficient
-    # Standard test conditions: 25°C, efficiency ~15%
-    efficiency = 0.15
-    temp_coefficient = -0.004  # Power loss per degree C above 25°C
-    
-    # Temperature correction factor
-    temp_correction = 1 + temp_coefficient * (df['cell_temperature'] - 25)
-    
-    # Calculate DC power output
-    df['dc_power_kw'] = (df['poa_global'] / 1000) * system_capacity_kw * efficiency * temp_correction
-    df['dc_power_kw'] = df['dc_power_kw'].clip(lower=0)
-    
-    # AC power (assuming 96% inverter efficiency)
-    inverter_efficiency = 0.96
-    df['ac_power_kw'] = df['dc_power_kw'] * inverter_efficiency
-    
-    # Calculate hourly energy
-    df['energy_kwh'] = df['ac_power_kw'] * 1.0  # 1 hour intervals
-    
-    # Calculate performance metrics
-    df['performance_ratio'] = np.where(
-        df['ghi'] > 0,
-        df['ac_power_kw'] / ((df['ghi'] / 1000) * system_capacity_kw * efficiency),
-        0
+    print("Calculating POA irradiance, cell temperature and power output...")
+    outputs = simulate_pv_system(
+        ghi=df['ghi'].values,
+        dni=df['dni'].values,
+        dhi=df['dhi'].values,
+        temp_air=df['temp_air'].values,
+        wind_speed=df['wind_speed'].values,
+        sun_zenith=df['sun_zenith'].values,
+        sun_azimuth=df['sun_azimuth'].values,
+        tilt=tilt,
+        azimuth=azimuth,
+        system_capacity_kw=system_capacity_kw
     )
+    for column, values in outputs.items():
+        df[column] = values
     
     # Reorder columns for better readability
     column_order = [
@@ -0,0 +1,216 @@
+"""
+Maintenance Loss Lookup Grid
+Evaluates the maintenance RandomForest once over a dense grid of its inputs
+and serves predictions by multilinear interpolation in that float32 table:
+a few array operations per panel, with no scaler, forest or sklearn involved.
+
+Axes span the training data range of each feature. A tree never splits
+outside that range, so clamping inputs to it loses nothing. The table grows
+exponentially with the number of features, so axes are coarsened to keep it
+within MAX_GRID_MB.
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Grid points per feature (one per day for days_since_cleaning)
+DEFAULT_GRID_POINTS = 65
+GRID_POINTS = {"days_since_cleaning": None}  # None: one point per unit
+MAX_GRID_MB = 64.0
+# Serving uses the grid only if its measured error is within this many
+# percentage points of efficiency loss
+GRID_TOLERANCE_PCT = 0.5
+# The measured maximum error is a lower bound on the true one (the forest
+# jumps at its splits, anywhere in a cell), so the gate applies a margin
+GRID_ERROR_MARGIN = 1.25
+ERROR_SAMPLES = 100_000
+# Points on either side of every forest split, per split and side, with the
+# other features random: where the interpolation error peaks
+THRESHOLD_PROBES = 32
+COMPILE_CHUNK_ROWS = 200_000
+
+
+class LossGrid:
+    """Efficiency loss tabulated on a regular grid, with multilinear lookup."""
+
+    def __init__(
+        self,
+        features: Sequence[str],
+        lower: Sequence[float],
+        upper: Sequence[float],
+        values: np.ndarray,
+    ):
+        self.features = list(features)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.values = np.asarray(values, dtype=np.float32)
+        self.points = np.array(self.values.shape)
+        span = self.upper - self.lower
+        self.step = np.where(self.points > 1, span / np.maximum(self.points - 1, 1), 1)
+
+    @classmethod
+    def axes_for(
+        cls,
+        features: Sequence[str],
+        lower: Sequence[float],
+        upper: Sequence[float],
+        points: Optional[Dict[str, Optional[int]]] = None,
+    ) -> List[np.ndarray]:
+        """Grid coordinates along each feature."""
+        points = {**GRID_POINTS, **(points or {})}
+        axes = []
+        for feature, lo, hi in zip(features, lower, upper):
+            n = points.get(feature, DEFAULT_GRID_POINTS)
+            if n is None:
+                n = int(np.floor(hi - lo)) + 1
+                hi = lo + n - 1
+            axes.append(np.linspace(lo, hi, n) if hi > lo else np.array([lo]))
+        return axes
+
+    @classmethod
+    def fit_budget(
+        cls, axes: List[np.ndarray], max_mb: float = MAX_GRID_MB
+    ) -> List[np.ndarray]:
+        """
+        Axes coarsened, largest first, until the float32 table fits in max_mb.
+
+        Raises:
+            ValueError: If even two points per axis do not fit
+        """
+        max_cells = max_mb * 1024 * 1024 / np.dtype(np.float32).itemsize
+        points = [len(axis) for axis in axes]
+        if np.prod([min(n, 2) for n in points], dtype=float) > max_cells:
+            raise ValueError(
+                f"A loss grid over {len(axes)} features needs over {max_mb} MB "
+                f"even with 2 points per axis"
+            )
+        while np.prod(points, dtype=float) > max_cells:
+            largest = int(np.argmax(points))
+            points[largest] = max(2, int(points[largest] * 0.9))
+        return [
+            np.linspace(axis[0], axis[-1], n) if n < len(axis) else axis
+            for axis, n in zip(axes, points)
+        ]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Interpolated loss for rows of X (columns in self.features order)."""
+        X = np.asarray(X, dtype=np.float64)
+        position = (np.clip(X, self.lower, self.upper) - self.lower) / self.step
+        cell = np.minimum(position.astype(np.int64), np.maximum(self.points - 2, 0))
+        weight = position - cell
+
+        result = np.zeros(len(X))
+        for corner in range(2 ** len(self.features)):
+            bits = (corner >> np.arange(len(self.features))) & 1
+            if (bits > self.points - 1).any():
+                continue  # Single-point axes have no upper neighbour
+            corner_weight = np.prod(np.where(bits, weight, 1 - weight), axis=1)
+            result += corner_weight * self.values[tuple((cell + bits).T)]
+        return result
+
+
+def compile_loss_grid(
+    model,
+    bundle,
+    lower: Sequence[float],
+    upper: Sequence[float],
+    points: Optional[Dict[str, Optional[int]]] = None,
+    max_mb: float = MAX_GRID_MB,
+) -> LossGrid:
+    """
+    Evaluate the forest at every grid point, in chunks. The axes are
+    coarsened to fit max_mb before the table is allocated (ValueError if
+    they cannot be).
+    """
+    features = bundle.features
+    axes = LossGrid.fit_budget(
+        LossGrid.axes_for(features, lower, upper, points), max_mb
+    )
+    shape = tuple(len(axis) for axis in axes)
+    values = np.empty(int(np.prod(shape)), dtype=np.float32)
+    for start in range(0, len(values), COMPILE_CHUNK_ROWS):
+        flat = np.arange(start, min(start + COMPILE_CHUNK_ROWS, len(values)))
+        index = np.unravel_index(flat, shape)
+        X = np.column_stack([axis[i] for axis, i in zip(axes, index)])
+        values[flat] = model.predict(bundle.scale(X))
+    return LossGrid(
+        features,
+        [axis[0] for axis in axes],
+        [axis[-1] for axis in axes],
+        values.reshape(shape),
+    )
+
+
+def split_thresholds(model, bundle) -> List[np.ndarray]:
+    """
+    Forest split thresholds of every feature, in input (unscaled) units;
+    empty for models without trees.
+    """
+    trees = getattr(model, "estimators_", None)
+    params = bundle.manifest["scaler"]
+    out = []
+    for i in range(len(bundle.features)):
+        if trees is None:
+            out.append(np.empty(0))
+            continue
+        scaled = np.unique(
+            np.concatenate(
+                [tree.tree_.threshold[tree.tree_.feature == i] for tree in trees]
+            )
+        )
+        out.append(scaled * params["scale"][i] + params["mean"][i])
+    return out
+
+
+def measure_grid_error(
+    grid: LossGrid,
+    model,
+    bundle,
+    n_samples: int = ERROR_SAMPLES,
+    probes_per_threshold: int = THRESHOLD_PROBES,
+    seed: int = 42,
+    integer_features: Sequence[str] = ("days_since_cleaning",),
+) -> Dict:
+    """
+    Compare the grid with the forest at random points in the grid's range,
+    and at points just either side of every forest split along each feature
+    (the other features random), where the forest jumps and the error
+    peaks. Features in integer_features are sampled as whole numbers, as
+    they are served.
+    """
+    rng = np.random.default_rng(seed)
+
+    def uniform(n):
+        X = rng.uniform(grid.lower, grid.upper, size=(n, len(grid.features)))
+        for i, feature in enumerate(grid.features):
+            if feature in integer_features:
+                X[:, i] = np.round(X[:, i])
+        return X
+
+    probes = []
+    for i, thresholds in enumerate(split_thresholds(model, bundle)):
+        lo, hi = grid.lower[i], grid.upper[i]
+        thresholds = thresholds[(thresholds > lo) & (thresholds < hi)]
+        if grid.features[i] in integer_features:
+            sides = np.unique(np.r_[np.floor(thresholds), np.ceil(thresholds)])
+        else:
+            eps = 1e-6 * (hi - lo)
+            sides = np.r_[thresholds - eps, thresholds + eps]
+        X = uniform(len(sides) * probes_per_threshold)
+        X[:, i] = np.repeat(sides, probes_per_threshold)
+        probes.append(X)
+
+    X = np.vstack([uniform(n_samples)] + probes)
+    error = np.abs(grid.predict(X) - model.predict(bundle.scale(X)))
+    return {
+        "samples": n_samples,
+        "threshold_probes": len(X) - n_samples,
+        "max_abs_error_pct": float(error.max()),
+        "mean_abs_error_pct": float(error[:n_samples].mean()),
+        "p99_abs_error_pct": float(np.percentile(error[:n_samples], 99)),
+        "error_method": (
+            "max over uniform samples and points either side of every forest "
+            "split; a lower bound on the true maximum"
+        ),
+    }
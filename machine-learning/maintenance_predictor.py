@@ -7,27 +7,53 @@ Predicts efficiency degradation and optimal cleaning timing based on:
 """
 
 import json
-import joblib
 import os
 import sys
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
+
+from compact_dtypes import compact_dtypes_enabled, compact_frame, read_training_csv
+from maintenance_grid import (
+    GRID_ERROR_MARGIN,
+    GRID_POINTS,
+    GRID_TOLERANCE_PCT,
+    MAX_GRID_MB,
+    LossGrid,
+    compile_loss_grid,
+    measure_grid_error,
+)
+from model_bundle import load_bundle, write_bundle
+from resource_profile import stage
+from thread_budget import apply_thread_budget, cap_estimator_jobs, get_budget
+from wire_format import parse_format_flag, read_request, write_response
 
 MODELS_DIR = Path(__file__).parent / "models"
-MAINTENANCE_MODEL_PATH = MODELS_DIR / "maintenance_predictor.pkl"
-MAINTENANCE_SCALER_PATH = MODELS_DIR / "maintenance_scaler.pkl"
+MAINTENANCE_BUNDLE_PATH = MODELS_DIR / "maintenance.bundle"
+
+# Fleet mode: panels scored per chunk and worst panels reported
+FLEET_CHUNK_ROWS = 50_000
+FLEET_TOP_N = 20
+URGENCY_LEVELS = ["low", "medium", "high"]
 
+# "auto" serves from the compiled loss grid when its error is within
+# tolerance; "off" always runs the forest
+GRID_MODE = os.environ.get("SOLAR_ML_MAINTENANCE_GRID", "auto")
 
-def create_maintenance_training_data(base_data_csv: str = None) -> pd.DataFrame:
+
+def create_maintenance_training_data(
+    base_data_csv: str = None, compact: Optional[bool] = None
+) -> pd.DataFrame:
     """
     Generate synthetic maintenance training data based on environmental conditions.
     In production, this would use real maintenance logs.
+
+    With compact dtypes (see compact_dtypes; default: SOLAR_ML_COMPACT_DTYPES)
+    the features are float32 and small ints; the target stays float64.
     """
+    compact = compact_dtypes_enabled(compact)
     if base_data_csv is None:
         base_data_csv = os.path.join(
             os.path.dirname(__file__),
@@ -35,7 +61,8 @@ def create_maintenance_training_data(base_data_csv: str = None) -> pd.DataFrame:
             "POWER_Point_Hourly_20250902_20251104_040d79N_073d95W_LST_prepared.csv",
         )
 
-    df = pd.read_csv(base_data_csv)
+    with stage("data_loading"):
+        df = read_training_csv(base_data_csv, compact)
 
     # Simulate maintenance scenarios
     np.random.seed(42)
@@ -74,6 +101,10 @@ def create_maintenance_training_data(base_data_csv: str = None) -> pd.DataFrame:
         (samples["efficiency_loss_pct"] > 8) | (samples["days_since_cleaning"] > 60)
     ).astype(int)
 
+    if compact:
+        compact_frame(samples, keep=["efficiency_loss_pct"])
+        samples["days_since_cleaning"] = samples["days_since_cleaning"].astype(np.int16)
+        samples["should_clean"] = samples["should_clean"].astype(np.int8)
     return samples
 
 
@@ -84,8 +115,13 @@ def train_maintenance_predictor(data_csv_path: str = None):
     Args:
         data_csv_path: Path to CSV with maintenance data
     """
+    # Imported here so serving from the loss grid does not load sklearn
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import StandardScaler
+
     print("Generating maintenance training data...")
-    df = create_maintenance_training_data(data_csv_path)
+    with stage("data_generation"):
+        df = create_maintenance_training_data(data_csv_path)
 
     # Features for prediction
     feature_cols = [
@@ -113,19 +149,26 @@ def train_maintenance_predictor(data_csv_path: str = None):
     y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
 
     # Standardize features
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
+    with stage("feature_engineering"):
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
 
     # Train Random Forest
     model = RandomForestRegressor(
-        n_estimators=100, max_depth=10, min_samples_leaf=5, random_state=42, n_jobs=-1
+        n_estimators=100,
+        max_depth=10,
+        min_samples_leaf=5,
+        random_state=42,
+        n_jobs=get_budget("training"),
     )
-    model.fit(X_train_scaled, y_train)
+    with stage("fit"):
+        model.fit(X_train_scaled, y_train)
 
     # Evaluate
-    train_score = model.score(X_train_scaled, y_train)
-    test_score = model.score(X_test_scaled, y_test)
+    with stage("predict"):
+        train_score = model.score(X_train_scaled, y_train)
+        test_score = model.score(X_test_scaled, y_test)
     print(f"Training R²: {train_score:.4f}")
     print(f"Test R²: {test_score:.4f}")
 
@@ -137,63 +180,170 @@ def train_maintenance_predictor(data_csv_path: str = None):
     print(importance.to_string(index=False))
 
     # Save model
-    os.makedirs(MODELS_DIR, exist_ok=True)
-    joblib.dump(model, MAINTENANCE_MODEL_PATH)
-    joblib.dump(scaler, MAINTENANCE_SCALER_PATH)
-    joblib.dump(available_features, MODELS_DIR / "maintenance_features.pkl")
+    with stage("serialize"):
+        write_bundle(
+            MAINTENANCE_BUNDLE_PATH,
+            "maintenance",
+            {"model": model, "scaler": scaler},
+            features=available_features,
+            metadata={
+                "model_type": "RandomForestRegressor",
+                "training_rows": len(X_train),
+                "train_r2": float(train_score),
+                "test_r2": float(test_score),
+                "feature_ranges": {
+                    "lower": X.min().astype(float).tolist(),
+                    "upper": X.max().astype(float).tolist(),
+                },
+            },
+        )
 
-    print(f"\nMaintenance predictor saved to {MAINTENANCE_MODEL_PATH}")
+    print(f"\nMaintenance predictor saved to {MAINTENANCE_BUNDLE_PATH}")
 
     return model, scaler, available_features
 
 
-def predict_maintenance_need(panel_data: List[Dict]) -> Dict:
+def compile_maintenance_grid(
+    data_csv_path: str = None,
+    points_per_axis: Optional[int] = None,
+    max_mb: float = MAX_GRID_MB,
+) -> Dict:
+    """
+    Tabulate the trained forest on a dense grid (see maintenance_grid),
+    measure the interpolation error against the forest and store the grid in
+    the maintenance bundle. Serving switches to the grid when the error is
+    within GRID_TOLERANCE_PCT (after a GRID_ERROR_MARGIN safety margin).
+
+    Args:
+        data_csv_path: Training data, for bundles without feature ranges
+        points_per_axis: Grid points per feature (default
+            maintenance_grid.DEFAULT_GRID_POINTS; days_since_cleaning keeps
+            one per day)
+        max_mb: Size limit of the grid; axes are coarsened to fit it, and
+            the grid is skipped if they cannot be
+    """
+    bundle = load_bundle(MAINTENANCE_BUNDLE_PATH)
+    model = bundle.get("model")
+    ranges = bundle.metadata.get("feature_ranges")
+    if ranges is None:
+        # Bundles from before feature ranges were recorded
+        X = create_maintenance_training_data(data_csv_path)
+        X = X.reindex(columns=bundle.features).fillna(0)
+        ranges = {
+            "lower": X.min().astype(float).tolist(),
+            "upper": X.max().astype(float).tolist(),
+        }
+
+    points = None
+    if points_per_axis is not None:
+        points = {f: points_per_axis for f in bundle.features if f not in GRID_POINTS}
+
+    print("Compiling maintenance loss grid...")
+    with stage("compile_grid"):
+        try:
+            grid = compile_loss_grid(
+                model, bundle, ranges["lower"], ranges["upper"], points, max_mb
+            )
+        except ValueError as e:
+            print(f"Loss grid skipped, serving from the forest: {e}")
+            return {"skipped": str(e)}
+        error = measure_grid_error(grid, model, bundle)
+
+    report = {
+        "shape": list(grid.values.shape),
+        "lower": grid.lower.tolist(),
+        "upper": grid.upper.tolist(),
+        "size_bytes": int(grid.values.nbytes),
+        **error,
+        "tolerance_pct": GRID_TOLERANCE_PCT,
+        "safety_margin": GRID_ERROR_MARGIN,
+        "use_grid": error["max_abs_error_pct"] * GRID_ERROR_MARGIN
+        <= GRID_TOLERANCE_PCT,
+    }
+    components = {name: bundle.get(name) for name in bundle.component_names()}
+    components["loss_grid"] = grid.values
+    write_bundle(
+        MAINTENANCE_BUNDLE_PATH,
+        "maintenance",
+        components,
+        features=bundle.features,
+        metadata={**bundle.metadata, "feature_ranges": ranges, "loss_grid": report},
+    )
+    print(
+        f"Loss grid {report['shape']} ({report['size_bytes'] / 1e6:.1f} MB), max "
+        f"error {report['max_abs_error_pct']:.3f} pts: "
+        f"{'serving from grid' if report['use_grid'] else 'over tolerance, not used'}"
+    )
+    return report
+
+
+def _uses_grid(bundle) -> bool:
+    grid = bundle.metadata.get("loss_grid")
+    return GRID_MODE != "off" and grid is not None and grid["use_grid"]
+
+
+def _predict_loss(bundle, X: np.ndarray) -> np.ndarray:
+    """Efficiency loss from the compiled grid if enabled, else the forest."""
+    if _uses_grid(bundle):
+        info = bundle.metadata["loss_grid"]
+        grid = LossGrid(
+            bundle.features, info["lower"], info["upper"], bundle.get("loss_grid")
+        )
+        return grid.predict(X)
+
+    model = cap_estimator_jobs(bundle.get("model"), get_budget("serving"))
+    return model.predict(bundle.scale(X))
+
+
+def predict_maintenance_need(panel_data: List[Dict], columnar: bool = False) -> Dict:
     """
     Predict efficiency loss and maintenance needs.
 
     Args:
-        panel_data: List of dicts with panel conditions
+        panel_data: List of dicts with panel conditions, or a dict of arrays
+            with one entry per feature
+        columnar: Return the per-panel results as a dict of arrays instead of
+            one dict per panel
 
     Returns:
         Dict with maintenance predictions
     """
-    # Load model
-    if not MAINTENANCE_MODEL_PATH.exists():
+    # Load model bundle
+    if not MAINTENANCE_BUNDLE_PATH.exists():
         return {
             "error": "Maintenance predictor model not found. Please train first.",
-            "model_path": str(MAINTENANCE_MODEL_PATH),
+            "model_path": str(MAINTENANCE_BUNDLE_PATH),
         }
 
-    model = joblib.load(MAINTENANCE_MODEL_PATH)
-    scaler = joblib.load(MAINTENANCE_SCALER_PATH)
-    feature_names = joblib.load(MODELS_DIR / "maintenance_features.pkl")
+    bundle = load_bundle(MAINTENANCE_BUNDLE_PATH)
+    feature_names = bundle.features
 
     # Convert to DataFrame
     df = pd.DataFrame(panel_data)
 
     # Check for required features
-    missing_features = [f for f in feature_names if f not in df.columns]
-    if missing_features:
-        # Fill with defaults for optional features
-        for feat in missing_features:
-            if feat != "days_since_cleaning":  # This one is required
-                df[feat] = 0
-
-        # Re-check
-        missing_features = [f for f in feature_names if f not in df.columns]
-        if missing_features:
-            return {
-                "error": f"Missing required features: {missing_features}",
-                "required_features": feature_names,
-            }
-
-    X = df[feature_names].fillna(0).values
-
-    # Standardize
-    X_scaled = scaler.transform(X)
+    X, error = _feature_matrix(df, feature_names)
+    if error:
+        return error
 
     # Predict efficiency loss
-    predicted_loss = model.predict(X_scaled)
+    predicted_loss = _predict_loss(bundle, X)
+
+    if columnar:
+        days_since = (
+            df["days_since_cleaning"].fillna(0).to_numpy()
+            if "days_since_cleaning" in df.columns
+            else np.zeros(len(df))
+        )
+        results = _maintenance_columns(predicted_loss, days_since)
+        return {
+            "status": "success",
+            "total_panels": len(predicted_loss),
+            "panels_needing_cleaning": int(results["should_clean"].sum()),
+            "average_efficiency_loss_pct": float(np.mean(predicted_loss)),
+            "results": results,
+            "model_info": _model_info(bundle),
+        }
 
     results = []
     for i, loss in enumerate(predicted_loss):
@@ -235,12 +385,189 @@ def predict_maintenance_need(panel_data: List[Dict]) -> Dict:
         "panels_needing_cleaning": panels_needing_cleaning,
         "average_efficiency_loss_pct": avg_loss,
         "results": results,
-        "model_info": {
-            "model_type": "RandomForestRegressor",
-            "features_used": feature_names,
-            "cleaning_threshold_pct": 8.0,
-            "max_days_between_cleaning": 60,
-        },
+        "model_info": _model_info(bundle),
+    }
+
+
+def _feature_matrix(
+    df: pd.DataFrame, feature_names: List[str]
+) -> Tuple[Optional[np.ndarray], Optional[Dict]]:
+    """
+    Model inputs for df, with optional features defaulted to 0.
+
+    Returns:
+        (X, None), or (None, error) if days_since_cleaning is missing
+    """
+    missing_features = [f for f in feature_names if f not in df.columns]
+    if missing_features:
+        # Fill with defaults for optional features
+        for feat in missing_features:
+            if feat != "days_since_cleaning":  # This one is required
+                df[feat] = 0
+
+        # Re-check
+        missing_features = [f for f in feature_names if f not in df.columns]
+        if missing_features:
+            return None, {
+                "error": f"Missing required features: {missing_features}",
+                "required_features": feature_names,
+            }
+
+    return df[feature_names].fillna(0).values, None
+
+
+def _iter_panel_chunks(
+    panel_data: Union[str, List[Dict], Dict], chunk_rows: int
+) -> Iterator[pd.DataFrame]:
+    """Panels in chunks: from a CSV path (read lazily) or in-memory data."""
+    if isinstance(panel_data, str):
+        yield from pd.read_csv(panel_data, chunksize=chunk_rows)
+        return
+    df = pd.DataFrame(panel_data)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start : start + chunk_rows].copy()
+
+
+def assess_fleet(
+    panel_data: Union[str, List[Dict], Dict],
+    top_n: int = FLEET_TOP_N,
+    include_results: bool = False,
+    chunk_rows: int = FLEET_CHUNK_ROWS,
+) -> Dict:
+    """
+    Fleet-scale maintenance assessment with array operations only.
+
+    Panels are scored in chunks of chunk_rows, so intermediate memory stays
+    bounded, and only aggregates are kept: counts per urgency level, the
+    number needing cleaning, the mean loss and the top_n panels with the
+    highest predicted loss.
+
+    Args:
+        panel_data: List of dicts, a dict of arrays, or the path of a CSV
+            with one row per panel (an optional "panel_id" column names them)
+        top_n: Number of worst panels to report
+        include_results: Also return every panel's recommendation as a dict
+            of arrays (as in columnar mode)
+        chunk_rows: Panels per chunk
+
+    Returns:
+        Dict with fleet aggregates and the worst panels
+    """
+    if not MAINTENANCE_BUNDLE_PATH.exists():
+        return {
+            "error": "Maintenance predictor model not found. Please train first.",
+            "model_path": str(MAINTENANCE_BUNDLE_PATH),
+        }
+
+    bundle = load_bundle(MAINTENANCE_BUNDLE_PATH)
+    feature_names = bundle.features
+
+    total = 0
+    loss_sum = 0.0
+    needing_cleaning = 0
+    urgency_counts = np.zeros(len(URGENCY_LEVELS), dtype=np.int64)
+    worst_loss = np.empty(0)
+    worst_rows: List[Dict] = []
+    parts = []
+    for chunk in _iter_panel_chunks(panel_data, chunk_rows):
+        X, error = _feature_matrix(chunk, feature_names)
+        if error:
+            return error
+
+        predicted_loss = _predict_loss(bundle, X)
+        days_since = chunk["days_since_cleaning"].fillna(0).to_numpy()
+        columns = _maintenance_columns(predicted_loss, days_since)
+        columns["index"] += total
+        if "panel_id" in chunk.columns:
+            columns["panel_id"] = chunk["panel_id"].astype(str).to_numpy()
+
+        loss_sum += float(predicted_loss.sum())
+        needing_cleaning += int(columns["should_clean"].sum())
+        urgency_counts += np.bincount(
+            (predicted_loss > 8).astype(int) + (predicted_loss > 12),
+            minlength=len(URGENCY_LEVELS),
+        )
+
+        # Merge this chunk's worst panels into the running top_n
+        candidates = np.argsort(-predicted_loss, kind="stable")[:top_n]
+        merged_loss = np.concatenate([worst_loss, predicted_loss[candidates]])
+        merged_rows = worst_rows + [
+            {name: values[i] for name, values in columns.items()} for i in candidates
+        ]
+        keep = np.argsort(-merged_loss, kind="stable")[:top_n]
+        worst_loss = merged_loss[keep]
+        worst_rows = [merged_rows[i] for i in keep]
+
+        if include_results:
+            parts.append(columns)
+        total += len(chunk)
+
+    if total == 0:
+        return {"error": "No panels provided"}
+
+    result = {
+        "status": "success",
+        "total_panels": total,
+        "panels_needing_cleaning": needing_cleaning,
+        "average_efficiency_loss_pct": loss_sum / total,
+        "urgency_counts": dict(zip(URGENCY_LEVELS, urgency_counts.tolist())),
+        "worst_panels": [
+            {
+                name: value.item() if isinstance(value, np.generic) else value
+                for name, value in row.items()
+            }
+            for row in worst_rows
+        ],
+        "model_info": _model_info(bundle),
+    }
+    if include_results:
+        result["results"] = {
+            name: np.concatenate([part[name] for part in parts]) for name in parts[0]
+        }
+    return result
+
+
+def _model_info(bundle) -> Dict:
+    return {
+        "model_type": "RandomForestRegressor",
+        "inference": "loss_grid" if _uses_grid(bundle) else "forest",
+        "features_used": bundle.features,
+        "cleaning_threshold_pct": 8.0,
+        "max_days_between_cleaning": 60,
+    }
+
+
+def _maintenance_columns(
+    predicted_loss: np.ndarray, days_since: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """Vectorized form of the per-panel recommendations in predict_maintenance_need."""
+    should_clean = (predicted_loss > 8) | (days_since > 60)
+
+    # Linear extrapolation of the loss rate; with no measurable loss yet only
+    # the 60-day rule applies
+    loss_rate = predicted_loss / np.maximum(days_since, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        extrapolated = np.where(
+            loss_rate > 0, (8 - predicted_loss) / loss_rate, 60 - days_since
+        )
+    days_until_cleaning = np.where(
+        should_clean | (predicted_loss >= 8), 0, np.trunc(extrapolated)
+    )
+
+    return {
+        "index": np.arange(len(predicted_loss)),
+        "days_since_cleaning": days_since.astype(int),
+        "predicted_efficiency_loss_pct": predicted_loss,
+        "should_clean": should_clean,
+        "days_until_cleaning_recommended": np.maximum(days_until_cleaning, 0).astype(
+            int
+        ),
+        "urgency": np.where(
+            predicted_loss > 12,
+            "high",
+            np.where(predicted_loss > 8, "medium", "low"),
+        ),
+        "estimated_recovery_pct": predicted_loss * 0.9,  # Cleaning recovers ~90%
     }
 
 
@@ -248,18 +575,70 @@ def main():
     """
     Main entry point for CLI and stdin/stdout interface.
     Modes:
-      - train: Train the maintenance predictor
+      - train [data_path] [--points N] [--max-mb MB]: Train the maintenance
+        predictor and compile its loss grid
+      - compile-grid [data_path] [--points N] [--max-mb MB]: Recompile the
+        loss grid of the trained predictor with N points per feature (one
+        per day for days_since_cleaning), coarsened to fit MB
+      - fleet [top_n] [--results]: Fleet aggregates and the worst panels for
+        {"panel_data": ...} via stdin, or {"panel_data_path": "panels.csv"}
+        to read a CSV in chunks
       - predict: Predict maintenance needs (JSON via stdin)
+    Prediction and fleet modes accept --format json|columnar|binary (see
+    wire_format).
     """
-    if len(sys.argv) > 1 and sys.argv[1] == "train":
-        # Training mode
-        data_path = sys.argv[2] if len(sys.argv) > 2 else None
-        train_maintenance_predictor(data_path)
+    try:
+        fmt, args = parse_format_flag(sys.argv[1:])
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+    if args and args[0] in ("train", "compile-grid"):
+        grid_options = {}
+        positional = []
+        options = iter(args[1:])
+        for arg in options:
+            if arg == "--points":
+                grid_options["points_per_axis"] = int(next(options))
+            elif arg == "--max-mb":
+                grid_options["max_mb"] = float(next(options))
+            else:
+                positional.append(arg)
+        data_path = positional[0] if positional else None
+        if args[0] == "train":
+            apply_thread_budget("training")
+            train_maintenance_predictor(data_path)
+        compile_maintenance_grid(data_path, **grid_options)
+        return
+
+    if args and args[0] == "fleet":
+        apply_thread_budget("serving")
+        include_results = "--results" in args
+        args = [arg for arg in args if arg != "--results"]
+        top_n = int(args[1]) if len(args) > 1 else FLEET_TOP_N
+        try:
+            input_data = read_request(fmt, "panel_data")
+            panel_data = input_data.get("panel_data_path", input_data.get("panel_data"))
+            if panel_data is None:
+                print(
+                    json.dumps(
+                        {"error": "Expected 'panel_data' or 'panel_data_path' key"}
+                    )
+                )
+                sys.exit(1)
+            write_response(assess_fleet(panel_data, top_n, include_results), fmt)
+        except json.JSONDecodeError as e:
+            print(json.dumps({"error": f"Invalid JSON input: {str(e)}"}))
+            sys.exit(1)
+        except Exception as e:
+            print(json.dumps({"error": str(e)}))
+            sys.exit(1)
         return
 
     # Prediction mode (default)
+    apply_thread_budget("serving")
     try:
-        input_data = json.loads(sys.stdin.read())
+        input_data = read_request(fmt, "panel_data")
 
         # Expect: {"panel_data": [{...}, {...}]}
         if "panel_data" not in input_data:
@@ -277,8 +656,10 @@ def main():
             )
             sys.exit(1)
 
-        result = predict_maintenance_need(input_data["panel_data"])
-        print(json.dumps(result, indent=2))
+        result = predict_maintenance_need(
+            input_data["panel_data"], columnar=fmt != "json"
+        )
+        write_response(result, fmt)
 
     except json.JSONDecodeError as e:
         print(json.dumps({"error": f"Invalid JSON input: {str(e)}"}))
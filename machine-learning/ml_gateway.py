@@ -0,0 +1,372 @@
+"""
+Local ML Gateway
+One long-lived process that serves the power, anomaly and maintenance models
+to the backend, instead of a Python process (and model load) per request.
+
+Clients connect to a Unix socket (or a localhost TCP port) and exchange
+newline-delimited JSON: {"id": ..., "service": "predict" | "anomaly" |
+"maintenance", "payload": {...}} in, {"id": ..., "result": {...}} out, where
+payload is what the service's script reads on stdin and result is what it
+would print. Responses may come back out of order; match them by id.
+
+Each model has a bounded request queue and a batcher that coalesces requests
+arriving within BATCH_WINDOW_SECONDS (up to BATCH_MAX_ITEMS rows) into one
+vectorized call, then splits the results back out to the callers. At most
+MODEL_CONCURRENCY batches per model run at once; a request that cannot be
+queued within ENQUEUE_TIMEOUT_SECONDS is answered with an overload error.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from thread_budget import apply_thread_budget
+
+GATEWAY_SOCKET = os.environ.get("SOLAR_ML_GATEWAY_SOCKET", "/tmp/solar-ml-gateway.sock")
+GATEWAY_PORT = os.environ.get("SOLAR_ML_GATEWAY_PORT")  # Listen on TCP instead
+BATCH_WINDOW_SECONDS = 0.002
+BATCH_MAX_ITEMS = 64  # Rows (readings, panels or requests) per batch
+QUEUE_SIZE = 256  # Requests waiting per model
+MODEL_CONCURRENCY = 1  # Batches in flight per model
+ENQUEUE_TIMEOUT_SECONDS = 1.0
+MAX_LINE_BYTES = 64 * 1024 * 1024
+
+
+def run_predict(payloads: List[Dict]) -> List[Dict]:
+    from predict_service import predict_solar_output_batch
+
+    return predict_solar_output_batch(payloads)
+
+
+def _run_row_batches(
+    payloads: List[Dict],
+    key: str,
+    run: Callable[[List[Dict]], Dict],
+    summarize: Callable[[List[Dict]], Dict],
+) -> List[Dict]:
+    """
+    Run the row lists payload[key] of several requests as one call and split
+    the results back out: each caller gets its own rows, re-indexed from 0,
+    with totals recomputed by summarize.
+
+    Requests without a non-empty list of rows, and every request when the
+    combined call fails, are run on their own.
+    """
+    responses: List[Dict] = [None] * len(payloads)
+    batched = []
+    for i, payload in enumerate(payloads):
+        if key not in payload:
+            responses[i] = {"error": f"Expected '{key}' key in input JSON"}
+        elif isinstance(payload[key], list) and payload[key]:
+            batched.append(i)
+        else:
+            responses[i] = run(payload[key])
+
+    if len(batched) == 1:
+        responses[batched[0]] = run(payloads[batched[0]][key])
+    elif batched:
+        combined = run([row for i in batched for row in payloads[i][key]])
+        if "error" in combined:
+            for i in batched:
+                responses[i] = run(payloads[i][key])
+            return responses
+
+        start = 0
+        for i in batched:
+            stop = start + len(payloads[i][key])
+            results = combined["results"][start:stop]
+            for index, result in enumerate(results):
+                result["index"] = index
+            responses[i] = {
+                **combined,
+                **summarize(results),
+                "results": results,
+                "model_info": dict(combined["model_info"]),
+            }
+            if any("partition" in r for r in results):
+                responses[i]["model_info"]["partitions_used"] = sorted(
+                    {r["partition"] for r in results if "partition" in r}
+                )
+            start = stop
+    return responses
+
+
+def run_anomaly(payloads: List[Dict]) -> List[Dict]:
+    from anomaly_detector import detect_anomalies
+
+    def summarize(results):
+        anomaly_count = sum(1 for r in results if r["is_anomaly"])
+        return {
+            "total_samples": len(results),
+            "anomalies_detected": anomaly_count,
+            "anomaly_rate": anomaly_count / len(results),
+        }
+
+    return _run_row_batches(payloads, "sensor_data", detect_anomalies, summarize)
+
+
+def run_maintenance(payloads: List[Dict]) -> List[Dict]:
+    from maintenance_predictor import predict_maintenance_need
+
+    def summarize(results):
+        return {
+            "total_panels": len(results),
+            "panels_needing_cleaning": sum(1 for r in results if r["should_clean"]),
+            "average_efficiency_loss_pct": float(
+                np.mean([r["predicted_efficiency_loss_pct"] for r in results])
+            ),
+        }
+
+    return _run_row_batches(payloads, "panel_data", predict_maintenance_need, summarize)
+
+
+def _row_count(key: str) -> Callable[[Dict], int]:
+    def count(payload: Dict) -> int:
+        rows = payload.get(key)
+        return max(len(rows), 1) if isinstance(rows, list) else 1
+
+    return count
+
+
+# service name -> (batch runner, rows in one request's payload)
+SERVICES = {
+    "predict": (run_predict, lambda payload: 1),
+    "anomaly": (run_anomaly, _row_count("sensor_data")),
+    "maintenance": (run_maintenance, _row_count("panel_data")),
+}
+
+
+class ModelQueue:
+    """Bounded request queue and batcher for one model."""
+
+    def __init__(self, name: str, run, count, executor: ThreadPoolExecutor):
+        self.name = name
+        self.run = run
+        self.count = count
+        self.executor = executor
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.slots = asyncio.Semaphore(MODEL_CONCURRENCY)
+        self.running = set()  # Batch tasks, referenced until they finish
+        self.requests = 0
+        self.batches = 0
+        self.rejected = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    async def submit(self, payload: Dict) -> Dict:
+        """Queue one request and wait for its result."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(
+                self.queue.put((payload, future)), ENQUEUE_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return {
+                "error": f"ML gateway overloaded: the {self.name} queue is full",
+                "queue_size": QUEUE_SIZE,
+            }
+        return await future
+
+    async def batcher(self):
+        """Collect requests into batches and hand each to a worker thread."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            # While the model's slots are busy, requests keep queueing and are
+            # drained below into one batch instead of many small ones
+            await self.slots.acquire()
+            items = self.count(batch[0][0])
+            deadline = loop.time() + BATCH_WINDOW_SECONDS
+            while items < BATCH_MAX_ITEMS:
+                try:
+                    request = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(request)
+                items += self.count(request[0])
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _dispatch(self, batch):
+        payloads = [payload for payload, _ in batch]
+        start = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.run, payloads
+            )
+        except Exception as e:
+            self.errors += 1
+            results = [{"error": str(e)} for _ in batch]
+        finally:
+            self.busy_seconds += time.perf_counter() - start
+            self.slots.release()
+
+        self.requests += len(batch)
+        self.batches += 1
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queued": self.queue.qsize(),
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "busy_seconds": self.busy_seconds,
+        }
+
+
+class Gateway:
+    """Routes NDJSON requests from client connections to the model queues."""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=MODEL_CONCURRENCY * len(SERVICES)
+        )
+        self.models = {
+            name: ModelQueue(name, run, count, self.executor)
+            for name, (run, count) in SERVICES.items()
+        }
+        self.started = time.time()
+
+    def stats(self) -> Dict:
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "settings": {
+                "batch_window_ms": BATCH_WINDOW_SECONDS * 1000,
+                "batch_max_items": BATCH_MAX_ITEMS,
+                "queue_size": QUEUE_SIZE,
+                "model_concurrency": MODEL_CONCURRENCY,
+            },
+            "models": {name: model.stats() for name, model in self.models.items()},
+        }
+
+    async def handle_request(self, line: bytes) -> Dict:
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError as e:
+            return {"id": None, "result": {"error": f"Invalid JSON input: {str(e)}"}}
+
+        request_id = request.get("id")
+        service = request.get("service")
+        if service == "stats":
+            return {"id": request_id, "result": self.stats()}
+        if service not in self.models:
+            return {
+                "id": request_id,
+                "result": {
+                    "error": f"Unknown service: {service}",
+                    "services": list(self.models) + ["stats"],
+                },
+            }
+        payload = request.get("payload")
+        if not isinstance(payload, dict):
+            return {
+                "id": request_id,
+                "result": {"error": "Expected a 'payload' object"},
+            }
+        return {
+            "id": request_id,
+            "result": await self.models[service].submit(payload),
+        }
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """Serve one client: requests are handled concurrently, so a slow model
+        does not hold up replies from the others."""
+        lock = asyncio.Lock()
+        pending = set()
+
+        async def respond(line: bytes):
+            response = await self.handle_request(line)
+            async with lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(respond(line))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        except (ConnectionError, ValueError) as e:
+            # ValueError: a line longer than MAX_LINE_BYTES
+            print(f"ML gateway connection closed: {e}", file=sys.stderr)
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str = GATEWAY_SOCKET, port=GATEWAY_PORT):
+        self.batchers = [
+            asyncio.create_task(model.batcher()) for model in self.models.values()
+        ]
+
+        if port:
+            server = await asyncio.start_server(
+                self.handle_connection, "127.0.0.1", int(port), limit=MAX_LINE_BYTES
+            )
+            address = f"127.0.0.1:{port}"
+        else:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = await asyncio.start_unix_server(
+                self.handle_connection, socket_path, limit=MAX_LINE_BYTES
+            )
+            address = socket_path
+        print(
+            f"ML gateway listening on {address} "
+            f"(services: {', '.join(self.models)})",
+            file=sys.stderr,
+        )
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    """
+    CLI: python ml_gateway.py [socket_path | --port N]
+    Serves until interrupted. The socket path defaults to
+    SOLAR_ML_GATEWAY_SOCKET, the TCP port to SOLAR_ML_GATEWAY_PORT.
+    """
+    args = sys.argv[1:]
+    socket_path, port = GATEWAY_SOCKET, GATEWAY_PORT
+    if args and args[0] == "--port":
+        port = args[1]
+    elif args:
+        socket_path = args[0]
+
+    apply_thread_budget("serving")
+    try:
+        asyncio.run(Gateway().serve(socket_path, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if not port and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    main()
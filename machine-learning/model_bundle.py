@@ -0,0 +1,323 @@
+"""
+Versioned Model Bundles
+Packs every serving artifact of a model family (estimators, scaler, feature list)
+into a single file with a JSON manifest that can be read without unpickling
+anything. Heavy components are unpickled lazily on first use.
+
+Layout:
+    MAGIC (8 bytes) | format version (uint32) | manifest length (uint64)
+    | manifest JSON | component payloads (joblib, concatenated)
+"""
+
+import hashlib
+import io
+import json
+import os
+import struct
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+
+MAGIC = b"SOLARBDL"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<IQ")
+
+MODELS_DIR = Path(__file__).parent / "models"
+
+# Loose pickle files written by older versions of the training scripts
+LEGACY_FILES = {
+    "power": {
+        "components": {
+            "hist_gradient_boosting": "best_model_hist_gradient_boosting.pkl",
+            "random_forest": "best_model_random_forest.pkl",
+            "linear_regression": "best_model_linear_regression.pkl",
+        },
+        "features": None,
+    },
+    "anomaly": {
+        "components": {
+            "model": "anomaly_detector.pkl",
+            "scaler": "anomaly_scaler.pkl",
+        },
+        "features": "anomaly_features.pkl",
+    },
+    "maintenance": {
+        "components": {
+            "model": "maintenance_predictor.pkl",
+            "scaler": "maintenance_scaler.pkl",
+        },
+        "features": "maintenance_features.pkl",
+    },
+}
+
+
+class BundleIntegrityError(ValueError):
+    """Raised when a bundle is corrupt or its components do not belong together."""
+
+
+def _sha256(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _scaler_params(scaler) -> Dict[str, List[float]]:
+    return {
+        "mean": [float(v) for v in scaler.mean_],
+        "scale": [float(v) for v in scaler.scale_],
+    }
+
+
+def _check_component(name: str, component, manifest: Dict):
+    """Verify that a component was fitted for the bundle's feature list."""
+    features = manifest.get("features")
+    if features is None:
+        return
+
+    n_features = getattr(component, "n_features_in_", None)
+    if n_features is not None and n_features != len(features):
+        raise BundleIntegrityError(
+            f"Component '{name}' expects {n_features} features but the bundle "
+            f"declares {len(features)}: {features}"
+        )
+
+    names = getattr(component, "feature_names_in_", None)
+    if names is not None and list(names) != list(features):
+        raise BundleIntegrityError(
+            f"Component '{name}' was fitted on features {list(names)} but the "
+            f"bundle declares {features}"
+        )
+
+    if name == "scaler" and manifest.get("scaler") is not None:
+        params = manifest["scaler"]
+        if not (
+            np.allclose(component.mean_, params["mean"])
+            and np.allclose(component.scale_, params["scale"])
+        ):
+            raise BundleIntegrityError(
+                "Scaler parameters do not match the bundle manifest; the scaler "
+                "and model come from different training runs"
+            )
+
+
+def write_bundle(
+    path: Path,
+    family: str,
+    components: Dict[str, object],
+    features: Optional[List[str]] = None,
+    metadata: Optional[Dict] = None,
+    raw_components: Optional[Dict[str, bytes]] = None,
+) -> Dict:
+    """
+    Write a model bundle atomically and return its manifest.
+
+    Args:
+        path: Destination file
+        family: Model family name (power, anomaly, maintenance)
+        components: Fitted objects to store, keyed by component name. A
+            component named "scaler" also has its parameters recorded in the
+            manifest.
+        features: Ordered feature list the components were fitted on
+        metadata: Training metadata recorded in the manifest
+        raw_components: Already-serialized joblib payloads (used when packing
+            legacy files so they are stored byte-for-byte)
+    """
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "family": family,
+        "run_id": uuid.uuid4().hex,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "features": list(features) if features is not None else None,
+        "scaler": (
+            _scaler_params(components["scaler"]) if "scaler" in components else None
+        ),
+        "metadata": metadata or {},
+        "components": {},
+    }
+
+    payloads = []
+    offset = 0
+    for name, component in components.items():
+        _check_component(name, component, manifest)
+        if raw_components and name in raw_components:
+            data = raw_components[name]
+        else:
+            buffer = io.BytesIO()
+            joblib.dump(component, buffer)
+            data = buffer.getvalue()
+        manifest["components"][name] = {
+            "type": f"{type(component).__module__}.{type(component).__name__}",
+            "offset": offset,
+            "length": len(data),
+            "sha256": _sha256(data),
+        }
+        payloads.append(data)
+        offset += len(data)
+
+    payload = b"".join(payloads)
+    manifest["payload_sha256"] = _sha256(payload)
+    manifest_bytes = json.dumps(manifest, indent=2).encode("utf-8")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER.pack(FORMAT_VERSION, len(manifest_bytes)))
+        f.write(manifest_bytes)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+    return manifest
+
+
+def _read_header(f, path) -> Dict:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise BundleIntegrityError(f"{path} is not a model bundle")
+    header = f.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        raise BundleIntegrityError(f"{path} is truncated")
+    version, manifest_length = _HEADER.unpack(header)
+    if version != FORMAT_VERSION:
+        raise BundleIntegrityError(
+            f"{path} has bundle format version {version}, expected {FORMAT_VERSION}"
+        )
+    return json.loads(f.read(manifest_length).decode("utf-8"))
+
+
+def read_manifest(path: Path) -> Dict:
+    """Read a bundle's manifest without touching the component payloads."""
+    with open(path, "rb") as f:
+        return _read_header(f, path)
+
+
+class ModelBundle:
+    """A loaded bundle whose components are unpickled on first access."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self.manifest = _read_header(f, self.path)
+            self._payload = f.read()
+
+        if _sha256(self._payload) != self.manifest["payload_sha256"]:
+            raise BundleIntegrityError(
+                f"{self.path} failed its integrity check (payload hash mismatch)"
+            )
+        self._components: Dict[str, object] = {}
+
+    @property
+    def features(self) -> Optional[List[str]]:
+        return self.manifest["features"]
+
+    @property
+    def metadata(self) -> Dict:
+        return self.manifest["metadata"]
+
+    def component_names(self) -> List[str]:
+        return list(self.manifest["components"])
+
+    def get(self, name: str):
+        """Return a component, unpickling it the first time it is requested."""
+        if name not in self._components:
+            entry = self.manifest["components"].get(name)
+            if entry is None:
+                raise KeyError(
+                    f"Bundle {self.path} has no component '{name}' "
+                    f"(available: {self.component_names()})"
+                )
+            data = self._payload[entry["offset"] : entry["offset"] + entry["length"]]
+            component = joblib.load(io.BytesIO(data))
+            _check_component(name, component, self.manifest)
+            self._components[name] = component
+        return self._components[name]
+
+    def scale(self, X: np.ndarray) -> np.ndarray:
+        """Standardize features with the manifest's scaler parameters."""
+        params = self.manifest["scaler"]
+        if params is None:
+            raise KeyError(f"Bundle {self.path} has no scaler")
+        return (np.asarray(X, dtype=np.float64) - params["mean"]) / params["scale"]
+
+
+_cache: Dict[str, tuple] = {}
+
+
+def load_bundle(path: Path) -> ModelBundle:
+    """
+    Load a bundle, reusing the in-process copy while the file is unchanged.
+    """
+    path = Path(path)
+    stat = path.stat()
+    key = str(path.resolve())
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(key)
+    if cached is None or cached[0] != signature:
+        cached = (signature, ModelBundle(path))
+        _cache[key] = cached
+    return cached[1]
+
+
+def pack_legacy(models_dir: Path = MODELS_DIR) -> Dict[str, Path]:
+    """
+    Pack loose pickle files from older training runs into bundles.
+
+    Payloads are stored byte-for-byte; components are only unpickled to
+    validate them and record the feature list and scaler parameters.
+    """
+    models_dir = Path(models_dir)
+    written = {}
+    for family, layout in LEGACY_FILES.items():
+        paths = {
+            name: models_dir / file_name
+            for name, file_name in layout["components"].items()
+        }
+        missing = [str(p) for p in paths.values() if not p.exists()]
+        if missing:
+            print(f"Skipping {family}: missing {missing}")
+            continue
+
+        components = {name: joblib.load(p) for name, p in paths.items()}
+        if layout["features"] is not None:
+            features = joblib.load(models_dir / layout["features"])
+        else:
+            first = next(iter(components.values()))
+            features = list(getattr(first, "feature_names_in_", [])) or None
+
+        bundle_path = models_dir / f"{family}.bundle"
+        write_bundle(
+            bundle_path,
+            family,
+            components,
+            features=features,
+            metadata={
+                "source": "legacy",
+                "packed_from": sorted(p.name for p in paths.values()),
+            },
+            raw_components={name: p.read_bytes() for name, p in paths.items()},
+        )
+        written[family] = bundle_path
+        print(f"Packed {family} bundle: {bundle_path}")
+    return written
+
+
+def main():
+    """
+    CLI:
+      - pack [models_dir]: Pack legacy loose pickle files into bundles
+      - inspect <bundle>: Print a bundle's manifest
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "pack":
+        pack_legacy(Path(sys.argv[2]) if len(sys.argv) > 2 else MODELS_DIR)
+    elif len(sys.argv) > 2 and sys.argv[1] == "inspect":
+        print(json.dumps(read_manifest(Path(sys.argv[2])), indent=2))
+    else:
+        print("Usage: python model_bundle.py pack [models_dir] | inspect <bundle>")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Per-Panel Anomaly Pre-Filter
+Keeps constant-memory running statistics per panel (EWMA mean/variance and a
+decaying recent min/max for every anomaly feature) and clears readings that
+are plainly normal for their panel, so only the rest reach the
+IsolationForest.
+
+State lives in an array-backed store (one row per panel) saved as .npz
+between runs.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+MODELS_DIR = Path(__file__).parent / "models"
+PANEL_STATS_PATH = MODELS_DIR / "panel_stats.npz"
+
+EWMA_ALPHA = 0.05  # Weight of the newest reading
+PREFILTER_SIGMAS = 3.0  # Width of the mean +/- k*std band
+PREFILTER_WARMUP = 24  # Readings a panel needs before any are cleared
+# Widening the recent [min, max] envelope by this many standard deviations
+# clears more readings at the cost of recall (see `evaluate`)
+ENVELOPE_MARGIN_SIGMAS = 0.0
+
+_INITIAL_CAPACITY = 64
+
+
+class PanelStatsStore:
+    """Running per-panel feature statistics in preallocated NumPy arrays."""
+
+    def __init__(self, features: Sequence[str], alpha: float = EWMA_ALPHA):
+        self.features = list(features)
+        self.alpha = alpha
+        self.panel_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        n_features = len(self.features)
+        self.count = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self.mean = np.zeros((_INITIAL_CAPACITY, n_features))
+        self.var = np.zeros((_INITIAL_CAPACITY, n_features))
+        self.low = np.zeros((_INITIAL_CAPACITY, n_features))
+        self.high = np.zeros((_INITIAL_CAPACITY, n_features))
+
+    def __len__(self) -> int:
+        return len(self.panel_ids)
+
+    def _grow(self, needed: int):
+        capacity = len(self.count)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name in ("count", "mean", "var", "low", "high"):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, name, new)
+
+    def rows(self, panel_ids: Sequence) -> np.ndarray:
+        """Store row of each panel id, adding rows for unseen panels."""
+        rows = np.empty(len(panel_ids), dtype=np.int64)
+        for i, panel_id in enumerate(panel_ids):
+            key = str(panel_id)
+            row = self.index.get(key)
+            if row is None:
+                row = len(self.panel_ids)
+                self.index[key] = row
+                self.panel_ids.append(key)
+            rows[i] = row
+        self._grow(len(self.panel_ids))
+        return rows
+
+    def screen(
+        self, rows: np.ndarray, X: np.ndarray, sigmas: float = PREFILTER_SIGMAS
+    ) -> np.ndarray:
+        """
+        True for readings that are normal for their panel: every feature lies
+        inside mean +/- sigmas*std and inside the recent min/max envelope, and
+        the panel has finished warming up. All readings are checked against
+        the state at the start of the batch.
+        """
+        std = np.sqrt(self.var[rows])
+        mean = self.mean[rows]
+        margin = ENVELOPE_MARGIN_SIGMAS * std
+        inside = (
+            (np.abs(X - mean) <= sigmas * std)
+            & (X >= self.low[rows] - margin)
+            & (X <= self.high[rows] + margin)
+        )
+        return inside.all(axis=1) & (self.count[rows] >= PREFILTER_WARMUP)
+
+    def update(self, rows: np.ndarray, X: np.ndarray):
+        """
+        Fold readings into their panels' statistics, in order.
+
+        Readings are applied in rounds (each panel's first reading, then its
+        second...), so a batch costs one vectorized step per reading of its
+        busiest panel.
+        """
+        if len(rows) == 0:
+            return
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(sorted_rows)) + 1]
+        rank = np.empty(len(rows), dtype=np.int64)
+        rank[order] = np.arange(len(rows)) - np.repeat(
+            starts, np.diff(np.r_[starts, len(rows)])
+        )
+
+        alpha = self.alpha
+        for r in range(rank.max() + 1):
+            batch = rank == r
+            panel, x = rows[batch], X[batch]
+            new = self.count[panel] == 0
+
+            diff = x - self.mean[panel]
+            increment = alpha * diff
+            mean = np.where(new[:, None], x, self.mean[panel] + increment)
+            var = np.where(
+                new[:, None], 0.0, (1 - alpha) * (self.var[panel] + diff * increment)
+            )
+            # The envelope relaxes towards the mean so it tracks recent readings
+            low = self.low[panel] + alpha * (mean - self.low[panel])
+            high = self.high[panel] - alpha * (self.high[panel] - mean)
+            self.low[panel] = np.where(new[:, None], x, np.minimum(x, low))
+            self.high[panel] = np.where(new[:, None], x, np.maximum(x, high))
+            self.mean[panel] = mean
+            self.var[panel] = var
+            self.count[panel] += 1
+
+    def save(self, path: Path = PANEL_STATS_PATH):
+        """Write the store atomically."""
+        n = len(self.panel_ids)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            features=np.array(self.features),
+            alpha=np.array(self.alpha),
+            panel_ids=np.array(self.panel_ids, dtype=str),
+            count=self.count[:n],
+            mean=self.mean[:n],
+            var=self.var[:n],
+            low=self.low[:n],
+            high=self.high[:n],
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(
+        cls, features: Sequence[str], path: Path = PANEL_STATS_PATH
+    ) -> "PanelStatsStore":
+        """
+        Load the saved store, or start an empty one if there is none or it was
+        built for different features.
+        """
+        path = Path(path)
+        if not path.exists():
+            return cls(features)
+        with np.load(path) as data:
+            if list(data["features"]) != list(features):
+                print(
+                    f"Panel statistics in {path} were built for features "
+                    f"{list(data['features'])}; starting fresh",
+                    file=sys.stderr,
+                )
+                return cls(features)
+            store = cls(features, alpha=float(data["alpha"]))
+            panel_ids = [str(p) for p in data["panel_ids"]]
+            store.rows(panel_ids)
+            n = len(panel_ids)
+            for name in ("count", "mean", "var", "low", "high"):
+                getattr(store, name)[:n] = data[name]
+        return store
+
+
+def prefilter_scores(
+    model, bundle, X: np.ndarray, panel_ids: Sequence, store: PanelStatsStore
+):
+    """
+    Score readings, sending only those outside their panel's bounds to the
+    IsolationForest, then update the panel statistics with every reading
+    judged normal.
+
+    Returns:
+        (predictions, scores, cleared): predictions are -1/1 as from
+        IsolationForest.predict; scores are NaN for cleared readings
+    """
+    from anomaly_detector import score_samples
+
+    X = np.asarray(X, dtype=float)
+    rows = store.rows(panel_ids)
+    cleared = store.screen(rows, X)
+
+    predictions = np.ones(len(X), dtype=int)
+    scores = np.full(len(X), np.nan)
+    if (~cleared).any():
+        predictions[~cleared], scores[~cleared] = score_samples(
+            model, bundle.scale(X[~cleared])
+        )
+
+    normal = predictions == 1
+    store.update(rows[normal], X[normal])
+    return predictions, scores, cleared
+
+
+def evaluate_prefilter(data_csv_path: Optional[str] = None, n_panels: int = 1) -> Dict:
+    """
+    Replay the training data through the pre-filter and compare the result
+    with scoring every reading with the IsolationForest.
+
+    Rows are dealt round-robin to n_panels panels and replayed in order, one
+    reading per panel at a time.
+    """
+    import pandas as pd
+
+    from anomaly_detector import ANOMALY_BUNDLE_PATH, score_samples
+    from model_bundle import load_bundle
+
+    if data_csv_path is None:
+        data_csv_path = os.path.join(
+            os.path.dirname(__file__),
+            "dataForML",
+            "POWER_Point_Hourly_20250902_20251104_040d79N_073d95W_LST_prepared.csv",
+        )
+
+    bundle = load_bundle(ANOMALY_BUNDLE_PATH)
+    model = bundle.get("model")
+    features = bundle.features
+    X = pd.read_csv(data_csv_path)[features].dropna().to_numpy(dtype=float)
+    panel_ids = np.arange(len(X)) % n_panels
+
+    baseline, _ = score_samples(model, bundle.scale(X))
+
+    store = PanelStatsStore(features)
+    predictions = np.ones(len(X), dtype=int)
+    cleared = np.zeros(len(X), dtype=bool)
+    for start in range(0, len(X), n_panels):
+        window = slice(start, start + n_panels)
+        predictions[window], _, cleared[window] = prefilter_scores(
+            model, bundle, X[window], panel_ids[window], store
+        )
+
+    flagged = baseline == -1
+    caught = flagged & (predictions == -1)
+    return {
+        "data_path": str(data_csv_path),
+        "readings": len(X),
+        "panels": n_panels,
+        "features": features,
+        "settings": {
+            "ewma_alpha": EWMA_ALPHA,
+            "sigmas": PREFILTER_SIGMAS,
+            "warmup": PREFILTER_WARMUP,
+            "envelope_margin_sigmas": ENVELOPE_MARGIN_SIGMAS,
+        },
+        "filtered_share": float(cleared.mean()),
+        "isolation_forest_calls_saved": int(cleared.sum()),
+        "baseline_anomalies": int(flagged.sum()),
+        "anomalies_with_prefilter": int((predictions == -1).sum()),
+        "recall_vs_baseline": (
+            float(caught.sum() / flagged.sum()) if flagged.any() else 1.0
+        ),
+        "missed_anomalies": int((flagged & cleared).sum()),
+    }
+
+
+def main():
+    """
+    CLI: python panel_prefilter.py evaluate [data_csv] [n_panels]
+    Reports the share of readings the pre-filter removes and its recall
+    against scoring every reading with the IsolationForest.
+    """
+    if len(sys.argv) > 1 and sys.argv[1] == "evaluate":
+        data_path = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] else None
+        n_panels = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+        print(json.dumps(evaluate_prefilter(data_path, n_panels), indent=2))
+    else:
+        print("Usage: python panel_prefilter.py evaluate [data_csv] [n_panels]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""
+Physics-Residual Anomaly Screen
+Recomputes the power each reading should have produced with the same
+POA -> SAPM cell temperature -> temperature coefficient chain used to build the
+training data (main.simulate_pv_system), for the whole batch at once, and
+flags readings whose measured power departs from it by more than their panel
+normally does (robust z-score of the relative residual).
+
+This catches soiling, shading and inverter faults, which leave the weather
+features the IsolationForest looks at untouched. Readings with a time and
+place are also checked against the clear sky (see clear_sky): measured power
+well above what a cloudless sky could give points at a sensor, scaling or
+timestamp fault that a residual against the measured irradiance would miss.
+"""
+
+import json
+import sys
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from main import simulate_pv_system
+from wire_format import parse_format_flag, read_request, write_response
+
+# Readings on a plane of array irradiance below this are not judged (night,
+# dawn and dusk, where a relative residual is meaningless)
+MIN_POA_IRRADIANCE = 50.0
+RESIDUAL_Z_THRESHOLD = 3.5
+MIN_PANEL_READINGS = 8  # Fewer readings use the batch-wide median/MAD
+# Floor on the MAD, as a relative residual, so a panel that tracks the
+# physics perfectly does not flag every small deviation
+MIN_RESIDUAL_MAD = 0.01
+MAD_SCALE = 1.4826  # MAD -> standard deviation for normal data
+# Measured power above CLEAR_SKY_POWER_MARGIN x the clear-sky expected power
+# plus CLEAR_SKY_POWER_FLOOR x capacity is flagged (cloud enhancement can
+# briefly push irradiance ~20% past clear sky)
+CLEAR_SKY_POWER_MARGIN = 1.3
+CLEAR_SKY_POWER_FLOOR = 0.02
+# Readings whose sun zenith differs more than this from the clear-sky
+# profile's at their timestamp are not compared (local standard rather than
+# solar time, or timestamps in another zone)
+MAX_ZENITH_MISMATCH_DEG = 5.0
+# Batches with more than this share of their sunlit readings stamped at night
+# are not compared at all: their irradiance is offset from their timestamps
+MAX_SUNLIT_NIGHT_SHARE = 0.05
+
+# Accepted names for the weather inputs (training data name first)
+COLUMN_ALIASES = {
+    "temp_air": ["temp_air", "T2M"],
+    "wind_speed": ["wind_speed", "WS10M"],
+}
+SYSTEM_DEFAULTS = {"tilt": 30.0, "azimuth": 180.0, "system_capacity_kw": 5.0}
+POWER_COLUMNS = ["ac_power_kw", "dc_power_kw"]
+
+
+def _column(df: pd.DataFrame, name: str) -> np.ndarray:
+    for alias in COLUMN_ALIASES.get(name, [name]):
+        if alias in df.columns:
+            return df[alias].to_numpy(dtype=float)
+    if name in SYSTEM_DEFAULTS:
+        return np.full(len(df), SYSTEM_DEFAULTS[name])
+    raise ValueError(f"Missing column: {name}")
+
+
+def _sun_position(df: pd.DataFrame):
+    """Sun zenith/azimuth from the readings, or computed from time and place."""
+    if {"sun_zenith", "sun_azimuth"}.issubset(df.columns):
+        return (
+            df["sun_zenith"].to_numpy(dtype=float),
+            df["sun_azimuth"].to_numpy(dtype=float),
+        )
+    if not {"datetime", "latitude", "longitude"}.issubset(df.columns):
+        raise ValueError(
+            "Readings need sun_zenith/sun_azimuth or datetime/latitude/longitude"
+        )
+    from synthetic_corpus import solar_position
+
+    # Row-wise: coordinates and timestamps broadcast element by element.
+    # Naive timestamps are taken as UTC, like the training data.
+    return solar_position(
+        df["latitude"].to_numpy(dtype=float),
+        df["longitude"].to_numpy(dtype=float),
+        pd.DatetimeIndex(pd.to_datetime(df["datetime"], utc=True)),
+    )
+
+
+def expected_power(
+    df: pd.DataFrame, irradiance: Optional[Dict[str, np.ndarray]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Expected POA irradiance and DC/AC power for every reading, in one
+    vectorized pass; irradiance replaces the readings' ghi/dni/dhi.
+    """
+    zenith, azimuth = _sun_position(df)
+    irradiance = irradiance or {
+        name: _column(df, name) for name in ("ghi", "dni", "dhi")
+    }
+    physics = simulate_pv_system(
+        ghi=irradiance["ghi"],
+        dni=irradiance["dni"],
+        dhi=irradiance["dhi"],
+        temp_air=_column(df, "temp_air"),
+        wind_speed=_column(df, "wind_speed"),
+        sun_zenith=zenith,
+        sun_azimuth=azimuth,
+        tilt=_column(df, "tilt"),
+        azimuth=_column(df, "azimuth"),
+        system_capacity_kw=_column(df, "system_capacity_kw"),
+    )
+    return {
+        "poa_global": np.nan_to_num(physics["poa_global"]),
+        "dc_power_kw": np.nan_to_num(physics["dc_power_kw"]),
+        "ac_power_kw": np.nan_to_num(physics["ac_power_kw"]),
+    }
+
+
+def clear_sky_check(df: pd.DataFrame, power_column: str) -> Dict[str, np.ndarray]:
+    """
+    Clear-sky index (measured / clear-sky GHI) of every reading and whether its
+    measured power exceeds what a clear sky allows. Readings without a time
+    and place, or whose timestamps do not match their sun position or
+    irradiance, are not checked (NaN index, never flagged).
+    """
+    n = len(df)
+    unchecked = {
+        "clear_sky_ghi": np.full(n, np.nan),
+        "clear_sky_index": np.full(n, np.nan),
+        "exceeds_clear_sky": np.zeros(n, dtype=bool),
+    }
+    if not {"datetime", "latitude", "longitude"}.issubset(df.columns):
+        return unchecked
+    from clear_sky import clear_sky_irradiance
+
+    # The prepared data stamps readings in UTC, the synthetic corpus in local
+    # time; use whichever the readings' own sun position (or, failing that,
+    # irradiance) agrees with
+    lat = df["latitude"].to_numpy(dtype=float)
+    lon = df["longitude"].to_numpy(dtype=float)
+    times = pd.to_datetime(df["datetime"], utc=True)
+    ghi = _column(df, "ghi")
+    sunlit = ghi >= MIN_POA_IRRADIANCE
+    clear = None
+    for local_time in (False, True):
+        candidate = clear_sky_irradiance(lat, lon, times, local_time=local_time)
+        if "sun_zenith" in df.columns:
+            mismatch = np.nanmedian(
+                np.abs(df["sun_zenith"].to_numpy(dtype=float) - candidate["sun_zenith"])
+            )
+            aligned = mismatch <= MAX_ZENITH_MISMATCH_DEG
+        else:
+            aligned = True
+        if aligned and sunlit.any():
+            night = (candidate["ghi"][sunlit] <= 0).mean()
+            aligned = night <= MAX_SUNLIT_NIGHT_SHARE
+        if aligned:
+            clear = candidate
+            break
+    if clear is None:
+        return unchecked
+
+    checked = np.isfinite(clear["ghi"])
+    if "sun_zenith" in df.columns:
+        checked &= (
+            np.abs(df["sun_zenith"].to_numpy(dtype=float) - clear["sun_zenith"])
+            <= MAX_ZENITH_MISMATCH_DEG
+        )
+
+    # A panel facing away from the sun gets more from a bright overcast sky
+    # than from a clear one, so the limit is the larger of the clear sky and
+    # an all-diffuse sky as bright
+    clear_power = expected_power(
+        df, {name: clear[name] for name in ("ghi", "dni", "dhi")}
+    )[power_column]
+    diffuse_power = expected_power(
+        df, {"ghi": clear["ghi"], "dni": np.zeros(len(df)), "dhi": clear["ghi"]}
+    )[power_column]
+    measured = df[power_column].to_numpy(dtype=float)
+    limit = CLEAR_SKY_POWER_MARGIN * np.maximum(
+        clear_power, diffuse_power
+    ) + CLEAR_SKY_POWER_FLOOR * _column(df, "system_capacity_kw")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        index = np.where(checked & (clear["ghi"] > 0), ghi / clear["ghi"], np.nan)
+    return {
+        "clear_sky_ghi": np.where(checked, clear["ghi"], np.nan),
+        "clear_sky_index": index,
+        "exceeds_clear_sky": checked & np.isfinite(measured) & (measured > limit),
+    }
+
+
+def robust_z_scores(residuals: np.ndarray, panels: np.ndarray) -> np.ndarray:
+    """
+    Robust z-score of every residual against its panel's median and MAD
+    (the batch-wide ones for panels with too few readings). NaN residuals
+    stay NaN and are ignored in the statistics.
+    """
+    frame = pd.DataFrame({"panel": panels, "residual": residuals})
+    grouped = frame.groupby("panel")["residual"]
+    median = grouped.transform("median").to_numpy()
+    mad = (
+        (frame["residual"] - median).abs().groupby(frame["panel"]).transform("median")
+    ).to_numpy()
+    count = grouped.transform("count").to_numpy()
+
+    batch_median = np.nanmedian(residuals) if np.isfinite(residuals).any() else 0.0
+    batch_mad = (
+        np.nanmedian(np.abs(residuals - batch_median))
+        if np.isfinite(residuals).any()
+        else 0.0
+    )
+    few = count < MIN_PANEL_READINGS
+    median = np.where(few, batch_median, median)
+    mad = np.where(few, batch_mad, mad)
+
+    return (residuals - median) / (MAD_SCALE * np.maximum(mad, MIN_RESIDUAL_MAD))
+
+
+def screen_residuals(df: pd.DataFrame, power_column: Optional[str] = None) -> Dict:
+    """
+    Compare measured with expected power for a batch of readings.
+
+    Returns:
+        Dict of per-reading arrays: expected power, relative residual
+        ((measured - expected) / expected, NaN when not judged), robust
+        z-score, the clear-sky check (see clear_sky_check) and the anomaly
+        flag (an outlying residual or power above the clear-sky limit)
+    """
+    if power_column is None:
+        power_column = next((c for c in POWER_COLUMNS if c in df.columns), None)
+    if power_column is None:
+        raise ValueError(f"Readings need a measured power column: {POWER_COLUMNS}")
+
+    expected = expected_power(df)
+    measured = df[power_column].to_numpy(dtype=float)
+    judged = (expected["poa_global"] >= MIN_POA_IRRADIANCE) & np.isfinite(measured)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        residual = np.where(
+            judged,
+            (measured - expected[power_column]) / expected[power_column],
+            np.nan,
+        )
+    judged &= np.isfinite(residual)
+    residual[~judged] = np.nan
+
+    panels = (
+        df["panel_id"].astype(str).to_numpy()
+        if "panel_id" in df.columns
+        else np.zeros(len(df), dtype=int)
+    )
+    z = robust_z_scores(residual, panels)
+    clear = clear_sky_check(df, power_column)
+    return {
+        "expected_power_kw": expected[power_column],
+        "measured_power_kw": measured,
+        "residual": residual,
+        "z_score": z,
+        **clear,
+        "is_anomaly": (judged & (np.abs(np.nan_to_num(z)) > RESIDUAL_Z_THRESHOLD))
+        | clear["exceeds_clear_sky"],
+        "judged": judged,
+    }
+
+
+def detect_residual_anomalies(readings, columnar: bool = False) -> Dict:
+    """
+    Screen readings with measured power against the physics model.
+
+    Args:
+        readings: List of dicts (or a dict of arrays) with ghi, dni, dhi,
+            temp_air/T2M, wind_speed/WS10M, a measured ac_power_kw or
+            dc_power_kw, the sun position (or datetime, latitude and
+            longitude) and optionally panel_id, tilt, azimuth and
+            system_capacity_kw
+        columnar: Return the per-reading results as a dict of arrays
+
+    Returns:
+        Dict with per-reading expected power, residuals and anomaly flags
+    """
+    df = pd.DataFrame(readings)
+    if df.empty:
+        return {"error": "No readings provided"}
+    try:
+        screen = screen_residuals(df)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    flagged = screen["is_anomaly"]
+    summary = {
+        "status": "success",
+        "total_samples": len(df),
+        "judged_samples": int(screen["judged"].sum()),
+        "anomalies_detected": int(flagged.sum()),
+        "anomaly_rate": float(flagged.mean()),
+        "clear_sky_checked": int(np.isfinite(screen["clear_sky_ghi"]).sum()),
+        "above_clear_sky": int(screen["exceeds_clear_sky"].sum()),
+        "model_info": {
+            "model_type": "PhysicsResidual",
+            "z_threshold": RESIDUAL_Z_THRESHOLD,
+            "min_poa_irradiance": MIN_POA_IRRADIANCE,
+            "clear_sky_power_margin": CLEAR_SKY_POWER_MARGIN,
+        },
+    }
+    if columnar:
+        return {"results": screen, **summary}
+
+    results = []
+    for i in range(len(df)):
+        judged = bool(screen["judged"][i])
+        index = screen["clear_sky_index"][i]
+        results.append(
+            {
+                "index": i,
+                "is_anomaly": bool(flagged[i]),
+                "expected_power_kw": float(screen["expected_power_kw"][i]),
+                "residual": float(screen["residual"][i]) if judged else None,
+                "z_score": float(screen["z_score"][i]) if judged else None,
+                "clear_sky_index": float(index) if np.isfinite(index) else None,
+                "exceeds_clear_sky": bool(screen["exceeds_clear_sky"][i]),
+            }
+        )
+    return {**summary, "results": results}
+
+
+def evaluate_residual_screen(
+    data_path: Optional[str] = None, fault_rate: float = 0.02, seed: int = 42
+) -> Dict:
+    """
+    Inject soiling, shading and inverter faults into clean simulated readings
+    and report how many the screen finds and how many clean readings it flags.
+    """
+    from anomaly_detector import _default_data_path, load_sensor_data
+
+    df = load_sensor_data(data_path or _default_data_path()).reset_index(drop=True)
+    if "panel_id" not in df.columns:
+        df["panel_id"] = (
+            df["latitude"].round(2).astype(str)
+            + ","
+            + df["longitude"].round(2).astype(str)
+            + "/"
+            + df["tilt"].astype(str)
+        )
+
+    rng = np.random.default_rng(seed)
+    daylight = np.flatnonzero(df["poa_global"].to_numpy() >= MIN_POA_IRRADIANCE)
+    faulty = rng.choice(daylight, int(len(daylight) * fault_rate), replace=False)
+    kinds = rng.choice(["soiling", "shading", "inverter"], len(faulty))
+    factor = np.select(
+        [kinds == "soiling", kinds == "shading"],
+        [rng.uniform(0.6, 0.85, len(faulty)), rng.uniform(0.2, 0.6, len(faulty))],
+        0.0,
+    )
+    measured = df["ac_power_kw"].to_numpy(dtype=float).copy()
+    measured[faulty] *= factor
+    # Sensor noise on every reading
+    measured *= 1 + rng.normal(0, 0.01, len(measured))
+    df["ac_power_kw"] = measured
+
+    screen = screen_residuals(df, "ac_power_kw")
+    flagged = screen["is_anomaly"]
+    is_fault = np.zeros(len(df), dtype=bool)
+    is_fault[faulty] = True
+    judged = screen["judged"]
+
+    return {
+        "data_path": str(data_path or _default_data_path()),
+        "readings": len(df),
+        "judged_readings": int(judged.sum()),
+        "injected_faults": {
+            kind: int((kinds == kind).sum()) for kind in np.unique(kinds).tolist()
+        },
+        "recall": {
+            kind: float(flagged[faulty[kinds == kind]].mean())
+            for kind in np.unique(kinds).tolist()
+        },
+        "false_positive_rate": float(flagged[judged & ~is_fault].mean()),
+    }
+
+
+def main():
+    """
+    CLI:
+      python physics_residual.py [--format json|columnar|binary]
+          Screens {"readings": [...]} from stdin
+      python physics_residual.py evaluate [data_path] [fault_rate]
+          Reports recall on injected faults and the false positive rate
+    """
+    try:
+        fmt, args = parse_format_flag(sys.argv[1:])
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+    if args and args[0] == "evaluate":
+        data_path = args[1] if len(args) > 1 and args[1] else None
+        fault_rate = float(args[2]) if len(args) > 2 else 0.02
+        print(json.dumps(evaluate_residual_screen(data_path, fault_rate), indent=2))
+        return
+
+    try:
+        request = read_request(fmt, "readings")
+        if "readings" not in request:
+            print(json.dumps({"error": "Expected 'readings' key in input JSON"}))
+            sys.exit(1)
+        write_response(
+            detect_residual_anomalies(request["readings"], columnar=fmt != "json"),
+            fmt,
+        )
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {str(e)}"}))
+        sys.exit(1)
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,45 @@ ML Prediction Service for Solar Panel Efficiency
 Loads the trained model and makes predictions based on input features.
 """
 
+import os
 import sys
 import json
-import joblib
 import numpy as np
 import pandas as pd
 import math
 from pathlib import Path
 
-# Path to the trained model
-MODEL_PATH = Path(__file__).parent / "models" / "best_model_hist_gradient_boosting.pkl"
+from financial_engine import SCENARIO_DEFAULTS, project_finances, scenario_frame
+from model_bundle import load_bundle
+from thread_budget import apply_thread_budget, cap_estimator_jobs, get_budget
+from weather_interpolation import midday_climate
+from wire_format import parse_format_flag, read_request, write_response
+
+# Path to the trained model bundle and the component served from it
+# ("student" serves the distilled low-latency model)
+MODEL_PATH = Path(__file__).parent / "models" / "power.bundle"
+MODEL_COMPONENT = os.environ.get("SOLAR_ML_POWER_MODEL", "hist_gradient_boosting")
+MODEL_NAMES = {
+    "hist_gradient_boosting": "Histogram Gradient Boosting",
+    "random_forest": "Random Forest",
+    "linear_regression": "Linear Regression",
+    "student": "Distilled Decision Tree",
+}
+
+# "financial" fields that give a request's costs; NPV, IRR, payback and LCOE
+# are reported only for requests with one of them
+COST_FIELDS = ["system_cost_inr_per_kw"]
+
+# Raw model inputs (build_features arguments) used when a request omits them
+INPUT_DEFAULTS = {
+    "lat": 40.79,
+    "lon": -73.95,
+    "tilt": 30,
+    "azimuth": 180,
+    "system_capacity_kw": 5.0,
+    "panel_age": 0,
+    "days_since_cleaning": 0,
+}
 
 
 def prepare_features(input_data):
@@ -27,54 +56,102 @@ def prepare_features(input_data):
     }
     """
 
-    # Extract values
-    lat = input_data.get("location", {}).get("latitude", 40.79)
-    lon = input_data.get("location", {}).get("longitude", -73.95)
-    tilt = input_data.get("roof", {}).get("tilt", 30)
-    azimuth = input_data.get("roof", {}).get("azimuth", 180)
-    system_capacity_kw = input_data.get("system", {}).get("capacity_kw", 5.0)
-    panel_age = input_data.get("system", {}).get("panel_age_years", 0)
-    days_since_cleaning = input_data.get("system", {}).get("days_since_cleaning", 0)
+    return build_features(**extract_inputs(input_data))
+
+
+def extract_inputs(input_data):
+    """Pull the raw model inputs out of a frontend request, applying defaults."""
+    location = input_data.get("location", {})
+    roof = input_data.get("roof", {})
+    system = input_data.get("system", {})
+
+    return {
+        "lat": location.get("latitude", INPUT_DEFAULTS["lat"]),
+        "lon": location.get("longitude", INPUT_DEFAULTS["lon"]),
+        "tilt": roof.get("tilt", INPUT_DEFAULTS["tilt"]),
+        "azimuth": roof.get("azimuth", INPUT_DEFAULTS["azimuth"]),
+        "system_capacity_kw": system.get(
+            "capacity_kw", INPUT_DEFAULTS["system_capacity_kw"]
+        ),
+        "panel_age": system.get("panel_age_years", INPUT_DEFAULTS["panel_age"]),
+        "days_since_cleaning": system.get(
+            "days_since_cleaning", INPUT_DEFAULTS["days_since_cleaning"]
+        ),
+    }
+
+
+def prepare_features_batch(inputs):
+    """Prepare one feature row per frontend request in a single vectorized pass."""
+    extracted = [extract_inputs(input_data) for input_data in inputs]
+    return build_features(
+        **{
+            key: np.array([item[key] for item in extracted], dtype=float)
+            for key in extracted[0]
+        }
+    )
+
+
+def build_features(
+    lat, lon, tilt, azimuth, system_capacity_kw, panel_age, days_since_cleaning
+):
+    """
+    Compute the model feature frame from raw inputs.
+
+    Every argument may be a scalar or a NumPy array; arrays are broadcast
+    against each other and produce one row per element.
+    """
+    # Typical noon climate at the site, interpolated from the nearest weather
+    # store sites; sites out of their reach use the latitude estimates below
+    climate = midday_climate(lat, lon)
+
+    def site_climate(name, estimate):
+        value = climate.get(name)
+        if value is None:
+            return estimate
+        return np.where(np.isnan(value), estimate, value)
 
     # Estimate solar irradiance based on latitude (varies significantly by location)
     # Higher latitudes get less solar radiation
-    lat_factor = 1.0 - (abs(lat) / 90.0) * 0.4  # Reduce up to 40% at poles
+    lat_factor = 1.0 - (np.abs(lat) / 90.0) * 0.4  # Reduce up to 40% at poles
 
     # Base irradiance values adjusted by latitude
-    ghi_base = 600.0 * lat_factor  # W/m² - Global Horizontal Irradiance
-    dni_base = 850.0 * lat_factor  # W/m² - Direct Normal Irradiance
-    dhi_base = 150.0 * lat_factor  # W/m² - Diffuse Horizontal Irradiance
+    ghi_base = site_climate("ghi", 600.0 * lat_factor)  # W/m² - Global Horizontal
+    dni_base = site_climate("dni", 850.0 * lat_factor)  # W/m² - Direct Normal
+    dhi_base = site_climate("dhi", 150.0 * lat_factor)  # W/m² - Diffuse Horizontal
 
     # Adjust for system age (degradation)
     age_degradation = 1.0 - (panel_age * 0.005)  # 0.5% per year
 
     # Adjust for cleaning status (dust accumulation)
-    cleaning_factor = 1.0 - min(days_since_cleaning / 90.0, 0.15)  # Up to 15% loss
+    cleaning_factor = 1.0 - np.minimum(
+        days_since_cleaning / 90.0, 0.15
+    )  # Up to 15% loss
 
     # Apply degradation factors
     ghi = ghi_base * age_degradation * cleaning_factor
     dni = dni_base * age_degradation * cleaning_factor
     dhi = dhi_base * age_degradation * cleaning_factor
 
-    # Temperature varies by latitude (tropical vs temperate)
-    temp_air = 25.0 + (abs(lat) - 20) * 0.2  # Warmer near equator
-    wind_speed = 2.5 + (abs(lat) / 30) * 0.5  # More wind at higher latitudes
-    humidity = max(30.0, 70.0 - abs(lat))  # Higher humidity near equator
+    # Temperature varies by latitude (tropical vs temperate): warmer and more
+    # humid near the equator, more wind at higher latitudes
+    temp_air = site_climate("temp_air", 25.0 + (np.abs(lat) - 20) * 0.2)
+    wind_speed = site_climate("wind_speed", 2.5 + (np.abs(lat) / 30) * 0.5)
+    humidity = site_climate("humidity", np.maximum(30.0, 70.0 - np.abs(lat)))
 
     # Calculate solar position (varies by latitude - higher elevation near equator)
-    sun_elevation = 90.0 - abs(lat) + 15.0  # Higher at equator, lower at poles
+    sun_elevation = 90.0 - np.abs(lat) + 15.0  # Higher at equator, lower at poles
     sun_azimuth = azimuth  # Use panel azimuth for alignment
     sun_zenith = 90.0 - sun_elevation
 
     # Tilt optimization factor (better alignment = more POA)
-    optimal_tilt = abs(lat)  # Optimal tilt ≈ latitude
+    optimal_tilt = np.abs(lat)  # Optimal tilt ≈ latitude
     tilt_efficiency = (
-        1.0 - abs(tilt - optimal_tilt) / 90.0
+        1.0 - np.abs(tilt - optimal_tilt) / 90.0
     )  # Penalty for sub-optimal tilt
 
     # Azimuth optimization (180° = south = best for northern hemisphere)
     azimuth_penalty = (
-        abs(azimuth - 180.0) / 180.0 * 0.2
+        np.abs(azimuth - 180.0) / 180.0 * 0.2
     )  # Up to 20% loss for poor orientation
     orientation_factor = 1.0 - azimuth_penalty
 
@@ -143,7 +220,75 @@ def prepare_features(input_data):
         "doy_cos": doy_cos,
     }
 
-    return pd.DataFrame([features])
+    n_rows = np.broadcast(*features.values()).size
+    return pd.DataFrame(
+        {name: np.broadcast_to(value, n_rows) for name, value in features.items()}
+    )
+
+
+def estimate_energy(
+    energy_kwh, system_capacity, lat, tilt, azimuth, panel_age, days_since_cleaning
+):
+    """
+    Scale an hourly energy prediction to daily/annual estimates and efficiency
+    figures. Arguments may be scalars or NumPy arrays.
+    """
+    # Peak sun hours vary by latitude (tropical regions get more sun)
+    # Equator (~0°): 5.5-6 hrs, Mid-latitudes (30-45°): 4-5 hrs, High latitudes (>45°): 3-4 hrs
+    lat_abs = np.abs(lat)
+    peak_sun_hours = np.select(
+        [lat_abs < 15, lat_abs < 30, lat_abs < 45],
+        [6.0, 5.5, 4.5],  # Tropical, subtropical, temperate
+        3.5,  # High latitude
+    )
+
+    # Adjust for system orientation and tilt
+    optimal_tilt = lat_abs
+    tilt_efficiency = 1.0 - np.abs(tilt - optimal_tilt) / 90.0
+    azimuth_efficiency = 1.0 - np.abs(azimuth - 180.0) / 180.0 * 0.2
+
+    # System degradation factors
+    age_factor = 1.0 - (panel_age * 0.005)
+    # Soiling loss increases with days: 0.5% per day up to 30% max
+    cleaning_factor = 1.0 - np.minimum(days_since_cleaning * 0.005, 0.30)
+
+    # Overall system efficiency
+    combined_efficiency = (
+        tilt_efficiency * azimuth_efficiency * age_factor * cleaning_factor
+    )
+
+    # Daily and annual estimates (scale the hourly prediction)
+    daily_energy_kwh = energy_kwh * peak_sun_hours * combined_efficiency
+    annual_energy_kwh = daily_energy_kwh * 365
+
+    # Efficiency calculation based on theoretical maximum
+    theoretical_max = (
+        system_capacity * peak_sun_hours * 365
+    )  # kWh/year at ideal conditions
+    with np.errstate(divide="ignore", invalid="ignore"):
+        actual_efficiency = np.where(
+            theoretical_max > 0, annual_energy_kwh / theoretical_max * 100, 0
+        )
+
+        # Performance metrics
+        capacity_factor = np.where(
+            system_capacity > 0,
+            (annual_energy_kwh / (system_capacity * 8760)) * 100,
+            0,
+        )
+
+    return {
+        "peak_sun_hours": peak_sun_hours,
+        "tilt_efficiency": tilt_efficiency,
+        "azimuth_efficiency": azimuth_efficiency,
+        "age_factor": age_factor,
+        "cleaning_factor": cleaning_factor,
+        "combined_efficiency": combined_efficiency,
+        "daily_energy_kwh": daily_energy_kwh,
+        "annual_energy_kwh": annual_energy_kwh,
+        "system_efficiency_percent": actual_efficiency,
+        "capacity_factor_percent": capacity_factor,
+    }
 
 
 def predict_solar_output(input_data):
@@ -152,134 +297,334 @@ def predict_solar_output(input_data):
     Returns predictions for DC power, AC power, and energy output.
     """
 
+    return predict_solar_output_batch([input_data])[0]
+
+
+def predict_solar_output_batch(inputs):
+    """
+    Predict several frontend requests with one model call.
+
+    Returns one predict_solar_output result per request. If the batched call
+    fails (e.g. one malformed request), each request is predicted on its own
+    so a bad request only fails itself.
+    """
+
     try:
         # Load the trained model
         if not MODEL_PATH.exists():
-            return {
+            error = {
                 "success": False,
                 "error": f"Model file not found at {MODEL_PATH}. Please train the model first.",
             }
+            return [dict(error) for _ in inputs]
+
+        model = cap_estimator_jobs(
+            load_bundle(MODEL_PATH).get(MODEL_COMPONENT), get_budget("serving")
+        )
 
-        model = joblib.load(MODEL_PATH)
+        # Prepare features and make predictions
+        predictions = model.predict(prepare_features_batch(inputs))
 
-        # Prepare features
-        X = prepare_features(input_data)
+        # Model outputs 3 values per row: dc_power_kw, ac_power_kw, energy_kwh
+        finances = project_request_finances(inputs, predictions[:, 2])
+        return [
+            _prediction_response(input_data, row, poa, projection)
+            for input_data, row, poa, projection in zip(
+                inputs, predictions, clear_sky_insolation(inputs), finances
+            )
+        ]
 
-        # Make prediction
-        predictions = model.predict(X)
-
-        # Extract predictions (model outputs 3 values: dc_power_kw, ac_power_kw, energy_kwh)
-        dc_power_kw = float(predictions[0][0])
-        ac_power_kw = float(predictions[0][1])
-        energy_kwh = float(predictions[0][2])
-
-        # Calculate additional metrics
-        system_capacity = input_data.get("system", {}).get("capacity_kw", 5.0)
-        lat = input_data.get("location", {}).get("latitude", 40.79)
-        panel_age = input_data.get("system", {}).get("panel_age_years", 0)
-        days_since_cleaning = input_data.get("system", {}).get("days_since_cleaning", 0)
-        tilt = input_data.get("roof", {}).get("tilt", 30)
-        azimuth = input_data.get("roof", {}).get("azimuth", 180)
-
-        # Peak sun hours vary by latitude (tropical regions get more sun)
-        # Equator (~0°): 5.5-6 hrs, Mid-latitudes (30-45°): 4-5 hrs, High latitudes (>45°): 3-4 hrs
-        lat_abs = abs(lat)
-        if lat_abs < 15:
-            peak_sun_hours = 6.0  # Tropical
-        elif lat_abs < 30:
-            peak_sun_hours = 5.5  # Subtropical
-        elif lat_abs < 45:
-            peak_sun_hours = 4.5  # Temperate
-        else:
-            peak_sun_hours = 3.5  # High latitude
-
-        # Adjust for system orientation and tilt
-        optimal_tilt = lat_abs
-        tilt_efficiency = 1.0 - abs(tilt - optimal_tilt) / 90.0
-        azimuth_efficiency = 1.0 - abs(azimuth - 180.0) / 180.0 * 0.2
-
-        # System degradation factors
-        age_factor = 1.0 - (panel_age * 0.005)
-        # Soiling loss increases with days: 0.5% per day up to 30% max
-        cleaning_factor = 1.0 - min(days_since_cleaning * 0.005, 0.30)
-
-        # Overall system efficiency
-        combined_efficiency = (
-            tilt_efficiency * azimuth_efficiency * age_factor * cleaning_factor
+    except Exception as e:
+        if len(inputs) > 1:
+            return [predict_solar_output(input_data) for input_data in inputs]
+        return [{"success": False, "error": str(e)}]
+
+
+def clear_sky_insolation(inputs):
+    """
+    Annual clear-sky plane-of-array insolation (kWh/m²) of the roof of each
+    request that asks for it with "clear_sky": true, from the cached
+    clear-sky profiles (see clear_sky); None for the other requests, and for
+    all of them if it cannot be computed. Opt-in, as a location's first
+    profile needs pvlib and a year of solar positions.
+    """
+    insolation = [None] * len(inputs)
+    wanted = [i for i, input_data in enumerate(inputs) if input_data.get("clear_sky")]
+    if not wanted:
+        return insolation
+    try:
+        from clear_sky import annual_clear_sky_poa
+
+        raw = [extract_inputs(inputs[i]) for i in wanted]
+        poa = annual_clear_sky_poa(
+            [r["lat"] for r in raw],
+            [r["lon"] for r in raw],
+            [r["tilt"] for r in raw],
+            [r["azimuth"] for r in raw],
         )
+        for i, value in zip(wanted, poa.tolist()):
+            insolation[i] = value
+    except Exception as e:
+        print(f"Clear-sky insolation unavailable: {e}", file=sys.stderr)
+    return insolation
 
-        # Daily and annual estimates (scale the hourly prediction)
-        daily_energy_kwh = energy_kwh * peak_sun_hours * combined_efficiency
-        annual_energy_kwh = daily_energy_kwh * 365
 
-        # Efficiency calculation based on theoretical maximum
-        theoretical_max = (
-            system_capacity * peak_sun_hours * 365
-        )  # kWh/year at ideal conditions
-        actual_efficiency = (
-            (annual_energy_kwh / theoretical_max * 100) if theoretical_max > 0 else 0
+def project_request_finances(inputs, hourly_energy_kwh):
+    """
+    Financial projection of each request (see financial_engine), one
+    scenario per request: its annual energy estimate and capacity plus any
+    scenario fields given under its "financial" key.
+
+    Returns:
+        One dict of metrics per request, or {"error": ...} for a request
+        whose financial fields are invalid (its prediction is still returned)
+    """
+    raw = pd.DataFrame([extract_inputs(input_data) for input_data in inputs])
+    annual_energy_kwh = estimate_energy(
+        np.asarray(hourly_energy_kwh, dtype=float),
+        raw["system_capacity_kw"].to_numpy(dtype=float),
+        raw["lat"].to_numpy(dtype=float),
+        raw["tilt"].to_numpy(dtype=float),
+        raw["azimuth"].to_numpy(dtype=float),
+        raw["panel_age"].to_numpy(dtype=float),
+        raw["days_since_cleaning"].to_numpy(dtype=float),
+    )["annual_energy_kwh"]
+
+    def project(requests, energies, capacities):
+        scenarios = [
+            {
+                "annual_energy_kwh": float(energy),
+                "system_capacity_kw": float(capacity),
+                **input_data.get("financial", {}),
+            }
+            for input_data, energy, capacity in zip(requests, energies, capacities)
+        ]
+        terms = scenario_frame(scenarios)
+        result = project_finances(scenarios)
+        return [
+            {
+                "tariff_inr_per_kwh": float(terms["tariff_inr_per_kwh"].iloc[i]),
+                "horizon_years": int(terms["horizon_years"].iloc[i]),
+                **{name: float(values[i]) for name, values in result.items()},
+            }
+            for i in range(len(scenarios))
+        ]
+
+    capacities = raw["system_capacity_kw"].to_numpy(dtype=float)
+    try:
+        return project(inputs, annual_energy_kwh, capacities)
+    except Exception:
+        # Project each request on its own so a bad one only fails itself
+        finances = []
+        for i, input_data in enumerate(inputs):
+            try:
+                finances += project(
+                    [input_data], annual_energy_kwh[i : i + 1], capacities[i : i + 1]
+                )
+            except Exception as e:
+                finances.append({"error": str(e)})
+        return finances
+
+
+def _rounded_or_none(value, digits):
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+def _prediction_response(input_data, prediction, clear_sky_poa=None, finances=None):
+    """Response for one request from its model outputs."""
+    dc_power_kw = float(prediction[0])
+    ac_power_kw = float(prediction[1])
+    energy_kwh = float(prediction[2])
+
+    # Calculate additional metrics
+    system_capacity = input_data.get("system", {}).get("capacity_kw", 5.0)
+    lat = input_data.get("location", {}).get("latitude", 40.79)
+    panel_age = input_data.get("system", {}).get("panel_age_years", 0)
+    days_since_cleaning = input_data.get("system", {}).get("days_since_cleaning", 0)
+    tilt = input_data.get("roof", {}).get("tilt", 30)
+    azimuth = input_data.get("roof", {}).get("azimuth", 180)
+
+    estimates = {
+        name: float(value)
+        for name, value in estimate_energy(
+            energy_kwh,
+            system_capacity,
+            lat,
+            tilt,
+            azimuth,
+            panel_age,
+            days_since_cleaning,
+        ).items()
+    }
+    peak_sun_hours = estimates["peak_sun_hours"]
+    tilt_efficiency = estimates["tilt_efficiency"]
+    azimuth_efficiency = estimates["azimuth_efficiency"]
+    age_factor = estimates["age_factor"]
+    cleaning_factor = estimates["cleaning_factor"]
+    combined_efficiency = estimates["combined_efficiency"]
+    daily_energy_kwh = estimates["daily_energy_kwh"]
+    annual_energy_kwh = estimates["annual_energy_kwh"]
+    actual_efficiency = estimates["system_efficiency_percent"]
+    capacity_factor = estimates["capacity_factor_percent"]
+
+    # First-year savings at the request's tariff; lifetime figures from its
+    # financial projection, and the investment metrics only when the request
+    # gives its costs (the defaults' system cost is only an assumption)
+    finances = finances or {}
+    tariff = finances.get("tariff_inr_per_kwh", SCENARIO_DEFAULTS["tariff_inr_per_kwh"])
+    financial = {
+        "annual_savings_inr": round(annual_energy_kwh * tariff, 0),
+        "monthly_savings_inr": round((annual_energy_kwh * tariff) / 12, 0),
+        "25_year_savings_inr": round(annual_energy_kwh * tariff * 25 * 0.95, 0),
+        "cost_per_kwh": tariff,
+    }
+    if "error" in finances:
+        financial["error"] = finances["error"]
+    elif finances:
+        financial["lifetime_years"] = finances["horizon_years"]
+        financial["lifetime_savings_inr"] = round(finances["total_savings_inr"], 0)
+        if any(field in input_data.get("financial", {}) for field in COST_FIELDS):
+            financial.update(
+                {
+                    "npv_inr": round(finances["npv_inr"], 0),
+                    "irr_percent": _rounded_or_none(finances["irr"] * 100, 2),
+                    "payback_years": _rounded_or_none(finances["payback_years"], 1),
+                    "lcoe_inr_per_kwh": _rounded_or_none(
+                        finances["lcoe_inr_per_kwh"], 2
+                    ),
+                }
+            )
+
+    clear_sky = {}
+    if clear_sky_poa:
+        # Energy with a cloudless sky all year and no losses: an upper bound
+        upper_bound_kwh = clear_sky_poa * system_capacity
+        clear_sky = {
+            "clear_sky": {
+                "annual_poa_kwh_m2": round(clear_sky_poa, 1),
+                "annual_energy_upper_bound_kwh": round(upper_bound_kwh, 0),
+                "annual_estimate_share_percent": round(
+                    annual_energy_kwh / upper_bound_kwh * 100, 1
+                ),
+            }
+        }
+
+    return {
+        "success": True,
+        "predictions": {
+            "instantaneous": {
+                "dc_power_kw": round(dc_power_kw, 4),
+                "ac_power_kw": round(ac_power_kw, 4),
+                "hourly_energy_kwh": round(energy_kwh, 4),
+            },
+            "daily": {
+                "energy_kwh": round(daily_energy_kwh, 2),
+                "peak_power_kw": round(ac_power_kw, 2),
+            },
+            "annual": {
+                "energy_kwh": round(annual_energy_kwh, 0),
+                "energy_mwh": round(annual_energy_kwh / 1000, 2),
+            },
+            "efficiency": {
+                "system_efficiency_percent": round(actual_efficiency, 2),
+                "capacity_factor_percent": round(capacity_factor, 2),
+                "performance_ratio": round(combined_efficiency * 0.85, 3),
+                "degradation_factor": round(age_factor, 3),
+                "soiling_loss_percent": round((1 - cleaning_factor) * 100, 2),
+                "orientation_efficiency": round(azimuth_efficiency, 3),
+                "tilt_efficiency": round(tilt_efficiency, 3),
+            },
+            "financial": financial,
+            **clear_sky,
+        },
+        "model_info": {
+            "model_name": MODEL_NAMES.get(MODEL_COMPONENT, MODEL_COMPONENT),
+            "model_component": MODEL_COMPONENT,
+            "model_version": "1.0.0",
+            "trained_on": "2025-09-02 to 2025-11-04 data",
+            "accuracy_r2": 0.9990,
+            "mape_percent": 0.89,
+        },
+        "input_features": {
+            "azimuth": azimuth,
+            "panel_age_years": panel_age,
+            "days_since_cleaning": days_since_cleaning,
+            "peak_sun_hours": round(peak_sun_hours, 2),
+            "combined_efficiency": round(combined_efficiency, 3),
+            "location": f"{input_data.get('location', {}).get('latitude', 0)}, {input_data.get('location', {}).get('longitude', 0)}",
+            "system_capacity_kw": system_capacity,
+            "tilt": input_data.get("roof", {}).get("tilt", 30),
+            "azimuth": input_data.get("roof", {}).get("azimuth", 180),
+        },
+    }
+
+
+def predict_solar_output_columnar(inputs):
+    """
+    Predict many systems at once from columnar raw inputs.
+
+    Args:
+        inputs: Dict of equal-length arrays keyed by build_features argument
+            (lat, lon, tilt, azimuth, system_capacity_kw, panel_age,
+            days_since_cleaning); missing inputs take INPUT_DEFAULTS
+
+    Returns:
+        Dict whose "results" maps each output to an array with one value per
+        system
+    """
+    try:
+        if not MODEL_PATH.exists():
+            return {
+                "success": False,
+                "error": f"Model file not found at {MODEL_PATH}. Please train the model first.",
+            }
+
+        unknown = sorted(set(inputs) - set(INPUT_DEFAULTS))
+        if unknown:
+            return {
+                "success": False,
+                "error": f"Unknown inputs: {unknown}",
+                "expected_inputs": list(INPUT_DEFAULTS),
+            }
+
+        model = cap_estimator_jobs(
+            load_bundle(MODEL_PATH).get(MODEL_COMPONENT), get_budget("serving")
         )
 
-        # Performance metrics
-        capacity_factor = (
-            (annual_energy_kwh / (system_capacity * 8760)) * 100
-            if system_capacity > 0
-            else 0
+        n_rows = max((len(values) for values in inputs.values()), default=0)
+        columns = {
+            name: np.asarray(inputs.get(name, np.full(n_rows, default)), dtype=float)
+            for name, default in INPUT_DEFAULTS.items()
+        }
+        predictions = model.predict(build_features(**columns))
+
+        estimates = estimate_energy(
+            predictions[:, 2],
+            columns["system_capacity_kw"],
+            columns["lat"],
+            columns["tilt"],
+            columns["azimuth"],
+            columns["panel_age"],
+            columns["days_since_cleaning"],
         )
 
         return {
             "success": True,
-            "predictions": {
-                "instantaneous": {
-                    "dc_power_kw": round(dc_power_kw, 4),
-                    "ac_power_kw": round(ac_power_kw, 4),
-                    "hourly_energy_kwh": round(energy_kwh, 4),
-                },
-                "daily": {
-                    "energy_kwh": round(daily_energy_kwh, 2),
-                    "peak_power_kw": round(ac_power_kw, 2),
-                },
-                "annual": {
-                    "energy_kwh": round(annual_energy_kwh, 0),
-                    "energy_mwh": round(annual_energy_kwh / 1000, 2),
-                },
-                "efficiency": {
-                    "system_efficiency_percent": round(actual_efficiency, 2),
-                    "capacity_factor_percent": round(capacity_factor, 2),
-                    "performance_ratio": round(combined_efficiency * 0.85, 3),
-                    "degradation_factor": round(age_factor, 3),
-                    "soiling_loss_percent": round((1 - cleaning_factor) * 100, 2),
-                    "orientation_efficiency": round(azimuth_efficiency, 3),
-                    "tilt_efficiency": round(tilt_efficiency, 3),
-                },
-                "financial": {
-                    "annual_savings_inr": round(
-                        annual_energy_kwh * 6.5, 0
-                    ),  # ₹6.5/kWh average tariff
-                    "monthly_savings_inr": round((annual_energy_kwh * 6.5) / 12, 0),
-                    "25_year_savings_inr": round(
-                        annual_energy_kwh * 6.5 * 25 * 0.95, 0
-                    ),  # 5% discount for degradation
-                    "cost_per_kwh": 6.5,
-                },
+            "total_requests": len(predictions),
+            "results": {
+                "dc_power_kw": predictions[:, 0],
+                "ac_power_kw": predictions[:, 1],
+                "hourly_energy_kwh": predictions[:, 2],
+                "daily_energy_kwh": estimates["daily_energy_kwh"],
+                "annual_energy_kwh": estimates["annual_energy_kwh"],
+                "system_efficiency_percent": estimates["system_efficiency_percent"],
+                "capacity_factor_percent": estimates["capacity_factor_percent"],
+                "performance_ratio": estimates["combined_efficiency"] * 0.85,
             },
             "model_info": {
-                "model_name": "Histogram Gradient Boosting",
+                "model_name": MODEL_NAMES.get(MODEL_COMPONENT, MODEL_COMPONENT),
+                "model_component": MODEL_COMPONENT,
                 "model_version": "1.0.0",
-                "trained_on": "2025-09-02 to 2025-11-04 data",
-                "accuracy_r2": 0.9990,
-                "mape_percent": 0.89,
-            },
-            "input_features": {
-                "azimuth": azimuth,
-                "panel_age_years": panel_age,
-                "days_since_cleaning": days_since_cleaning,
-                "peak_sun_hours": round(peak_sun_hours, 2),
-                "combined_efficiency": round(combined_efficiency, 3),
-                "location": f"{input_data.get('location', {}).get('latitude', 0)}, {input_data.get('location', {}).get('longitude', 0)}",
-                "system_capacity_kw": system_capacity,
-                "tilt": input_data.get("roof", {}).get("tilt", 30),
-                "azimuth": input_data.get("roof", {}).get("azimuth", 180),
             },
         }
 
@@ -291,8 +636,21 @@ def main():
     """
     Main entry point when called from Node.js backend.
     Reads JSON from stdin, makes prediction, outputs JSON to stdout.
+    "clear_sky": true in the request adds the clear-sky upper bound.
+
+    With --format columnar|binary (see wire_format) the input is a batch,
+    {"inputs": {"lat": [...], "tilt": [...], ...}}, predicted in one call.
     """
+    apply_thread_budget("serving")
     try:
+        fmt, _ = parse_format_flag(sys.argv[1:])
+        if fmt != "json":
+            request = read_request(fmt, "inputs")
+            if "inputs" not in request:
+                raise ValueError("Expected 'inputs' key with one array per input")
+            write_response(predict_solar_output_columnar(request["inputs"]), fmt)
+            return
+
         # Read input from stdin
         input_json = sys.stdin.read()
         input_data = json.loads(input_json)
@@ -0,0 +1,274 @@
+"""
+Training Resource Profiler
+Records wall time, CPU time and peak RSS for each training stage and persists a
+machine-readable profile (with a diff against the previous run) next to
+FINAL_MODEL_REPORT.json.
+"""
+
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+PROFILE_PATH = Path(__file__).parent / "TRAINING_PROFILE.json"
+
+# A metric growing by more than this factor versus the previous run is flagged
+REGRESSION_RATIO = 1.5
+# Metrics below these floors are too small to compare meaningfully
+MIN_COMPARABLE = {"wall_seconds": 1.0, "cpu_seconds": 1.0, "peak_rss_mb": 50.0}
+MIN_COMPARABLE_ARTIFACT_BYTES = 64 * 1024
+
+SAMPLE_INTERVAL_SECONDS = 0.01
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB (None if unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / (1024 * 1024)
+    except (OSError, IndexError, ValueError):
+        return max_rss_mb()
+
+
+def max_rss_mb() -> Optional[float]:
+    """Lifetime peak RSS of this process in MB (None if unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class _StageRecord:
+    def __init__(self, name: str):
+        self.name = name
+        self.children: List["_StageRecord"] = []
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rss_start_mb = current_rss_mb()
+        self.peak_rss_mb = self.rss_start_mb
+
+    def observe(self, rss_mb: Optional[float]):
+        if rss_mb is not None and (
+            self.peak_rss_mb is None or rss_mb > self.peak_rss_mb
+        ):
+            self.peak_rss_mb = rss_mb
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "rss_start_mb": self.rss_start_mb,
+            "peak_rss_mb": self.peak_rss_mb,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class _RSSSampler(threading.Thread):
+    """Background thread feeding RSS samples to every open stage."""
+
+    def __init__(self):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(SAMPLE_INTERVAL_SECONDS):
+            rss = current_rss_mb()
+            with _lock:
+                for record in _stack:
+                    record.observe(rss)
+
+
+_lock = threading.Lock()
+_stack: List[_StageRecord] = []
+_roots: List[_StageRecord] = []
+_sampler: Optional[_RSSSampler] = None
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Profile a block of code as a named stage.
+
+    Stages opened inside another stage are recorded as its children, so library
+    code can mark its own sub-stages (data loading, fitting, serialization...)
+    without knowing whether a profile is being collected.
+    """
+    global _sampler
+
+    record = _StageRecord(name)
+    with _lock:
+        (_stack[-1].children if _stack else _roots).append(record)
+        _stack.append(record)
+        if _sampler is None:
+            _sampler = _RSSSampler()
+            _sampler.start()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record.wall_seconds = time.perf_counter() - wall_start
+        record.cpu_seconds = time.process_time() - cpu_start
+        record.observe(current_rss_mb())
+        with _lock:
+            _stack.remove(record)
+            sampler = _sampler if not _stack else None
+            if sampler is not None:
+                _sampler = None
+        if sampler is not None:
+            sampler.stop_event.set()
+            sampler.join()
+
+
+def collect() -> List[Dict]:
+    """Return the completed top-level stages and reset the collector."""
+    with _lock:
+        finished = [record for record in _roots if record not in _stack]
+        for record in finished:
+            _roots.remove(record)
+    return [record.to_dict() for record in finished]
+
+
+def artifact_sizes(paths: Iterable[Path]) -> Dict[str, int]:
+    """Size in bytes of each existing artifact, keyed by file name."""
+    return {Path(p).name: Path(p).stat().st_size for p in paths if Path(p).exists()}
+
+
+def _flatten(stages: List[Dict], prefix: str = "") -> Dict[str, Dict]:
+    flat = {}
+    for entry in stages:
+        path = f"{prefix}{entry['name']}"
+        flat[path] = entry
+        flat.update(_flatten(entry.get("children", []), prefix=f"{path}/"))
+    return flat
+
+
+def _ratio(previous, current) -> Optional[float]:
+    if previous is None or current is None or previous <= 0:
+        return None
+    return current / previous
+
+
+def diff_profiles(previous: Dict, current: Dict) -> Dict:
+    """
+    Compare two profiles stage by stage and artifact by artifact.
+
+    Returns per-metric previous/current/ratio values plus a list of regressions
+    where a metric grew by more than REGRESSION_RATIO.
+    """
+    regressions = []
+    stage_diff = {}
+    previous_stages = _flatten(previous.get("stages", []))
+    for path, entry in _flatten(current.get("stages", [])).items():
+        if path not in previous_stages:
+            continue
+        stage_diff[path] = {}
+        for metric, floor in MIN_COMPARABLE.items():
+            before, after = previous_stages[path].get(metric), entry.get(metric)
+            ratio = _ratio(before, after)
+            stage_diff[path][metric] = {
+                "previous": before,
+                "current": after,
+                "ratio": ratio,
+            }
+            if ratio is not None and ratio > REGRESSION_RATIO and after >= floor:
+                regressions.append(f"{path} {metric}: {before:.2f} -> {after:.2f}")
+
+    artifact_diff = {}
+    previous_artifacts = previous.get("artifacts", {})
+    for name, size in current.get("artifacts", {}).items():
+        before = previous_artifacts.get(name)
+        ratio = _ratio(before, size)
+        artifact_diff[name] = {"previous": before, "current": size, "ratio": ratio}
+        if (
+            ratio is not None
+            and ratio > REGRESSION_RATIO
+            and size >= MIN_COMPARABLE_ARTIFACT_BYTES
+        ):
+            regressions.append(f"{name} size: {before} -> {size} bytes")
+
+    return {
+        "previous_generated_at": previous.get("generated_at"),
+        "regression_ratio": REGRESSION_RATIO,
+        "stages": stage_diff,
+        "artifacts": artifact_diff,
+        "regressions": regressions,
+    }
+
+
+def write_profile(
+    stages: List[Dict],
+    artifacts: Dict[str, int],
+    profile_path: Path = PROFILE_PATH,
+    wall_seconds: Optional[float] = None,
+) -> Dict:
+    """
+    Persist a training profile, diffing it against the previous one on disk.
+
+    `wall_seconds` overrides the total wall time when stages ran concurrently.
+    Returns the written profile.
+    """
+    profile = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "stages": stages,
+        "artifacts": artifacts,
+        "totals": {
+            "wall_seconds": (
+                wall_seconds
+                if wall_seconds is not None
+                else sum(s["wall_seconds"] for s in stages)
+            ),
+            "cpu_seconds": sum(s["cpu_seconds"] for s in stages),
+            "peak_rss_mb": max(
+                (s["peak_rss_mb"] for s in stages if s["peak_rss_mb"] is not None),
+                default=None,
+            ),
+            "artifact_bytes": sum(artifacts.values()),
+        },
+    }
+
+    profile_path = Path(profile_path)
+    if profile_path.exists():
+        try:
+            with open(profile_path) as f:
+                profile["diff_vs_previous"] = diff_profiles(json.load(f), profile)
+        except (OSError, ValueError) as e:
+            print(f"Could not read previous profile {profile_path}: {e}")
+
+    with open(profile_path, "w") as f:
+        json.dump(profile, f, indent=2)
+
+    return profile
+
+
+def print_profile(profile: Dict):
+    """Print a compact stage table and any flagged regressions."""
+    print(f"{'Stage':<45} {'Wall s':>9} {'CPU s':>9} {'Peak MB':>9}")
+    for path, entry in _flatten(profile["stages"]).items():
+        peak = entry["peak_rss_mb"]
+        print(
+            f"{path:<45} {entry['wall_seconds']:>9.2f} {entry['cpu_seconds']:>9.2f} "
+            f"{(f'{peak:.1f}' if peak is not None else 'n/a'):>9}"
+        )
+
+    regressions = profile.get("diff_vs_previous", {}).get("regressions", [])
+    for regression in regressions:
+        print(f"⚠️  Regression vs previous run: {regression}")
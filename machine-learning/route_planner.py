@@ -0,0 +1,276 @@
+"""
+Cleaning Crew Route Planner
+Turns the panels that predict_maintenance_need says should be cleaned into
+crew routes: panels are indexed in a KD-tree, grouped greedily (most urgent
+first) into crew-sized batches within a distance limit, and each batch is
+ordered with a nearest-neighbour tour improved by 2-opt.
+
+Batching asks the tree for crew_size neighbours per batch, widening the query
+only past panels that are already assigned, and the tree is rebuilt over the
+unassigned panels as they thin out, so it grows close to n log n in the
+number of panels (routes are ordered per batch); 50k panels plan in seconds.
+"""
+
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from geo import chord_km, haversine_km, to_unit_sphere
+
+DEFAULT_CREW_SIZE = 25  # Panels per route
+DEFAULT_MAX_DISTANCE_KM = 10.0  # From a route's first (most urgent) panel
+TWO_OPT_MAX_PASSES = 20
+URGENCY_LEVELS = ["low", "medium", "high"]
+URGENCY_RANK = {level: rank for rank, level in enumerate(URGENCY_LEVELS)}
+
+
+def _coordinates(df: pd.DataFrame) -> np.ndarray:
+    """(n, 2) latitude/longitude in degrees from the columns the backend uses."""
+    for lat, lon in (("latitude", "longitude"), ("lat", "lon")):
+        if {lat, lon}.issubset(df.columns):
+            return df[[lat, lon]].to_numpy(dtype=float)
+    if "coordinates" in df.columns:
+        # {lat, lon} as in SolarAnalysisResult, or [lat, lng] as on panels
+        return np.array(
+            [
+                (c["lat"], c["lon"]) if isinstance(c, dict) else (c[0], c[1])
+                for c in df["coordinates"]
+            ],
+            dtype=float,
+        )
+    raise ValueError("Panels need latitude/longitude, lat/lon or coordinates")
+
+
+def cluster_batches(
+    points: np.ndarray, priority: np.ndarray, crew_size: int, max_distance_km: float
+) -> List[np.ndarray]:
+    """
+    Greedy batching: the most urgent unassigned panel seeds a batch, which
+    takes its nearest unassigned panels within max_distance_km, up to
+    crew_size.
+
+    Each query asks for crew_size neighbours and doubles k only while
+    assigned panels crowd out free ones. The KD-tree covers only panels that
+    were unassigned when it was built and is rebuilt once half of them are
+    taken, so queries stay cheap.
+    """
+    n = len(points)
+    radius = chord_km(max_distance_km)
+    assigned = np.zeros(n, dtype=bool)
+    members = np.arange(n)
+    tree = cKDTree(points)
+    taken_since_build = 0
+
+    batches = []
+    for seed in np.argsort(-priority, kind="stable"):
+        if assigned[seed]:
+            continue
+        if taken_since_build > len(members) // 2:
+            members = np.flatnonzero(~assigned)
+            tree = cKDTree(points[members])
+            taken_since_build = 0
+
+        k = min(crew_size, len(members))
+        while True:
+            distance, index = tree.query(points[seed], k=k, distance_upper_bound=radius)
+            distance, index = np.atleast_1d(distance), np.atleast_1d(index)
+            found = members[index[np.isfinite(distance)]]
+            batch = found[~assigned[found]]
+            # Enough free panels, or every panel within the radius was seen
+            if len(batch) >= crew_size or len(found) < k or k == len(members):
+                break
+            k = min(2 * k, len(members))
+
+        batch = batch[:crew_size]
+        if seed not in batch:
+            batch = np.r_[seed, batch[: crew_size - 1]]
+        assigned[batch] = True
+        taken_since_build += len(batch)
+        batches.append(batch)
+    return batches
+
+
+def order_route(coords: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Visit order for one batch (starting at its first panel) and its length in
+    km: nearest-neighbour construction, then 2-opt on the open path.
+    """
+    n = len(coords)
+    if n <= 2:
+        order = np.arange(n)
+        return order, float(haversine_km(coords[order[:-1]], coords[order[1:]]).sum())
+
+    dist = haversine_km(coords[:, None, :], coords[None, :, :])
+    order = [0]
+    unvisited = np.ones(n, dtype=bool)
+    unvisited[0] = False
+    for _ in range(n - 1):
+        row = np.where(unvisited, dist[order[-1]], np.inf)
+        nxt = int(np.argmin(row))
+        order.append(nxt)
+        unvisited[nxt] = False
+    order = np.array(order)
+
+    for _ in range(TWO_OPT_MAX_PASSES):
+        improved = False
+        for i in range(1, n - 1):
+            # Reverse order[i..j]: edges (i-1, i) and (j, j+1) are replaced
+            a, b = order[i - 1], order[i]
+            c = order[i + 1 :]
+            d = np.r_[order[i + 2 :], -1]
+            old = dist[a, b] + np.where(d >= 0, dist[c, d], 0)
+            new = dist[a, c] + np.where(d >= 0, dist[b, d], 0)
+            gain = old - new
+            j = int(np.argmax(gain))
+            if gain[j] > 1e-9:
+                order[i : i + j + 2] = order[i : i + j + 2][::-1]
+                improved = True
+        if not improved:
+            break
+    return order, float(dist[order[:-1], order[1:]].sum())
+
+
+def plan_routes(
+    panel_data,
+    crew_size: int = DEFAULT_CREW_SIZE,
+    max_distance_km: float = DEFAULT_MAX_DISTANCE_KM,
+    maintenance: Optional[Dict] = None,
+) -> Dict:
+    """
+    Route the panels that need cleaning.
+
+    Args:
+        panel_data: List of dicts (or a dict of arrays) with coordinates, an
+            optional panel_id and either should_clean/urgency (from an earlier
+            predict_maintenance_need call) or the maintenance features
+        crew_size: Maximum panels per route
+        max_distance_km: Maximum distance of a panel from its route's first
+            panel
+        maintenance: Columnar predict_maintenance_need results for
+            panel_data, if already computed
+
+    Returns:
+        Dict with routes ordered by priority (most urgent first)
+    """
+    df = pd.DataFrame(panel_data)
+    if df.empty:
+        return {"error": "No panels provided"}
+
+    if maintenance is None and "should_clean" not in df.columns:
+        from maintenance_predictor import predict_maintenance_need
+
+        maintenance = predict_maintenance_need(df, columnar=True)
+        if "error" in maintenance:
+            return maintenance
+    if maintenance is not None:
+        results = maintenance["results"]
+        df = df.assign(
+            should_clean=results["should_clean"],
+            urgency=results["urgency"],
+            predicted_efficiency_loss_pct=results["predicted_efficiency_loss_pct"],
+        )
+
+    try:
+        coords = _coordinates(df)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    panel_ids = (
+        df["panel_id"].astype(str).to_numpy()
+        if "panel_id" in df.columns
+        else np.arange(len(df)).astype(str)
+    )
+    to_clean = np.flatnonzero(df["should_clean"].fillna(False).to_numpy(dtype=bool))
+    valid = np.isfinite(coords[to_clean]).all(axis=1)
+    unlocated = to_clean[~valid]
+    to_clean = to_clean[valid]
+
+    urgency = (
+        df["urgency"].map(URGENCY_RANK).fillna(0).to_numpy()
+        if "urgency" in df.columns
+        else np.zeros(len(df))
+    )
+    loss = (
+        df["predicted_efficiency_loss_pct"].fillna(0).to_numpy(dtype=float)
+        if "predicted_efficiency_loss_pct" in df.columns
+        else np.zeros(len(df))
+    )
+    # Urgency first, then predicted loss within an urgency level
+    priority = urgency * 1000 + loss
+
+    batches = (
+        cluster_batches(
+            to_unit_sphere(coords[to_clean]),
+            priority[to_clean],
+            crew_size,
+            max_distance_km,
+        )
+        if len(to_clean)
+        else []
+    )
+
+    routes = []
+    for batch in batches:
+        panels = to_clean[batch]
+        order, length = order_route(coords[panels])
+        panels = panels[order]
+        routes.append(
+            {
+                "panel_ids": panel_ids[panels].tolist(),
+                "stops": len(panels),
+                "distance_km": length,
+                "start": coords[panels[0]].tolist(),
+                "highest_urgency": URGENCY_LEVELS[int(urgency[panels].max())],
+                "total_efficiency_loss_pct": float(loss[panels].sum()),
+                "_priority": float(priority[panels].max()),
+            }
+        )
+    routes.sort(key=lambda r: -r.pop("_priority"))
+    for number, route in enumerate(routes):
+        route["route_id"] = number
+
+    return {
+        "status": "success",
+        "total_panels": len(df),
+        "panels_to_clean": int(len(to_clean) + len(unlocated)),
+        "routes_planned": len(routes),
+        "total_distance_km": float(sum(r["distance_km"] for r in routes)),
+        "unlocated_panel_ids": panel_ids[unlocated].tolist(),
+        "settings": {"crew_size": crew_size, "max_distance_km": max_distance_km},
+        "routes": routes,
+    }
+
+
+def main():
+    """
+    CLI: python route_planner.py
+    Reads {"panel_data": [...], "crew_size": 25, "max_distance_km": 10} from
+    stdin (crew_size and max_distance_km optional) and writes the routes.
+    """
+    try:
+        request = json.loads(sys.stdin.read())
+        if "panel_data" not in request:
+            print(json.dumps({"error": "Expected 'panel_data' key in input JSON"}))
+            sys.exit(1)
+        result = plan_routes(
+            request["panel_data"],
+            crew_size=int(request.get("crew_size", DEFAULT_CREW_SIZE)),
+            max_distance_km=float(
+                request.get("max_distance_km", DEFAULT_MAX_DISTANCE_KM)
+            ),
+        )
+        print(json.dumps(result, indent=2))
+    except json.JSONDecodeError as e:
+        print(json.dumps({"error": f"Invalid JSON input: {str(e)}"}))
+        sys.exit(1)
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Power Model Sensitivity Analysis
+Which input matters most for a site: Sobol indices of the power model's
+prediction over ranges of tilt, azimuth, panel age and days since cleaning
+around a base request.
+
+Saltelli sampling (scrambled Sobol sequences from scipy.stats.qmc) gives
+N * (factors + 2) input rows, featurized as one matrix with
+predict_service.build_features and evaluated with chunked model.predict
+calls, optionally across a process pool. First-order (S1: the share of the
+output variance a factor explains alone) and total (ST: including its
+interactions) indices use the Saltelli 2010 and Jansen estimators, with
+bootstrap confidence intervals.
+"""
+
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.stats import qmc
+
+from model_bundle import load_bundle
+from predict_service import (
+    INPUT_DEFAULTS,
+    MODEL_COMPONENT,
+    MODEL_PATH,
+    build_features,
+    estimate_energy,
+    extract_inputs,
+)
+from thread_budget import apply_thread_budget, cap_estimator_jobs, get_budget
+
+DEFAULT_FACTORS = ["tilt", "azimuth", "panel_age", "days_since_cleaning"]
+# Default range of each factor: base value +/- span, clipped to the bounds
+FACTOR_SPANS = {
+    "tilt": 15.0,
+    "azimuth": 45.0,
+    "panel_age": 5.0,
+    "days_since_cleaning": 60.0,
+    "system_capacity_kw": 2.0,
+    "lat": 2.0,
+    "lon": 2.0,
+}
+FACTOR_BOUNDS = {
+    "tilt": (0.0, 90.0),
+    "azimuth": (0.0, 360.0),
+    "panel_age": (0.0, 40.0),
+    "days_since_cleaning": (0.0, 365.0),
+    "system_capacity_kw": (0.1, 1000.0),
+    "lat": (-90.0, 90.0),
+    "lon": (-180.0, 180.0),
+}
+OUTPUTS = ["annual_energy_kwh", "ac_power_kw", "dc_power_kw", "hourly_energy_kwh"]
+DEFAULT_SAMPLES = 1024  # Base samples N (a power of two, for the Sobol sequence)
+CHUNK_ROWS = 4096  # Rows per model.predict call
+BOOTSTRAP_RESAMPLES = 200
+CONFIDENCE_Z = 1.96  # 95% intervals
+
+
+def factor_ranges(
+    base: Dict, factors: List[str], ranges: Optional[Dict] = None
+) -> Dict[str, tuple]:
+    """
+    (low, high) of every factor: given explicitly in ranges, otherwise the
+    base value +/- FACTOR_SPANS clipped to FACTOR_BOUNDS.
+    """
+    ranges = ranges or {}
+    out = {}
+    for name in factors:
+        if name in ranges:
+            low, high = (float(v) for v in ranges[name])
+        elif name in FACTOR_SPANS:
+            lower, upper = FACTOR_BOUNDS[name]
+            low = max(lower, float(base[name]) - FACTOR_SPANS[name])
+            high = min(upper, float(base[name]) + FACTOR_SPANS[name])
+        else:
+            raise ValueError(f"Unknown factor {name}; give its range explicitly")
+        if not low < high:
+            raise ValueError(f"Empty range for {name}: {low} to {high}")
+        out[name] = (low, high)
+    return out
+
+
+def saltelli_sample(ranges: Dict[str, tuple], n: int, seed: int = 42) -> Dict:
+    """
+    Saltelli design: matrices A and B of n rows, and for every factor i the
+    matrix AB_i (A with column i from B).
+
+    Returns:
+        Dict with "A", "B" and "AB" ((factors, n, factors)) in input units
+    """
+    d = len(ranges)
+    unit = qmc.Sobol(2 * d, scramble=True, seed=seed).random(n)
+    low = np.array([r[0] for r in ranges.values()])
+    high = np.array([r[1] for r in ranges.values()])
+    scaled = qmc.scale(unit, np.tile(low, 2), np.tile(high, 2))
+    a, b = scaled[:, :d], scaled[:, d:]
+    ab = np.repeat(a[None, :, :], d, axis=0)
+    for i in range(d):
+        ab[i, :, i] = b[:, i]
+    return {"A": a, "B": b, "AB": ab}
+
+
+def _predict_chunk(features: pd.DataFrame) -> np.ndarray:
+    """model.predict on one chunk (also the process pool task)."""
+    model = cap_estimator_jobs(load_bundle(MODEL_PATH).get(MODEL_COMPONENT), 1)
+    return model.predict(features)
+
+
+def evaluate_model(
+    base: Dict,
+    samples: np.ndarray,
+    factors: List[str],
+    output: str = "annual_energy_kwh",
+    workers: int = 1,
+    chunk_rows: int = CHUNK_ROWS,
+) -> np.ndarray:
+    """
+    Model output for every sample row: base inputs with the factor columns
+    replaced, featurized in one build_features call and predicted in chunks
+    (across `workers` processes when more than one).
+    """
+    n = len(samples)
+    columns = {name: np.full(n, float(base[name])) for name in INPUT_DEFAULTS}
+    for j, name in enumerate(factors):
+        columns[name] = samples[:, j]
+    features = build_features(**columns)
+
+    chunks = [
+        features.iloc[start : start + chunk_rows] for start in range(0, n, chunk_rows)
+    ]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            predictions = np.vstack(list(executor.map(_predict_chunk, chunks)))
+    else:
+        model = cap_estimator_jobs(
+            load_bundle(MODEL_PATH).get(MODEL_COMPONENT), get_budget("serving")
+        )
+        predictions = np.vstack([model.predict(chunk) for chunk in chunks])
+
+    if output == "annual_energy_kwh":
+        return np.asarray(
+            estimate_energy(
+                predictions[:, 2],
+                columns["system_capacity_kw"],
+                columns["lat"],
+                columns["tilt"],
+                columns["azimuth"],
+                columns["panel_age"],
+                columns["days_since_cleaning"],
+            )["annual_energy_kwh"],
+            dtype=float,
+        )
+    return predictions[
+        :, ["dc_power_kw", "ac_power_kw", "hourly_energy_kwh"].index(output)
+    ]
+
+
+def sobol_indices(
+    f_a: np.ndarray, f_b: np.ndarray, f_ab: np.ndarray, seed: int = 42
+) -> Dict[str, np.ndarray]:
+    """
+    First-order and total Sobol indices from the outputs of a Saltelli
+    design (f_ab is (factors, n)), with bootstrap confidence half-widths.
+    """
+    n = len(f_a)
+    rng = np.random.default_rng(seed)
+    # Row 0 is the full sample, the rest bootstrap resamples
+    rows = np.vstack(
+        [np.arange(n), rng.integers(0, n, (BOOTSTRAP_RESAMPLES, n))]
+    )  # (resamples + 1, n)
+    a, b, ab = f_a[rows], f_b[rows], f_ab[:, rows]
+    variance = np.var(np.concatenate([a, b], axis=1), axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        first = np.mean(b * (ab - a), axis=2) / variance
+        total = 0.5 * np.mean((a - ab) ** 2, axis=2) / variance
+    return {
+        "S1": first[:, 0],
+        "S1_conf": CONFIDENCE_Z * first[:, 1:].std(axis=1),
+        "ST": total[:, 0],
+        "ST_conf": CONFIDENCE_Z * total[:, 1:].std(axis=1),
+        "variance": float(variance[0]),
+    }
+
+
+def sensitivity_analysis(
+    input_data: Dict,
+    factors: Optional[List[str]] = None,
+    ranges: Optional[Dict] = None,
+    samples: int = DEFAULT_SAMPLES,
+    output: str = "annual_energy_kwh",
+    workers: int = 1,
+    seed: int = 42,
+) -> Dict:
+    """
+    Sobol sensitivity of the power model around a frontend request.
+
+    Args:
+        input_data: Request as for predict_service (location, roof, system)
+        factors: Inputs to vary (build_features argument names)
+        ranges: Optional {factor: [low, high]} overriding the default spans
+        samples: Base sample count N; the model is evaluated N * (factors + 2)
+            times
+        output: Model output to explain, one of OUTPUTS
+        workers: Processes for model.predict (1 = in process)
+
+    Returns:
+        Dict with the indices of every factor, ranked by total index
+    """
+    factors = factors or DEFAULT_FACTORS
+    unknown = sorted(set(factors) - set(INPUT_DEFAULTS))
+    if unknown:
+        return {"success": False, "error": f"Unknown factors: {unknown}"}
+    if output not in OUTPUTS:
+        return {"success": False, "error": f"Unknown output {output}; use {OUTPUTS}"}
+    if not MODEL_PATH.exists():
+        return {
+            "success": False,
+            "error": f"Model file not found at {MODEL_PATH}. Please train the model first.",
+        }
+
+    try:
+        start = time.perf_counter()
+        base = extract_inputs(input_data)
+        bounds = factor_ranges(base, factors, ranges)
+        design = saltelli_sample(bounds, samples, seed)
+        d = len(factors)
+        stacked = np.vstack([design["A"], design["B"], design["AB"].reshape(-1, d)])
+        values = evaluate_model(base, stacked, factors, output, workers)
+        f_a, f_b = values[:samples], values[samples : 2 * samples]
+        f_ab = values[2 * samples :].reshape(d, samples)
+        indices = sobol_indices(f_a, f_b, f_ab, seed)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+
+    def number(value):
+        return round(float(value), 4) if np.isfinite(value) else None
+
+    results = {
+        name: {
+            "range": list(bounds[name]),
+            "S1": number(indices["S1"][j]),
+            "S1_conf": number(indices["S1_conf"][j]),
+            "ST": number(indices["ST"][j]),
+            "ST_conf": number(indices["ST_conf"][j]),
+        }
+        for j, name in enumerate(factors)
+    }
+    ranking = sorted(
+        factors, key=lambda name: -np.nan_to_num(indices["ST"][factors.index(name)])
+    )
+    return {
+        "success": True,
+        "output": output,
+        "base_inputs": base,
+        "output_mean": float(np.mean(np.concatenate([f_a, f_b]))),
+        "output_std": float(np.sqrt(indices["variance"])),
+        "indices": results,
+        "ranking": ranking,
+        "samples": samples,
+        "model_evaluations": len(values),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main():
+    """
+    CLI:
+      python sensitivity.py
+          Reads a predict_service request from stdin; an optional
+          "sensitivity" key holds factors, ranges, samples, output and
+          workers
+    """
+    apply_thread_budget("serving")
+    try:
+        request = json.loads(sys.stdin.read())
+        options = request.pop("sensitivity", {})
+        result = sensitivity_analysis(
+            request,
+            factors=options.get("factors"),
+            ranges=options.get("ranges"),
+            samples=int(options.get("samples", DEFAULT_SAMPLES)),
+            output=options.get("output", "annual_energy_kwh"),
+            workers=int(options.get("workers", 1)),
+        )
+        print(json.dumps(result, indent=2))
+    except json.JSONDecodeError as e:
+        print(json.dumps({"success": False, "error": f"Invalid JSON input: {str(e)}"}))
+        sys.exit(1)
+    except Exception as e:
+        print(json.dumps({"success": False, "error": str(e)}))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
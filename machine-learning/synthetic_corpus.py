@@ -0,0 +1,399 @@
+"""
+Synthetic Training Corpus
+Generates labeled hourly power data for many sites and system configurations
+with the physics of main.prepare_ml_training_data, so that location,
+orientation and capacity vary in the training data as they do in serving
+requests. Sites are generated in parallel shards; each shard is a NumPy .npz
+file of float32 columns, listed in a corpus.json manifest.
+
+The corpus directory can be passed to train_and_finalize in place of a CSV:
+    python synthetic_corpus.py [output_dir] [n_sites]
+    python train_and_finalize.py dataForML/synthetic_corpus
+"""
+
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from pvlib import clearsky, irradiance, solarposition
+
+from main import simulate_pv_system
+from thread_budget import get_budget
+
+CORPUS_DIR = Path(__file__).parent / "dataForML" / "synthetic_corpus"
+MANIFEST_NAME = "corpus.json"
+
+DEFAULT_SITES = 256
+CONFIGS_PER_SITE = 4
+SITES_PER_SHARD = 8
+CORPUS_YEAR = 2025
+SEED = 42
+
+SITE_RANGES = {"latitude": (-55.0, 60.0), "longitude": (-180.0, 180.0)}
+CONFIG_RANGES = {
+    "tilt": (0.0, 60.0),
+    "azimuth": (0.0, 360.0),
+    "system_capacity_kw": (1.0, 20.0),
+}
+
+# Same columns and order as the prepared CSV written by main.py; "datetime" is
+# stored as epoch seconds of local standard time, like the NASA POWER exports
+COLUMNS = [
+    "datetime",
+    "YEAR",
+    "MO",
+    "DY",
+    "HR",
+    "latitude",
+    "longitude",
+    "tilt",
+    "azimuth",
+    "system_capacity_kw",
+    "ghi",
+    "dni",
+    "dhi",
+    "temp_air",
+    "wind_speed",
+    "humidity",
+    "sun_elevation",
+    "sun_azimuth",
+    "sun_zenith",
+    "poa_global",
+    "poa_direct",
+    "poa_diffuse",
+    "poa_sky_diffuse",
+    "poa_ground_diffuse",
+    "cell_temperature",
+    "dc_power_kw",
+    "ac_power_kw",
+    "energy_kwh",
+    "performance_ratio",
+]
+# Every other column is stored as float32
+COLUMN_DTYPES = {
+    "datetime": np.int64,
+    "YEAR": np.int16,
+    "MO": np.int8,
+    "DY": np.int8,
+    "HR": np.int8,
+}
+
+
+def solar_position(latitude: np.ndarray, longitude: np.ndarray, times: pd.Index):
+    """
+    Analytical solar position for every site and hour.
+
+    Args:
+        latitude, longitude: Site coordinates of shape (sites, 1), in degrees
+        times: Hourly UTC timestamps
+
+    Returns:
+        (zenith, azimuth) in degrees, each of shape (sites, hours)
+    """
+    doy = times.dayofyear.to_numpy()
+    declination = solarposition.declination_spencer71(doy)
+    equation_of_time = solarposition.equation_of_time_spencer71(doy)  # Minutes
+    utc_hours = times.hour.to_numpy() + times.minute.to_numpy() / 60
+    hour_angle = np.radians((utc_hours - 12) * 15 + longitude + equation_of_time / 4)
+
+    lat = np.radians(latitude)
+    zenith = solarposition.solar_zenith_analytical(lat, hour_angle, declination)
+    azimuth = solarposition.solar_azimuth_analytical(
+        lat, hour_angle, declination, zenith
+    )
+    return np.degrees(zenith), np.degrees(azimuth)
+
+
+def synthetic_weather(
+    latitude: np.ndarray,
+    local_hours: np.ndarray,
+    times: pd.Index,
+    zenith: np.ndarray,
+    rng: np.random.Generator,
+) -> Dict[str, np.ndarray]:
+    """
+    Hourly weather for each site: clear-sky irradiance scaled by a random daily
+    cloudiness, split into beam and diffuse with the Erbs model, plus seasonal
+    and diurnal temperature, Weibull wind and specific humidity (g/kg, like
+    QV2M).
+
+    Args:
+        latitude: Site latitudes of shape (sites, 1)
+        local_hours: Local standard time hour of day, shape (sites, hours)
+        times: Hourly UTC timestamps
+        zenith: Solar zenith in degrees, shape (sites, hours)
+    """
+    n_sites, n_hours = zenith.shape
+    doy = times.dayofyear.to_numpy()
+    abs_lat = np.abs(latitude)
+
+    # Clear-sky irradiance with per-site aerosol and water vapour
+    elevation = np.clip(90.0 - zenith, 0.0, None)
+    clear = clearsky.simplified_solis(
+        elevation,
+        aod700=rng.uniform(0.05, 0.3, (n_sites, 1)),
+        precipitable_water=rng.uniform(0.5, 4.0, (n_sites, 1)),
+    )
+    ghi_clear = np.where(zenith < 90.0, np.nan_to_num(clear["ghi"]), 0.0)
+
+    # Clearness index: one draw per site-day around a site climatology
+    clear_mean = rng.uniform(0.45, 0.85, (n_sites, 1))
+    daily = rng.beta(8 * clear_mean, 8 * (1 - clear_mean), (n_sites, 366))
+    clearness = daily[:, doy - 1] + rng.normal(0.0, 0.08, (n_sites, n_hours))
+    clearness = np.clip(clearness, 0.05, 1.05)
+
+    ghi = ghi_clear * clearness
+    split = irradiance.erbs(ghi, zenith, doy)
+    dni = np.nan_to_num(split["dni"])
+    dhi = np.nan_to_num(split["dhi"])
+
+    # Warmer, less seasonal climates near the equator
+    mean_temp = 27.0 - 0.45 * np.clip(abs_lat - 15.0, 0.0, None)
+    mean_temp = mean_temp + rng.normal(0.0, 2.0, (n_sites, 1))
+    peak_doy = np.where(latitude >= 0, 200, 17)
+    seasonal = 0.3 * abs_lat * np.cos(2 * np.pi * (doy - peak_doy) / 365)
+    diurnal = (3.0 + 5.0 * clearness) * np.cos(2 * np.pi * (local_hours - 15) / 24)
+    temp_air = mean_temp + seasonal + diurnal + rng.normal(0.0, 1.5, (n_sites, n_hours))
+
+    wind_speed = rng.weibull(2.0, (n_sites, n_hours)) * rng.uniform(
+        2.0, 6.0, (n_sites, 1)
+    )
+
+    relative_humidity = np.clip(
+        rng.uniform(0.4, 0.85, (n_sites, 1)) + rng.normal(0.0, 0.1, (n_sites, n_hours)),
+        0.1,
+        1.0,
+    )
+    saturation_q = 3.78 * np.exp(17.27 * temp_air / (temp_air + 237.3))  # g/kg
+    humidity = relative_humidity * saturation_q
+
+    return {
+        "ghi": ghi,
+        "dni": dni,
+        "dhi": dhi,
+        "temp_air": temp_air,
+        "wind_speed": wind_speed,
+        "humidity": humidity,
+    }
+
+
+def generate_shard(
+    shard_index: int,
+    sites: Dict[str, List[float]],
+    configs: Dict[str, List[List[float]]],
+    year: int,
+    seed: np.random.SeedSequence,
+    output_dir: str,
+) -> Dict:
+    """
+    Simulate one shard of sites and write it to output_dir.
+
+    Weather is generated once per site with shape (sites, 1, hours) and
+    broadcast against the configurations of shape (sites, configs, 1).
+    """
+    rng = np.random.default_rng(seed)
+    latitude = np.array(sites["latitude"])[:, None]
+    longitude = np.array(sites["longitude"])[:, None]
+
+    times = pd.date_range(
+        f"{year}-01-01", f"{year + 1}-01-01", freq="h", inclusive="left", tz="UTC"
+    )
+    # Local standard time offset of each site, in whole hours
+    offsets = np.round(longitude / 15).astype(np.int64)
+    local = times.tz_localize(None).to_numpy()[None, :] + offsets * np.timedelta64(
+        1, "h"
+    )
+    local_index = pd.DatetimeIndex(local.ravel())
+    local_hours = local_index.hour.to_numpy().reshape(local.shape)
+
+    zenith, sun_azimuth = solar_position(latitude, longitude, times)
+    weather = synthetic_weather(latitude, local_hours, times, zenith, rng)
+
+    tilt = np.array(configs["tilt"])[:, :, None]
+    azimuth = np.array(configs["azimuth"])[:, :, None]
+    capacity = np.array(configs["system_capacity_kw"])[:, :, None]
+
+    site_axis = {name: values[:, None, :] for name, values in weather.items()}
+    outputs = simulate_pv_system(
+        ghi=site_axis["ghi"],
+        dni=site_axis["dni"],
+        dhi=site_axis["dhi"],
+        temp_air=site_axis["temp_air"],
+        wind_speed=site_axis["wind_speed"],
+        sun_zenith=zenith[:, None, :],
+        sun_azimuth=sun_azimuth[:, None, :],
+        tilt=tilt,
+        azimuth=azimuth,
+        system_capacity_kw=capacity,
+    )
+
+    per_hour = {
+        **site_axis,
+        "datetime": local.astype("datetime64[s]").astype(np.int64)[:, None, :],
+        "YEAR": local_index.year.to_numpy().reshape(local.shape)[:, None, :],
+        "MO": local_index.month.to_numpy().reshape(local.shape)[:, None, :],
+        "DY": local_index.day.to_numpy().reshape(local.shape)[:, None, :],
+        "HR": local_hours[:, None, :],
+        "latitude": latitude[:, :, None],
+        "longitude": longitude[:, :, None],
+        "tilt": tilt,
+        "azimuth": azimuth,
+        "system_capacity_kw": capacity,
+        "sun_elevation": 90.0 - zenith[:, None, :],
+        "sun_azimuth": sun_azimuth[:, None, :],
+        "sun_zenith": zenith[:, None, :],
+        **outputs,
+    }
+
+    # Daylight rows only, like the ALLSKY_SFC_SW_DWN > 0 filter in main.py
+    shape = np.broadcast_shapes(tilt.shape, zenith[:, None, :].shape)
+    keep = np.broadcast_to(weather["ghi"][:, None, :] > 0, shape)
+    columns = {
+        name: np.broadcast_to(per_hour[name], shape)[keep].astype(
+            COLUMN_DTYPES.get(name, np.float32)
+        )
+        for name in COLUMNS
+    }
+
+    file_name = f"shard_{shard_index:05d}.npz"
+    np.savez(Path(output_dir) / file_name, **columns)
+    return {
+        "file": file_name,
+        "rows": int(keep.sum()),
+        "sites": len(sites["latitude"]),
+    }
+
+
+def build_corpus(
+    output_dir: Path = CORPUS_DIR,
+    n_sites: int = DEFAULT_SITES,
+    year: int = CORPUS_YEAR,
+    seed: int = SEED,
+    workers: Optional[int] = None,
+) -> Dict:
+    """
+    Generate a corpus of n_sites sites x CONFIGS_PER_SITE configurations and
+    write its shards and manifest to output_dir.
+
+    Returns:
+        The corpus manifest
+    """
+    start = time.time()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    sites = {
+        name: rng.uniform(low, high, n_sites)
+        for name, (low, high) in SITE_RANGES.items()
+    }
+    configs = {
+        name: rng.uniform(low, high, (n_sites, CONFIGS_PER_SITE))
+        for name, (low, high) in CONFIG_RANGES.items()
+    }
+
+    shard_starts = range(0, n_sites, SITES_PER_SHARD)
+    shard_seeds = np.random.SeedSequence(seed).spawn(len(shard_starts))
+    workers = workers or get_budget("training")
+    print(
+        f"Generating {n_sites} sites x {CONFIGS_PER_SITE} configurations "
+        f"in {len(shard_starts)} shards on {workers} workers..."
+    )
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                generate_shard,
+                index,
+                {
+                    name: values[lo : lo + SITES_PER_SHARD].tolist()
+                    for name, values in sites.items()
+                },
+                {
+                    name: values[lo : lo + SITES_PER_SHARD].tolist()
+                    for name, values in configs.items()
+                },
+                year,
+                shard_seeds[index],
+                str(output_dir),
+            )
+            for index, lo in enumerate(shard_starts)
+        ]
+        shards = [future.result() for future in futures]
+
+    manifest = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "year": year,
+        "seed": seed,
+        "n_sites": n_sites,
+        "configs_per_site": CONFIGS_PER_SITE,
+        "site_ranges": SITE_RANGES,
+        "config_ranges": CONFIG_RANGES,
+        "columns": COLUMNS,
+        "rows": sum(shard["rows"] for shard in shards),
+        "shards": shards,
+    }
+    with open(output_dir / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    size_mb = sum((output_dir / s["file"]).stat().st_size for s in shards) / 1e6
+    print(
+        f"Wrote {manifest['rows']:,} rows ({size_mb:.1f} MB) to {output_dir} "
+        f"in {time.time() - start:.1f}s"
+    )
+    return manifest
+
+
+def iter_corpus(
+    path: Path, columns: Optional[List[str]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield a corpus one shard at a time, as DataFrames shaped like the prepared
+    CSV, so only one shard is in memory at once.
+
+    Args:
+        path: Corpus directory (or its corpus.json manifest)
+        columns: Optional subset of columns to load
+    """
+    path = Path(path)
+    manifest_path = path / MANIFEST_NAME if path.is_dir() else path
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    columns = columns or manifest["columns"]
+    for shard in manifest["shards"]:
+        with np.load(manifest_path.parent / shard["file"]) as data:
+            df = pd.DataFrame({name: data[name] for name in columns})
+        if "datetime" in df.columns:
+            df["datetime"] = pd.to_datetime(df["datetime"], unit="s", utc=True)
+        yield df
+
+
+def load_corpus(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load a corpus directory into a DataFrame shaped like the prepared CSV.
+
+    Args:
+        path: Corpus directory (or its corpus.json manifest)
+        columns: Optional subset of columns to load
+    """
+    return pd.concat(list(iter_corpus(path, columns)), ignore_index=True)
+
+
+def main():
+    """
+    CLI: python synthetic_corpus.py [output_dir] [n_sites]
+    """
+    output_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else CORPUS_DIR
+    n_sites = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_SITES
+    build_corpus(output_dir, n_sites)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Temporal Anomaly Features
+Lag, delta and rolling mean/std features over each panel's recent readings,
+so a sudden drop that is still a plausible absolute value stands out.
+
+Features are computed incrementally from fixed-size ring buffers per panel
+(O(1) per reading and window, via running sums). Training runs the same code
+over the whole history in time order, so served and trained features agree.
+"""
+
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+MODELS_DIR = Path(__file__).parent / "models"
+TEMPORAL_STATE_PATH = MODELS_DIR / "temporal_state.npz"
+
+TEMPORAL_BASE_FEATURES = ["ghi", "poa_global"]
+TEMPORAL_WINDOWS = (3, 6)  # Readings per rolling window
+DEFAULT_PANEL = "default"
+
+_INITIAL_CAPACITY = 64
+
+
+def temporal_feature_names(
+    base_features: Sequence[str], windows: Sequence[int] = TEMPORAL_WINDOWS
+) -> List[str]:
+    """Names of the derived columns, in the order they are produced."""
+    names = []
+    for feature in base_features:
+        names += [f"{feature}_lag1", f"{feature}_delta1"]
+        for window in windows:
+            names += [f"{feature}_mean{window}", f"{feature}_std{window}"]
+    return names
+
+
+def panel_keys(df: pd.DataFrame) -> np.ndarray:
+    """
+    Panel of every row: its "panel_id", else its site and orientation, else
+    one panel for all rows.
+    """
+    if "panel_id" in df.columns:
+        return df["panel_id"].astype(str).to_numpy()
+
+    from anomaly_partitions import site_keys
+
+    sites = site_keys(df)
+    if sites is None:
+        return np.full(len(df), DEFAULT_PANEL)
+    if {"tilt", "azimuth"}.issubset(df.columns):
+        orientation = [
+            f"/{tilt:g}/{azimuth:g}"
+            for tilt, azimuth in zip(df["tilt"].tolist(), df["azimuth"].tolist())
+        ]
+        return np.char.add(sites.astype(str), np.array(orientation, dtype=str))
+    return sites
+
+
+class TemporalFeatureStore:
+    """Per-panel ring buffers of recent readings with running window sums."""
+
+    def __init__(
+        self,
+        base_features: Sequence[str],
+        windows: Sequence[int] = TEMPORAL_WINDOWS,
+    ):
+        self.base_features = list(base_features)
+        self.windows = [int(w) for w in windows]
+        self.depth = max(self.windows)
+        self.panel_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        n_features, n_windows = len(self.base_features), len(self.windows)
+        self.count = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self.position = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self.buffer = np.zeros((_INITIAL_CAPACITY, self.depth, n_features))
+        self.sums = np.zeros((_INITIAL_CAPACITY, n_windows, n_features))
+        self.squares = np.zeros((_INITIAL_CAPACITY, n_windows, n_features))
+
+    @property
+    def feature_names(self) -> List[str]:
+        return temporal_feature_names(self.base_features, self.windows)
+
+    def _grow(self, needed: int):
+        capacity = len(self.count)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        for name in ("count", "position", "buffer", "sums", "squares"):
+            old = getattr(self, name)
+            new = np.zeros((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:capacity] = old
+            setattr(self, name, new)
+
+    def rows(self, panel_ids: Sequence) -> np.ndarray:
+        """Store row of each panel id, adding rows for unseen panels."""
+        rows = np.empty(len(panel_ids), dtype=np.int64)
+        for i, panel_id in enumerate(panel_ids):
+            key = str(panel_id)
+            row = self.index.get(key)
+            if row is None:
+                row = len(self.panel_ids)
+                self.index[key] = row
+                self.panel_ids.append(key)
+            rows[i] = row
+        self._grow(len(self.panel_ids))
+        return rows
+
+    def _push(self, panel: np.ndarray, x: np.ndarray) -> np.ndarray:
+        """
+        Append one reading to each of the given (distinct) panels and return
+        their features, laid out like feature_names.
+
+        A reading with a non-finite value is not appended (it could never be
+        subtracted out of the running sums again): its features come from
+        the panel's earlier readings, and its delta is NaN.
+        """
+        n_rows, n_features = x.shape
+        count = self.count[panel]
+        position = self.position[panel]
+        valid = np.isfinite(x).all(axis=1)
+        seen = count[:, None] > 0
+        previous = np.where(
+            seen, self.buffer[panel, (position - 1) % self.depth], np.nan
+        )
+        previous = np.where(~seen & valid[:, None], x, previous)
+
+        columns = [previous, x - previous]
+        for w, window in enumerate(self.windows):
+            # The reading leaving the window, if the window is already full
+            leaving = self.buffer[panel, (position - window) % self.depth]
+            leaving = np.where(count[:, None] >= window, leaving, 0.0)
+            sums = np.where(
+                valid[:, None], self.sums[panel, w] + x - leaving, self.sums[panel, w]
+            )
+            squares = np.where(
+                valid[:, None],
+                self.squares[panel, w] + x * x - leaving * leaving,
+                self.squares[panel, w],
+            )
+            self.sums[panel, w] = sums
+            self.squares[panel, w] = squares
+
+            n = np.minimum(count + valid, window)[:, None]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = sums / n
+                std = np.sqrt(np.maximum(squares / n - mean * mean, 0.0))
+            columns += [mean, std]
+
+        panel, position = panel[valid], position[valid]
+        self.buffer[panel, position] = x[valid]
+        self.position[panel] = (position + 1) % self.depth
+        self.count[panel] += 1
+
+        # columns is [kind][row, feature]; feature_names is feature-major
+        return np.stack(columns, axis=2).reshape(n_rows, -1)
+
+    def transform(self, panel_ids: Sequence, X: np.ndarray) -> pd.DataFrame:
+        """
+        Fold readings (in time order within each panel) into the buffers and
+        return each reading's temporal features.
+
+        Readings are applied in rounds (each panel's first reading, then its
+        second...), so a batch costs one vectorized step per reading of its
+        busiest panel.
+        """
+        X = np.asarray(X, dtype=float)
+        rows = self.rows(panel_ids)
+        out = np.empty((len(rows), len(self.feature_names)))
+        if len(rows):
+            order = np.argsort(rows, kind="stable")
+            sorted_rows = rows[order]
+            starts = np.r_[0, np.flatnonzero(np.diff(sorted_rows)) + 1]
+            rank = np.empty(len(rows), dtype=np.int64)
+            rank[order] = np.arange(len(rows)) - np.repeat(
+                starts, np.diff(np.r_[starts, len(rows)])
+            )
+            for r in range(rank.max() + 1):
+                batch = np.flatnonzero(rank == r)
+                out[batch] = self._push(rows[batch], X[batch])
+        return pd.DataFrame(out, columns=self.feature_names)
+
+    def save(self, path: Path = TEMPORAL_STATE_PATH):
+        """Write the store atomically."""
+        n = len(self.panel_ids)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            base_features=np.array(self.base_features),
+            windows=np.array(self.windows),
+            panel_ids=np.array(self.panel_ids, dtype=str),
+            count=self.count[:n],
+            position=self.position[:n],
+            buffer=self.buffer[:n],
+            sums=self.sums[:n],
+            squares=self.squares[:n],
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(
+        cls,
+        base_features: Sequence[str],
+        windows: Sequence[int] = TEMPORAL_WINDOWS,
+        path: Path = TEMPORAL_STATE_PATH,
+    ) -> "TemporalFeatureStore":
+        """
+        Load the saved buffers, or start empty ones if there are none or they
+        were built for different features or windows.
+        """
+        path = Path(path)
+        if not path.exists():
+            return cls(base_features, windows)
+        with np.load(path) as data:
+            if list(data["base_features"]) != list(base_features) or list(
+                data["windows"]
+            ) != [int(w) for w in windows]:
+                print(
+                    f"Temporal buffers in {path} were built for other features "
+                    f"or windows; starting fresh",
+                    file=sys.stderr,
+                )
+                return cls(base_features, windows)
+            store = cls(base_features, windows)
+            panel_ids = [str(p) for p in data["panel_ids"]]
+            store.rows(panel_ids)
+            n = len(panel_ids)
+            for name in ("count", "position", "buffer", "sums", "squares"):
+                getattr(store, name)[:n] = data[name]
+        # Buffers saved before non-finite readings were skipped can hold
+        # NaN sums that never recover; those panels start over
+        corrupt = ~(
+            np.isfinite(store.sums[:n]).all(axis=(1, 2))
+            & np.isfinite(store.squares[:n]).all(axis=(1, 2))
+        )
+        for name in ("count", "position", "buffer", "sums", "squares"):
+            getattr(store, name)[:n][corrupt] = 0
+        return store
+
+
+def add_temporal_features(
+    df: pd.DataFrame,
+    base_features: Sequence[str],
+    windows: Sequence[int] = TEMPORAL_WINDOWS,
+    store: Optional[TemporalFeatureStore] = None,
+) -> pd.DataFrame:
+    """
+    df with its temporal feature columns added. Rows must be in time order
+    within each panel. Without a store (training) every panel starts empty.
+    """
+    if store is None:
+        store = TemporalFeatureStore(base_features, windows)
+    features = store.transform(
+        panel_keys(df), df[list(base_features)].to_numpy(dtype=float)
+    )
+    features.index = df.index
+    return pd.concat([df, features], axis=1)
@@ -0,0 +1,46 @@
+import copy
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from boosting_stages import ResidualStagesRegressor
+from train_and_finalize import append_boosting_iterations
+
+
+def _data(seed, n=400):
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(-1, 1, size=(n, 3))
+    y = np.sin(3 * X[:, 0]) + X[:, 1] ** 2 + 0.1 * rng.standard_normal(n)
+    return X, y
+
+
+def test_append_keeps_the_fitted_model_and_adds_a_residual_stage():
+    X_old, y_old = _data(0)
+    X_new, y_new = _data(1)
+    # The new window is shifted, so the extra iterations have something to fit
+    y_new = y_new + 0.5
+    model = HistGradientBoostingRegressor(max_iter=30, random_state=0)
+    model.fit(X_old, y_old)
+    before = model.predict(X_new)
+    original = copy.deepcopy(model)
+
+    staged = append_boosting_iterations(model, X_new, y_new, extra_iterations=20)
+
+    # The fitted estimator is not mutated
+    np.testing.assert_array_equal(model.predict(X_new), before)
+    assert model.n_iter_ == original.n_iter_
+
+    assert isinstance(staged, ResidualStagesRegressor)
+    assert staged.n_stages == 1
+    np.testing.assert_allclose(
+        staged.predict(X_new), before + staged.estimators_[1].predict(X_new)
+    )
+    error_before = np.mean(np.abs(before - y_new))
+    assert np.mean(np.abs(staged.predict(X_new) - y_new)) < error_before
+
+    # A second update adds a stage without changing the first update's model
+    after_first = staged.predict(X_new)
+    again = append_boosting_iterations(staged, X_new, y_new, extra_iterations=10)
+    assert again.n_stages == 2
+    assert staged.n_stages == 1
+    np.testing.assert_array_equal(staged.predict(X_new), after_first)
@@ -0,0 +1,38 @@
+import numpy as np
+
+from temporal_features import TemporalFeatureStore
+
+
+def test_features_recover_after_a_nan_reading(tmp_path):
+    store = TemporalFeatureStore(["ghi"], windows=(3, 6))
+    readings = [100.0, 110.0, np.nan] + [120.0 + i for i in range(8)]
+    features = store.transform(["p1"] * len(readings), np.array(readings)[:, None])
+
+    # The NaN reading has no delta but keeps its predecessors' statistics
+    assert np.isnan(features["ghi_delta1"].iloc[2])
+    assert features["ghi_lag1"].iloc[2] == 110.0
+    assert features["ghi_mean3"].iloc[2] == 105.0
+
+    # Later windows only hold finite readings
+    clean = [r for r in readings if np.isfinite(r)]
+    last = features.iloc[-1]
+    np.testing.assert_allclose(last["ghi_mean3"], np.mean(clean[-3:]))
+    np.testing.assert_allclose(last["ghi_std6"], np.std(clean[-6:]), atol=1e-6)
+    assert features.iloc[3:].notna().all().all()
+
+    # And survive a save/load round trip
+    path = tmp_path / "state.npz"
+    store.save(path)
+    loaded = TemporalFeatureStore.load(["ghi"], (3, 6), path)
+    after = loaded.transform(["p1"], np.array([[130.0]]))
+    np.testing.assert_allclose(after["ghi_mean3"].iloc[0], np.mean(clean[-2:] + [130]))
+
+
+def test_nan_first_reading_leaves_the_panel_empty():
+    store = TemporalFeatureStore(["ghi"], windows=(3,))
+    first = store.transform(["p1"], np.array([[np.nan]]))
+    assert first.isna().all().all()
+    second = store.transform(["p1"], np.array([[50.0]]))
+    assert second["ghi_lag1"].iloc[0] == 50.0
+    assert second["ghi_mean3"].iloc[0] == 50.0
+    assert second["ghi_std3"].iloc[0] == 0.0
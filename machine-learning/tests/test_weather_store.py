@@ -0,0 +1,42 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from weather_store import DATA_DIR, add_exports, default_exports, load_weather_store
+
+
+def _export_copy(tmp_path: Path, name: str) -> Path:
+    source = default_exports(DATA_DIR)[0]
+    target = tmp_path / name
+    shutil.copy(source, target)
+    return target
+
+
+def test_incremental_builds(tmp_path):
+    store_dir = tmp_path / "store"
+    first = _export_copy(tmp_path, "first.csv")
+    second = _export_copy(tmp_path, "second.csv")
+    third = _export_copy(tmp_path, "third.csv")
+
+    result = add_exports([first], store_dir, locations={str(first): (40.79, -73.95)})
+    assert len(result["cells_added"]) == 1
+    climate = load_weather_store(store_dir).climate(40.79, -73.95).copy()
+
+    # A new site in a store that already has cells, located by the override
+    result = add_exports([second], store_dir, locations={str(second): (12.9, 77.6)})
+    assert len(result["cells_added"]) == 1
+    assert result["cells"] == 2
+    store = load_weather_store(store_dir)
+    np.testing.assert_allclose(store.locations[1], [12.9, 77.6])
+
+    # The same data again for the first site keeps its hourly means
+    result = add_exports([third], store_dir, locations={str(third): (40.79, -73.95)})
+    assert result["cells_added"] == []
+    assert len(result["cells_updated"]) == 1
+    np.testing.assert_allclose(
+        load_weather_store(store_dir).climate(40.79, -73.95), climate, rtol=1e-6
+    )
+
+    result = add_exports([first], store_dir)
+    assert result["skipped_exports"] == ["first.csv"]
@@ -0,0 +1,173 @@
+"""
+CPU Thread Budget
+Single configuration point for how many threads the ML package may use, with
+separate budgets for serving and training. The budget caps joblib (n_jobs),
+OpenMP (HistGradientBoosting) and BLAS thread pools.
+
+Configuration, highest priority first:
+  - SOLAR_ML_SERVING_THREADS / SOLAR_ML_TRAINING_THREADS environment variables
+  - The "threads" section of the JSON file named by SOLAR_ML_CONFIG (default:
+    ml_config.json next to this module), e.g. {"threads": {"serving": 2}}
+  - Defaults: 1 thread for serving, every available core for training
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROLES = ("serving", "training")
+ROLE_ENV_VARS = {
+    "serving": "SOLAR_ML_SERVING_THREADS",
+    "training": "SOLAR_ML_TRAINING_THREADS",
+}
+DEFAULT_BUDGET = {"serving": 1, "training": None}  # None = all available cores
+CONFIG_PATH = Path(
+    os.environ.get("SOLAR_ML_CONFIG", Path(__file__).parent / "ml_config.json")
+)
+
+# Native thread pools that would otherwise each claim every core
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "LOKY_MAX_CPU_COUNT",  # joblib's n_jobs=-1
+]
+
+_limiter = None
+
+
+def available_cores() -> List[int]:
+    """CPU ids this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _config_budget(role: str) -> Optional[int]:
+    if not CONFIG_PATH.exists():
+        return None
+    with open(CONFIG_PATH) as f:
+        return json.load(f).get("threads", {}).get(role)
+
+
+def get_budget(role: str) -> int:
+    """Number of threads `role` ("serving" or "training") may use."""
+    if role not in ROLES:
+        raise ValueError(f"Unknown thread budget role: {role}. Use one of {ROLES}")
+
+    value = os.environ.get(ROLE_ENV_VARS[role])
+    if value is None:
+        value = _config_budget(role)
+    if value is None:
+        value = DEFAULT_BUDGET[role]
+    if value is None:
+        return len(available_cores())
+
+    try:
+        budget = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {role} thread budget: {value!r}")
+    if budget < 1:
+        raise ValueError(f"{role} thread budget must be at least 1, got {budget}")
+    return min(budget, len(available_cores()))
+
+
+def apply_thread_budget(
+    role: str, n_threads: Optional[int] = None, cores: Optional[List[int]] = None
+) -> int:
+    """
+    Cap every thread pool in this process (and its children) to the budget.
+
+    Args:
+        role: "serving" or "training"
+        n_threads: Explicit budget overriding the configured one; it is exported
+            so later get_budget(role) calls in this process agree
+        cores: Optional CPU ids to pin this process to
+
+    Returns:
+        The applied number of threads
+    """
+    global _limiter
+
+    if n_threads is None:
+        n_threads = get_budget(role)
+    os.environ[ROLE_ENV_VARS[role]] = str(n_threads)
+
+    if cores is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    # Picked up by native libraries loaded from now on and by child processes
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n_threads)
+
+    # Libraries already loaded (numpy's BLAS, sklearn's OpenMP) are capped live
+    if "numpy" in sys.modules or "sklearn" in sys.modules:
+        from threadpoolctl import threadpool_limits
+
+        _limiter = threadpool_limits(limits=n_threads)
+
+    return n_threads
+
+
+def cap_estimator_jobs(estimator, n_jobs: int):
+    """
+    Set n_jobs on a fitted estimator and every estimator nested inside it.
+
+    Pickled models keep the n_jobs they were trained with (often -1), which
+    would otherwise claim every core at predict time.
+    """
+    if hasattr(estimator, "n_jobs"):
+        estimator.n_jobs = n_jobs
+    for attr in ("estimators_", "estimator", "steps"):
+        nested = getattr(estimator, attr, None)
+        if nested is None:
+            continue
+        for item in nested if isinstance(nested, list) else [nested]:
+            # Pipeline steps are (name, estimator) tuples
+            cap_estimator_jobs(item[1] if isinstance(item, tuple) else item, n_jobs)
+    return estimator
+
+
+def effective_thread_counts() -> Dict:
+    """Report the configured budgets and the live size of every thread pool."""
+    import joblib
+    from threadpoolctl import threadpool_info
+
+    return {
+        "budgets": {role: get_budget(role) for role in ROLES},
+        "available_cores": len(available_cores()),
+        "joblib_cpu_count": joblib.cpu_count(),
+        "env": {var: os.environ.get(var) for var in THREAD_ENV_VARS},
+        "threadpools": [
+            {
+                "user_api": pool["user_api"],
+                "internal_api": pool["internal_api"],
+                "num_threads": pool["num_threads"],
+                "filepath": pool["filepath"],
+            }
+            for pool in threadpool_info()
+        ],
+    }
+
+
+def main():
+    """
+    CLI: python thread_budget.py [serving|training]
+    Applies the role's budget, loads numpy/sklearn and prints the effective
+    thread counts.
+    """
+    role = sys.argv[1] if len(sys.argv) > 1 else "serving"
+    apply_thread_budget(role)
+
+    import numpy  # noqa: F401
+    import sklearn.ensemble  # noqa: F401
+
+    print(json.dumps({"role": role, **effective_thread_counts()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
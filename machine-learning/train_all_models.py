@@ -5,15 +5,29 @@ Trains power prediction, anomaly detection, and maintenance prediction models.
 
 import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
-
-print("=" * 70)
-print("SOLAR PANEL EFFICIENCY OPTIMIZER - ML TRAINING PIPELINE")
-print("=" * 70)
+from typing import Dict, List, Tuple
 
 # Add current directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
+import resource_profile
+from resource_profile import stage
+from thread_budget import apply_thread_budget, available_cores, get_budget
+
+MODELS_DIR = Path(__file__).parent / "models"
+MODEL_FILES = [
+    "power.bundle",
+    "anomaly.bundle",
+    "maintenance.bundle",
+]
+
+# Relative share of cores per stage (the power stage fits three multi-output models)
+STAGE_CORE_WEIGHTS = {"power": 2, "anomaly": 1, "maintenance": 1}
+
 
 def train_power_models():
     """Train power prediction models (hist_gradient_boosting, random_forest, linear_regression)"""
@@ -50,9 +64,13 @@ def train_maintenance_model():
     print("\n[3/3] Training Maintenance Prediction Model...")
     print("-" * 70)
     try:
-        from maintenance_predictor import train_maintenance_predictor
+        from maintenance_predictor import (
+            compile_maintenance_grid,
+            train_maintenance_predictor,
+        )
 
         train_maintenance_predictor()
+        compile_maintenance_grid()
         print("✓ Maintenance prediction model trained successfully")
         return True
     except Exception as e:
@@ -66,23 +84,9 @@ def verify_models():
     print("VERIFICATION - Checking Model Files")
     print("=" * 70)
 
-    models_dir = Path(__file__).parent / "models"
-
-    required_files = [
-        "best_model_hist_gradient_boosting.pkl",
-        "best_model_random_forest.pkl",
-        "best_model_linear_regression.pkl",
-        "anomaly_detector.pkl",
-        "anomaly_scaler.pkl",
-        "anomaly_features.pkl",
-        "maintenance_predictor.pkl",
-        "maintenance_scaler.pkl",
-        "maintenance_features.pkl",
-    ]
-
     all_present = True
-    for file_name in required_files:
-        file_path = models_dir / file_name
+    for file_name in MODEL_FILES:
+        file_path = MODELS_DIR / file_name
         if file_path.exists():
             size_kb = file_path.stat().st_size / 1024
             print(f"✓ {file_name:<45} ({size_kb:.1f} KB)")
@@ -93,22 +97,115 @@ def verify_models():
     return all_present
 
 
-def main():
+STAGES = {
+    "power": ("power_models", train_power_models),
+    "anomaly": ("anomaly_model", train_anomaly_model),
+    "maintenance": ("maintenance_model", train_maintenance_model),
+}
+
+
+def assign_cores(cores: List[int], weights: Dict[str, int]) -> Dict[str, List[int]]:
+    """Split cores into disjoint, weighted shares with at least one core each."""
+    if len(cores) < len(weights):
+        raise ValueError(f"Need at least {len(weights)} cores, got {len(cores)}")
+
+    total = sum(weights.values())
+    assignment = {}
+    start = 0
+    names = list(weights)
+    for i, name in enumerate(names):
+        remaining_stages = len(names) - i - 1
+        if remaining_stages == 0:
+            count = len(cores) - start
+        else:
+            count = int(len(cores) * weights[name] / total)
+            count = max(1, min(count, len(cores) - start - remaining_stages))
+        assignment[name] = cores[start : start + count]
+        start += count
+    return assignment
+
+
+def _run_stage_worker(name: str, cores: List[int]) -> Tuple[bool, List[Dict]]:
+    """Run one training stage in a worker process with its own core share."""
+    apply_thread_budget("training", n_threads=len(cores), cores=cores)
+    print(f"[{name}] running on {len(cores)} core(s): {cores}", flush=True)
+    with stage(name):
+        success = STAGES[name][1]()
+    return success, resource_profile.collect()
+
+
+def run_stages_parallel(cores: List[int]) -> Tuple[Dict[str, bool], List[Dict]]:
+    """
+    Run every stage concurrently in its own process.
+
+    Each stage gets a separate single-worker pool so a crashed worker only fails
+    its own stage.
+    """
+    assignment = assign_cores(cores, STAGE_CORE_WEIGHTS)
+    context = get_context("spawn")
+    executors = {}
+    futures = {}
+    for name, stage_cores in assignment.items():
+        executors[name] = ProcessPoolExecutor(max_workers=1, mp_context=context)
+        futures[name] = executors[name].submit(_run_stage_worker, name, stage_cores)
+
+    results = {}
+    stages = []
+    for name, future in futures.items():
+        result_key = STAGES[name][0]
+        try:
+            results[result_key], stage_profile = future.result()
+            stages.extend(stage_profile)
+        except Exception as e:
+            print(f"✗ {name} stage worker failed: {e}")
+            results[result_key] = False
+        finally:
+            executors[name].shutdown()
+    return results, stages
+
+
+def run_stages_sequential() -> Tuple[Dict[str, bool], List[Dict]]:
+    """Run every stage one after another in this process."""
+    results = {}
+    for name, (result_key, train) in STAGES.items():
+        with stage(name):
+            results[result_key] = train()
+    return results, resource_profile.collect()
+
+
+def main(parallel: bool = True):
     """Main training orchestration"""
-    results = {
-        "power_models": False,
-        "anomaly_model": False,
-        "maintenance_model": False,
-    }
+    print("=" * 70)
+    print("SOLAR PANEL EFFICIENCY OPTIMIZER - ML TRAINING PIPELINE")
+    print("=" * 70)
 
-    # Train all models
-    results["power_models"] = train_power_models()
-    results["anomaly_model"] = train_anomaly_model()
-    results["maintenance_model"] = train_maintenance_model()
+    # Train all models, profiling each stage. Stages share no state, so they run
+    # concurrently when the training budget allows at least one core per stage.
+    start = time.perf_counter()
+    cores = available_cores()[: get_budget("training")]
+    if parallel and len(cores) >= len(STAGES):
+        results, stages = run_stages_parallel(cores)
+    else:
+        apply_thread_budget("training", n_threads=len(cores))
+        results, stages = run_stages_sequential()
+    pipeline_seconds = time.perf_counter() - start
 
     # Verify files
     all_files_present = verify_models()
 
+    # Resource profile
+    print("\n" + "=" * 70)
+    print("RESOURCE PROFILE")
+    print("=" * 70)
+    profile = resource_profile.write_profile(
+        stages,
+        resource_profile.artifact_sizes(MODELS_DIR / f for f in MODEL_FILES),
+        wall_seconds=pipeline_seconds,
+    )
+    resource_profile.print_profile(profile)
+    print(f"Pipeline wall time: {pipeline_seconds:.2f}s")
+    print(f"Profile saved to {resource_profile.PROFILE_PATH}")
+
     # Summary
     print("\n" + "=" * 70)
     print("TRAINING SUMMARY")
@@ -140,5 +237,6 @@ def main():
 
 
 if __name__ == "__main__":
-    exit_code = main()
+    # Usage: python train_all_models.py [--sequential]
+    exit_code = main(parallel="--sequential" not in sys.argv[1:])
     sys.exit(exit_code)
@@ -3,15 +3,17 @@ Complete ML pipeline: Train, evaluate, calculate efficiency, and save best model
 Outputs comprehensive JSON report with all metrics and saves the best model.
 """
 
+import copy
 import json
-import joblib
 import math
 import os
+import sys
 from dataclasses import asdict, dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
@@ -19,6 +21,17 @@ from sklearn.multioutput import MultiOutputRegressor
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 
+from boosting_stages import ResidualStagesRegressor
+from compact_dtypes import (
+    FLOAT_DTYPE,
+    compact_dtypes_enabled,
+    compact_frame,
+    read_training_csv,
+)
+from model_bundle import load_bundle, write_bundle
+from resource_profile import stage
+from thread_budget import apply_thread_budget, get_budget
+
 TARGET_COLS = ["dc_power_kw", "ac_power_kw", "energy_kwh"]
 DEFAULT_DATA_FILE = os.path.join(
     os.path.dirname(__file__),
@@ -26,6 +39,12 @@ DEFAULT_DATA_FILE = os.path.join(
     "POWER_Point_Hourly_20250902_20251104_040d79N_073d95W_LST_prepared.csv",
 )
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+POWER_BUNDLE_PATH = os.path.join(MODELS_DIR, "power.bundle")
+
+# Incremental retraining defaults
+HOLDOUT_FRACTION = 0.2  # Tail of the new window held out for validation
+EXTRA_BOOSTING_ITERATIONS = 50
+EXTRA_FOREST_TREES = 10
 
 
 @dataclass
@@ -58,37 +77,76 @@ class ModelEvaluation:
     training_time: float
 
 
-def load_and_engineer(csv_path: str) -> pd.DataFrame:
-    """Load prepared data and add cyclical time features."""
-    df = pd.read_csv(csv_path)
-    if "datetime" in df.columns:
-        df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
-    df = df.sort_values("datetime") if "datetime" in df.columns else df
+def load_and_engineer(csv_path: str, compact: Optional[bool] = None) -> pd.DataFrame:
+    """
+    Load prepared data and add cyclical time features.
 
-    df = df.dropna(subset=TARGET_COLS)
+    `csv_path` may also be a synthetic corpus directory (see synthetic_corpus).
+    With compact dtypes (see compact_dtypes) features are float32 and calendar
+    fields small ints, and rows are filtered and sorted in a single copy.
+    """
+    compact = compact_dtypes_enabled(compact)
+    with stage("data_loading"):
+        if os.path.isdir(csv_path):
+            from synthetic_corpus import load_corpus
 
-    irradiance_cols = ["ghi", "dni", "dhi", "poa_global", "poa_direct", "poa_diffuse"]
-    for col in irradiance_cols:
-        if col in df.columns:
-            df[col] = df[col].clip(lower=0)
+            df = load_corpus(csv_path)
+        else:
+            df = read_training_csv(csv_path, compact, keep=TARGET_COLS)
 
-    if {"HR", "MO", "DY"}.issubset(df.columns):
-        df["hour_sin"] = np.sin(2 * math.pi * df["HR"] / 24)
-        df["hour_cos"] = np.cos(2 * math.pi * df["HR"] / 24)
-        df["month_sin"] = np.sin(2 * math.pi * df["MO"] / 12)
-        df["month_cos"] = np.cos(2 * math.pi * df["MO"] / 12)
+    with stage("feature_engineering"):
         if "datetime" in df.columns:
-            doy = df["datetime"].dt.dayofyear
-            df["doy_sin"] = np.sin(2 * math.pi * doy / 365)
-            df["doy_cos"] = np.cos(2 * math.pi * doy / 365)
+            df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
+        if compact:
+            # The rows sort_values + dropna would keep, in the same order
+            keep = df[TARGET_COLS].notna().all(axis=1).to_numpy()
+            rows = np.arange(len(df))
+            if "datetime" in df.columns:
+                rows = np.argsort(df["datetime"].values, kind="quicksort")
+            df = df.take(rows[keep[rows]])
+        else:
+            df = df.sort_values("datetime") if "datetime" in df.columns else df
+            df = df.dropna(subset=TARGET_COLS)
+
+        irradiance_cols = [
+            "ghi",
+            "dni",
+            "dhi",
+            "poa_global",
+            "poa_direct",
+            "poa_diffuse",
+        ]
+        for col in irradiance_cols:
+            if col in df.columns:
+                df[col] = df[col].clip(lower=0)
+
+        dtype = FLOAT_DTYPE if compact else np.float64
+        if {"HR", "MO", "DY"}.issubset(df.columns):
+            hour = 2 * math.pi * df["HR"].to_numpy(dtype=dtype) / 24
+            month = 2 * math.pi * df["MO"].to_numpy(dtype=dtype) / 12
+            df["hour_sin"] = np.sin(hour)
+            df["hour_cos"] = np.cos(hour)
+            df["month_sin"] = np.sin(month)
+            df["month_cos"] = np.cos(month)
+            if "datetime" in df.columns:
+                doy = df["datetime"].dt.dayofyear.to_numpy(dtype=dtype)
+                df["doy_sin"] = np.sin(2 * math.pi * doy / 365)
+                df["doy_cos"] = np.cos(2 * math.pi * doy / 365)
+        if compact:
+            compact_frame(df, keep=TARGET_COLS)
 
     return df
 
 
 def make_feature_target(df: pd.DataFrame):
     """Split into features and targets."""
-    feature_cols = [col for col in df.columns if col not in TARGET_COLS + ["datetime"]]
-    X = df[feature_cols].select_dtypes(exclude=["object"])
+    # Numeric columns picked before indexing, so X is a single copy
+    feature_cols = [
+        col
+        for col in df.columns
+        if col not in TARGET_COLS + ["datetime"] and df[col].dtype != object
+    ]
+    X = df[feature_cols]
     y = df[TARGET_COLS]
     return X, y
 
@@ -167,17 +225,10 @@ def calculate_efficiency_metrics(
     )
 
 
-def evaluate_model(
-    model, X_train, X_test, y_train, y_test
+def score_predictions(
+    y_test: pd.DataFrame, preds
 ) -> Tuple[ModelMetrics, EfficiencyMetrics, pd.DataFrame]:
-    """Train and evaluate model."""
-    import time
-
-    start = time.time()
-    model.fit(X_train, y_train)
-    training_time = time.time() - start
-
-    preds = model.predict(X_test)
+    """Compute traditional and efficiency metrics for a set of predictions."""
     preds_df = pd.DataFrame(preds, columns=TARGET_COLS)
 
     mae = {
@@ -196,6 +247,24 @@ def evaluate_model(
     metrics = ModelMetrics(mae=mae, rmse=rmse, r2=r2)
     efficiency = calculate_efficiency_metrics(y_test, preds_df)
 
+    return metrics, efficiency, preds_df
+
+
+def evaluate_model(
+    model, X_train, X_test, y_train, y_test
+) -> Tuple[ModelMetrics, EfficiencyMetrics, pd.DataFrame]:
+    """Train and evaluate model."""
+    import time
+
+    start = time.time()
+    with stage("fit"):
+        model.fit(X_train, y_train)
+    training_time = time.time() - start
+
+    with stage("predict"):
+        preds = model.predict(X_test)
+    metrics, efficiency, preds_df = score_predictions(y_test, preds)
+
     return metrics, efficiency, preds_df, training_time
 
 
@@ -233,9 +302,6 @@ def build_evaluation_report(
 
 def main(csv_path: str = DEFAULT_DATA_FILE) -> str:
     """Main training and evaluation pipeline."""
-    # Create models directory
-    os.makedirs(MODELS_DIR, exist_ok=True)
-
     print("Loading and engineering data...")
     df = load_and_engineer(csv_path)
     X, y = make_feature_target(df)
@@ -247,14 +313,15 @@ def main(csv_path: str = DEFAULT_DATA_FILE) -> str:
     test_df = df.iloc[split_idx:]
 
     print("Training models...")
-    models = build_models()
+    models = build_models(n_jobs=get_budget("training"))
     evaluations: List[ModelEvaluation] = []
 
     for name, model in models.items():
         print(f"  Training {name}...")
-        metrics, efficiency, preds_df, training_time = evaluate_model(
-            model, X_train, X_test, y_train, y_test
-        )
+        with stage(f"evaluate:{name}"):
+            metrics, efficiency, preds_df, training_time = evaluate_model(
+                model, X_train, X_test, y_train, y_test
+            )
         evaluation = build_evaluation_report(
             df, test_df, y_test, preds_df, name, metrics, efficiency, training_time
         )
@@ -273,13 +340,41 @@ def main(csv_path: str = DEFAULT_DATA_FILE) -> str:
     )
 
     # Save ALL trained models for future use
-    saved_model_paths = {}
     for name, model in models.items():
-        model.fit(X_train, y_train)  # Ensure model is trained
-        model_path = os.path.join(MODELS_DIR, f"best_model_{name}.pkl")
-        joblib.dump(model, model_path)
-        saved_model_paths[name] = model_path
-        print(f"Model {name} saved to: {model_path}")
+        with stage(f"refit:{name}"):
+            model.fit(X_train, y_train)  # Ensure model is trained
+
+    # Distill a low-latency student from the boosting teacher
+    from distill_power_model import (
+        STUDENT_COMPONENT,
+        TEACHER_COMPONENT,
+        distill_student,
+    )
+
+    print("Distilling low-latency student model...")
+    with stage("distill"):
+        student, student_report = distill_student(
+            models[TEACHER_COMPONENT], X_train, X_test, y_test
+        )
+
+    with stage("serialize"):
+        write_bundle(
+            POWER_BUNDLE_PATH,
+            "power",
+            {**models, STUDENT_COMPONENT: student} if student else models,
+            features=list(X.columns),
+            metadata={
+                "targets": TARGET_COLS,
+                "train_rows": len(X_train),
+                "best_model": best_eval.model_name,
+                "data_path": str(csv_path),
+                "student_report": student_report,
+            },
+        )
+    print(
+        f"Models {list(models)}{' and student' if student else ''} saved to: "
+        f"{POWER_BUNDLE_PATH}"
+    )
 
     # Build JSON payload with all models evaluated
     payload = {
@@ -296,7 +391,7 @@ def main(csv_path: str = DEFAULT_DATA_FILE) -> str:
             "efficiency_metrics": asdict(best_eval.efficiency),
             "training_time_seconds": best_eval.training_time,
             "sample_predictions": best_eval.sample_predictions,
-            "model_path": saved_model_paths[best_eval.model_name],
+            "model_path": POWER_BUNDLE_PATH,
         },
         "model_evaluations": [
             {
@@ -304,10 +399,11 @@ def main(csv_path: str = DEFAULT_DATA_FILE) -> str:
                 "traditional_metrics": asdict(e.metrics),
                 "efficiency_metrics": asdict(e.efficiency),
                 "training_time_seconds": e.training_time,
-                "model_path": saved_model_paths[e.model_name],
+                "model_path": POWER_BUNDLE_PATH,
             }
             for e in evaluations
         ],
+        "student_model": student_report,
     }
 
     json_output = json.dumps(payload, indent=2)
@@ -318,5 +414,238 @@ def main(csv_path: str = DEFAULT_DATA_FILE) -> str:
     return json_output
 
 
+def load_production_models() -> Dict[str, object]:
+    """Load the currently published power models."""
+    if not os.path.exists(POWER_BUNDLE_PATH):
+        raise FileNotFoundError(
+            f"Production models not found at {POWER_BUNDLE_PATH}. "
+            "Run a full training first."
+        )
+    bundle = load_bundle(POWER_BUNDLE_PATH)
+    return {name: bundle.get(name) for name in bundle.component_names()}
+
+
+def append_boosting_iterations(estimator, X_new, y_new, extra_iterations: int):
+    """
+    Continue a fitted HistGradientBoostingRegressor on a new window of data.
+
+    `warm_start` re-bins the training data on every call, so continuing on data
+    other than the original would evaluate the existing trees against the wrong
+    bins. Instead, the extra iterations are grown as a separate model on the
+    residuals of the current ensemble (exactly what warm-started iterations fit)
+    and summed with it at predict time (see boosting_stages). The fitted
+    estimator is left unchanged.
+
+    Returns:
+        ResidualStagesRegressor of the estimator's stages plus the new one
+    """
+    if isinstance(estimator, ResidualStagesRegressor):
+        staged = ResidualStagesRegressor(estimator.base, estimator.estimators_[1:])
+    else:
+        staged = ResidualStagesRegressor(estimator)
+    extra = clone(staged.base).set_params(max_iter=extra_iterations, warm_start=False)
+    extra.fit(X_new, y_new - staged.predict(X_new))
+    return staged.add_stage(extra)
+
+
+def extend_model(
+    name: str,
+    model,
+    X_new: pd.DataFrame,
+    y_new: pd.DataFrame,
+    X_full: pd.DataFrame,
+    y_full: pd.DataFrame,
+    extra_iterations: int = EXTRA_BOOSTING_ITERATIONS,
+    extra_trees: int = EXTRA_FOREST_TREES,
+):
+    """
+    Update a copy of a production model with new data.
+
+    Boosting adds `extra_iterations` rounds fitted on the new window, the forest
+    warm-starts `extra_trees` trees grown on the new window, and the linear model
+    (cheap) is refit on the full history.
+    """
+    candidate = copy.deepcopy(model)
+
+    if name == "linear_regression":
+        candidate.fit(X_full, y_full)
+        return candidate
+
+    for i, estimator in enumerate(candidate.estimators_):
+        target = y_new.iloc[:, i]
+        if name == "hist_gradient_boosting":
+            candidate.estimators_[i] = append_boosting_iterations(
+                estimator, X_new, target, extra_iterations
+            )
+        elif name == "random_forest":
+            estimator.set_params(
+                warm_start=True,
+                n_estimators=len(estimator.estimators_) + extra_trees,
+            )
+            estimator.fit(X_new, target)
+        else:
+            raise ValueError(f"Incremental update not supported for model: {name}")
+
+    return candidate
+
+
+def main_incremental(
+    new_csv_path: str,
+    history_csv_path: str = DEFAULT_DATA_FILE,
+    extra_iterations: int = EXTRA_BOOSTING_ITERATIONS,
+    extra_trees: int = EXTRA_FOREST_TREES,
+    max_r2_drop: float = 0.0,
+) -> str:
+    """
+    Incremental retraining pipeline.
+
+    Warm-starts the production models on a new window of prepared data, validates
+    each candidate against the model it replaces on the tail of the new window and
+    publishes only the candidates that do not regress.
+    """
+    import time
+
+    print("Loading production models...")
+    previous_models = load_production_models()
+    published_models = dict(previous_models)
+
+    print("Loading and engineering new data...")
+    new_df = load_and_engineer(new_csv_path)
+    X_new, y_new = make_feature_target(new_df)
+
+    # Chronological hold-out from the tail of the new window
+    split_idx = int(len(new_df) * (1 - HOLDOUT_FRACTION))
+    if split_idx == 0 or split_idx == len(new_df):
+        raise ValueError("New data window is too small to hold out a validation set")
+    X_update, X_holdout = X_new.iloc[:split_idx], X_new.iloc[split_idx:]
+    y_update, y_holdout = y_new.iloc[:split_idx], y_new.iloc[split_idx:]
+
+    # Full history is only needed for the linear refit
+    history_df = load_and_engineer(history_csv_path)
+    X_history, y_history = make_feature_target(history_df)
+    X_full = pd.concat([X_history, X_update])[X_update.columns]
+    y_full = pd.concat([y_history, y_update])
+
+    updates = []
+    for name in build_models():
+        previous = previous_models[name]
+        print(f"  Updating {name}...")
+        start = time.time()
+        candidate = extend_model(
+            name,
+            previous,
+            X_update,
+            y_update,
+            X_full,
+            y_full,
+            extra_iterations=extra_iterations,
+            extra_trees=extra_trees,
+        )
+        update_time = time.time() - start
+
+        prev_metrics, prev_efficiency, _ = score_predictions(
+            y_holdout, previous.predict(X_holdout)
+        )
+        cand_metrics, cand_efficiency, _ = score_predictions(
+            y_holdout, candidate.predict(X_holdout)
+        )
+        prev_r2 = float(np.mean([prev_metrics.r2[t] for t in TARGET_COLS]))
+        cand_r2 = float(np.mean([cand_metrics.r2[t] for t in TARGET_COLS]))
+        published = cand_r2 >= prev_r2 - max_r2_drop
+
+        if published:
+            published_models[name] = candidate
+            print(f"  ✓ {name} published (R² {prev_r2:.6f} -> {cand_r2:.6f})")
+        else:
+            print(f"  ✗ {name} kept previous model (R² {prev_r2:.6f} -> {cand_r2:.6f})")
+
+        updates.append(
+            {
+                "model_name": name,
+                "published": published,
+                "update_time_seconds": update_time,
+                "previous": {
+                    "average_r2": prev_r2,
+                    "traditional_metrics": asdict(prev_metrics),
+                    "efficiency_metrics": asdict(prev_efficiency),
+                },
+                "candidate": {
+                    "average_r2": cand_r2,
+                    "traditional_metrics": asdict(cand_metrics),
+                    "efficiency_metrics": asdict(cand_efficiency),
+                },
+            }
+        )
+
+    if any(update["published"] for update in updates):
+        metadata = dict(load_bundle(POWER_BUNDLE_PATH).metadata)
+        metadata["incremental_updates"] = metadata.get("incremental_updates", []) + [
+            {
+                "data_path": str(new_csv_path),
+                "published": [u["model_name"] for u in updates if u["published"]],
+            }
+        ]
+
+        # A republished teacher needs a freshly distilled student
+        from distill_power_model import (
+            STUDENT_COMPONENT,
+            TEACHER_COMPONENT,
+            distill_student,
+        )
+
+        teacher_update = next(
+            u for u in updates if u["model_name"] == TEACHER_COMPONENT
+        )
+        if teacher_update["published"]:
+            print("Re-distilling student from the updated teacher...")
+            student, metadata["student_report"] = distill_student(
+                published_models[TEACHER_COMPONENT], X_full, X_holdout, y_holdout
+            )
+            if student is not None:
+                published_models[STUDENT_COMPONENT] = student
+            else:
+                published_models.pop(STUDENT_COMPONENT, None)
+
+        write_bundle(
+            POWER_BUNDLE_PATH,
+            "power",
+            published_models,
+            features=list(X_new.columns),
+            metadata=metadata,
+        )
+        print(f"Updated models saved to: {POWER_BUNDLE_PATH}")
+
+    payload = {
+        "metadata": {
+            "mode": "incremental",
+            "new_rows": len(new_df),
+            "update_rows": len(X_update),
+            "holdout_rows": len(X_holdout),
+            "history_rows": len(history_df),
+            "extra_boosting_iterations": extra_iterations,
+            "extra_forest_trees": extra_trees,
+            "max_r2_drop": max_r2_drop,
+            "targets": TARGET_COLS,
+        },
+        "model_updates": updates,
+        "model_path": POWER_BUNDLE_PATH,
+    }
+
+    json_output = json.dumps(payload, indent=2)
+    print("\n" + "=" * 60)
+    print("INCREMENTAL UPDATE REPORT (JSON)")
+    print("=" * 60)
+    print(json_output)
+    return json_output
+
+
 if __name__ == "__main__":
-    main()
+    # Usage: python train_and_finalize.py [<prepared.csv | corpus_dir>]
+    #        python train_and_finalize.py incremental <new_prepared.csv>
+    apply_thread_budget("training")
+    if len(sys.argv) > 2 and sys.argv[1] == "incremental":
+        main_incremental(sys.argv[2])
+    elif len(sys.argv) > 1:
+        main(sys.argv[1])
+    else:
+        main()
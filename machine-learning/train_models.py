@@ -20,6 +20,8 @@ from sklearn.pipeline import Pipeline
 from sklearn.ensemble import HistGradientBoostingRegressor
 from sklearn.preprocessing import StandardScaler
 
+from thread_budget import apply_thread_budget, get_budget
+
 # Reusable constants
 TARGET_COLS = ["dc_power_kw", "ac_power_kw", "energy_kwh"]
 DEFAULT_DATA_FILE = os.path.join(
@@ -164,7 +166,7 @@ def main(csv_path: str = DEFAULT_DATA_FILE) -> str:
     y_train, y_test = y.iloc[:split_idx], y.iloc[split_idx:]
     test_df = df.iloc[split_idx:]
 
-    models = build_models()
+    models = build_models(n_jobs=get_budget("training"))
     reports: List[ModelReport] = []
 
     for name, model in models.items():
@@ -207,4 +209,5 @@ def main(csv_path: str = DEFAULT_DATA_FILE) -> str:
 
 
 if __name__ == "__main__":
+    apply_thread_budget("training")
     main()
@@ -0,0 +1,285 @@
+"""
+Nearest-Site Weather Interpolation
+Weather for any latitude/longitude from the sites in the weather store
+(see weather_store): inverse-distance-weighted values of the k nearest sites,
+found with a KD-tree over the sites' positions on the sphere.
+
+The tree is built when exports are added to the store and saved next to it,
+so serving only loads it. Queries are batched: thousands of points take one
+tree query and a few array operations per neighbour.
+"""
+
+import json
+import pickle
+import sys
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from geo import arc_km, chord_km, to_unit_sphere
+from weather_store import (
+    HOURS_PER_YEAR,
+    WEATHER_STORE_DIR,
+    WEATHER_VARIABLES,
+    WeatherStore,
+    load_weather_store,
+)
+
+SITES_TREE_NAME = "sites.kdtree"
+DEFAULT_NEIGHBOURS = 4
+IDW_POWER = 2.0
+# Sites further away than this are ignored; points with none get NaN (and
+# serving falls back to its latitude estimates)
+MAX_DISTANCE_KM = 300.0
+# Distances are floored at this, so a point at a site takes its values
+MIN_DISTANCE_KM = 0.01
+
+
+def _build_tree(locations: np.ndarray) -> cKDTree:
+    return cKDTree(to_unit_sphere(locations))
+
+
+def build_site_index(store_dir: Path = WEATHER_STORE_DIR) -> Path:
+    """Build the KD-tree over the store's sites and save it with the store."""
+    store = WeatherStore(store_dir)
+    path = Path(store_dir) / SITES_TREE_NAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(
+            {"locations": store.locations, "tree": _build_tree(store.locations)}, f
+        )
+    tmp_path.replace(path)
+    return path
+
+
+class SiteIndex:
+    """KD-tree over the sites of one WeatherStore, with IDW lookups."""
+
+    def __init__(self, store: WeatherStore):
+        self.store = store
+        self.tree = None
+        self._noon = None  # (sites, variables) typical noon values
+        path = store.store_dir / SITES_TREE_NAME
+        if path.exists():
+            with open(path, "rb") as f:
+                saved = pickle.load(f)
+            if np.array_equal(saved["locations"], store.locations):
+                self.tree = saved["tree"]
+        if self.tree is None:
+            # Stale or missing (e.g. a store built before the index existed)
+            print(
+                f"Site index in {store.store_dir} is out of date; run "
+                f"python weather_interpolation.py index",
+                file=sys.stderr,
+            )
+            self.tree = _build_tree(store.locations)
+
+    def neighbours(
+        self,
+        lat,
+        lon,
+        k: int = DEFAULT_NEIGHBOURS,
+        max_distance_km: float = MAX_DISTANCE_KM,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k nearest sites of each point.
+
+        Returns:
+            (distance_km, rows), each (points, k); rows is -1 (and the
+            distance inf) where fewer than k sites are within reach
+        """
+        lat, lon = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(lat, dtype=float)),
+            np.atleast_1d(np.asarray(lon, dtype=float)),
+        )
+        points = to_unit_sphere(np.column_stack([lat.ravel(), lon.ravel()]))
+        k = min(k, self.tree.n)
+        chord, rows = self.tree.query(
+            points, k=k, distance_upper_bound=chord_km(max_distance_km)
+        )
+        chord, rows = chord.reshape(len(points), k), rows.reshape(len(points), k)
+        found = np.isfinite(chord)
+        distance = np.full(chord.shape, np.inf)
+        distance[found] = arc_km(chord[found])
+        return distance, np.where(found, rows, -1)
+
+    def _weighted(
+        self, site_values: np.ndarray, rows: np.ndarray, distance: np.ndarray, power
+    ) -> np.ndarray:
+        """
+        IDW average of site_values[rows] over the neighbour axis, skipping
+        missing neighbours and NaN values. site_values is (sites, ...).
+        """
+        weights = np.where(
+            rows >= 0, np.maximum(distance, MIN_DISTANCE_KM) ** -power, 0.0
+        )
+        shape = (len(rows),) + site_values.shape[1:]
+        total = np.zeros(shape)
+        weight_sum = np.zeros(shape)
+        extra = (slice(None),) + (None,) * (site_values.ndim - 1)
+        for j in range(rows.shape[1]):
+            values = site_values[np.maximum(rows[:, j], 0)]
+            observed = ~np.isnan(values)
+            w = weights[:, j][extra] * observed
+            total += w * np.where(observed, values, 0.0)
+            weight_sum += w
+        with np.errstate(invalid="ignore"):
+            return np.where(weight_sum > 0, total / weight_sum, np.nan)
+
+    def interpolate(
+        self,
+        lat,
+        lon,
+        hours: Optional[Sequence[int]] = None,
+        k: int = DEFAULT_NEIGHBOURS,
+        power: float = IDW_POWER,
+        max_distance_km: float = MAX_DISTANCE_KM,
+    ) -> np.ndarray:
+        """
+        Hourly weather at each point.
+
+        Args:
+            lat, lon: Point coordinates (scalars or arrays)
+            hours: Hours of the year to return (default: all 8760; pass a
+                subset for large batches, the result is points x hours x
+                variables)
+
+        Returns:
+            (points, hours, variables) array in store.variables order
+        """
+        distance, rows = self.neighbours(lat, lon, k, max_distance_km)
+        hours = np.arange(HOURS_PER_YEAR) if hours is None else np.asarray(hours)
+        # Read each site in reach once, whatever the number of points
+        used, positions = np.unique(rows[rows >= 0], return_inverse=True)
+        local = np.full(rows.shape, -1)
+        local[rows >= 0] = positions
+        site_values = np.full(
+            (max(len(used), 1), len(hours), len(self.store.variables)), np.nan
+        )
+        for i, row in enumerate(used):
+            site_values[i] = self.store.values[row][hours]
+        return self._weighted(site_values, local, distance, power)
+
+    def midday(
+        self,
+        lat,
+        lon,
+        k: int = DEFAULT_NEIGHBOURS,
+        power: float = IDW_POWER,
+        max_distance_km: float = MAX_DISTANCE_KM,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Typical local-noon value of every variable at each point, shaped like
+        the broadcast lat/lon; NaN where no site is within reach.
+        """
+        shape = np.broadcast(np.asarray(lat), np.asarray(lon)).shape
+        distance, rows = self.neighbours(lat, lon, k, max_distance_km)
+        if self._noon is None:
+            self._noon = np.array(
+                [self.store.midday(row) for row in range(len(self.store.rows))]
+            )
+        out = self._weighted(self._noon, rows, distance, power)
+        return {
+            name: out[:, v].reshape(shape)
+            for v, name in enumerate(self.store.variables)
+        }
+
+
+_cache: Dict[str, tuple] = {}
+
+
+def load_site_index(store_dir: Path = WEATHER_STORE_DIR) -> Optional[SiteIndex]:
+    """
+    Site index of the store at store_dir (None if no store has been built),
+    kept in process until the store changes.
+    """
+    store = load_weather_store(store_dir)
+    if store is None or not store.rows:
+        return None
+    key = str(Path(store_dir).resolve())
+    cached = _cache.get(key)
+    if cached is None or cached[0] is not store:
+        cached = (store, SiteIndex(store))
+        _cache[key] = cached
+    return cached[1]
+
+
+def midday_climate(lat, lon) -> Dict[str, np.ndarray]:
+    """Typical noon climate at each point from the default store ({} if none)."""
+    index = load_site_index()
+    return {} if index is None else index.midday(lat, lon)
+
+
+def interpolated_export(lat: float, lon: float, year: int = 2025) -> pd.DataFrame:
+    """
+    Weather at one point shaped like a NASA POWER hourly export (YEAR, MO,
+    DY, HR and the POWER columns), over the hours with data for every
+    variable, so main.prepare_ml_training_data can prepare training data for
+    a site without its own export.
+    """
+    index = load_site_index()
+    if index is None:
+        raise FileNotFoundError(
+            f"No weather store in {WEATHER_STORE_DIR}; run python weather_store.py build"
+        )
+    values = index.interpolate(lat, lon)[0]
+    keep = ~np.isnan(values).any(axis=1)
+    hours = np.flatnonzero(keep)
+    # The store's year has 365 days
+    times = pd.Timestamp(year=2025, month=1, day=1) + pd.to_timedelta(hours, unit="h")
+    df = pd.DataFrame(
+        {
+            "YEAR": year,
+            "MO": times.month,
+            "DY": times.day,
+            "HR": times.hour,
+        }
+    )
+    for v, name in enumerate(index.store.variables):
+        df[WEATHER_VARIABLES[name]] = np.round(values[keep, v], 2)
+    return df
+
+
+def main():
+    """
+    CLI:
+      python weather_interpolation.py index
+          Rebuild the saved site index of the weather store
+      python weather_interpolation.py lookup lat lon
+          Print the interpolated typical noon climate at a point
+      python weather_interpolation.py export lat lon output.csv [year]
+          Write interpolated hourly weather at a point as a POWER-style CSV
+          (input for main.prepare_ml_training_data)
+    """
+    args = sys.argv[1:]
+    if not args or args[0] not in ("index", "lookup", "export"):
+        print(main.__doc__)
+        sys.exit(1)
+
+    if args[0] == "index":
+        print(f"Site index written to {build_site_index()}")
+        return
+
+    lat, lon = float(args[1]), float(args[2])
+    if args[0] == "lookup":
+        climate = midday_climate(lat, lon)
+        print(
+            json.dumps(
+                {
+                    name: None if np.isnan(value) else float(value)
+                    for name, value in climate.items()
+                }
+            )
+        )
+        return
+
+    df = interpolated_export(lat, lon, int(args[4]) if len(args) > 4 else 2025)
+    df.to_csv(args[3], index=False)
+    print(f"{len(df)} hours written to {args[3]}")
+
+
+if __name__ == "__main__":
+    main()
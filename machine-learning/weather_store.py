@@ -0,0 +1,373 @@
+"""
+Gridded Weather Store
+Typical-year hourly climate per grid cell, built offline from NASA POWER
+hourly point exports (like the one in dataForML/), so serving can use the
+climate at a site instead of latitude rules of thumb.
+
+Values live in one float32 file laid out as (cell, hour of year, variable)
+and are read through np.memmap: a site's year is one contiguous slice, with
+no CSV parsing at serving time. Hours without data are NaN. Builds are
+incremental: new cells are appended to the file, and exports for a cell that
+is already stored are folded into its hourly means.
+"""
+
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+MODELS_DIR = Path(__file__).parent / "models"
+DATA_DIR = Path(__file__).parent / "dataForML"
+WEATHER_STORE_DIR = Path(
+    os.environ.get("SOLAR_ML_WEATHER_STORE", MODELS_DIR / "weather_store")
+)
+INDEX_NAME = "index.json"
+VALUES_NAME = "climate.f32"  # float32 (cell, hour, variable) hourly means
+COUNTS_NAME = "counts.u16"  # uint16 (cell, hour, variable) observations
+
+GRID_RESOLUTION_DEG = 0.5
+HOURS_PER_YEAR = 8760
+# Store variable -> NASA POWER column (the renames of main.prepare_ml_training_data)
+WEATHER_VARIABLES = {
+    "ghi": "ALLSKY_SFC_SW_DWN",
+    "dni": "ALLSKY_SFC_SW_DNI",
+    "dhi": "ALLSKY_SFC_SW_DIFF",
+    "temp_air": "T2M",
+    "wind_speed": "WS10M",
+    "humidity": "QV2M",
+}
+POWER_FILL_VALUE = -999.0
+# Coordinates in POWER export names, e.g. ..._040d79N_073d95W_LST.csv
+EXPORT_NAME_PATTERN = re.compile(r"_(\d+)d(\d+)([NS])_(\d+)d(\d+)([EW])_")
+
+
+def cell_keys(lat, lon, resolution: float = GRID_RESOLUTION_DEG) -> np.ndarray:
+    """(n, 2) integer grid cell of each coordinate."""
+    lat = np.atleast_1d(np.asarray(lat, dtype=float))
+    lon = np.atleast_1d(np.asarray(lon, dtype=float))
+    lat, lon = np.broadcast_arrays(lat, lon)
+    return np.column_stack(
+        [
+            np.floor((np.clip(lat, -90, 89.999) + 90) / resolution),
+            np.floor((np.mod(lon + 180, 360)) / resolution),
+        ]
+    ).astype(np.int64)
+
+
+def export_location(path: Path) -> Optional[Tuple[float, float]]:
+    """Latitude/longitude of a POWER export from its header or file name."""
+    path = Path(path)
+    with open(path) as f:
+        first = f.readline()
+        if first.startswith("-BEGIN HEADER-"):
+            for line in f:
+                match = re.search(
+                    r"Latitude\s+(-?[\d.]+)\s+Longitude\s+(-?[\d.]+)", line
+                )
+                if match:
+                    return float(match.group(1)), float(match.group(2))
+                if line.startswith("-END HEADER-"):
+                    break
+
+    match = EXPORT_NAME_PATTERN.search(path.name)
+    if match is None:
+        return None
+    lat = float(f"{match.group(1)}.{match.group(2)}")
+    lon = float(f"{match.group(4)}.{match.group(5)}")
+    return (
+        -lat if match.group(3) == "S" else lat,
+        -lon if match.group(6) == "W" else lon,
+    )
+
+
+def read_export(path: Path, lon: float) -> pd.DataFrame:
+    """
+    Hourly POWER export as an "hour" (of a 365-day local solar time year)
+    column plus one column per store variable, NaN where POWER has no value.
+    """
+    path = Path(path)
+    header_lines = 0
+    with open(path) as f:
+        if f.readline().startswith("-BEGIN HEADER-"):
+            header_lines = 1
+            for line in f:
+                header_lines += 1
+                if line.startswith("-END HEADER-"):
+                    break
+    df = pd.read_csv(path, skiprows=header_lines)
+
+    missing = [c for c in WEATHER_VARIABLES.values() if c not in df.columns]
+    if missing:
+        raise ValueError(f"{path.name} has no {missing} columns")
+
+    # Hour of a non-leap year; 29 February is dropped
+    days = pd.to_datetime(
+        pd.DataFrame({"year": 2025, "month": df["MO"], "day": df["DY"]}),
+        errors="coerce",
+    )
+    hour = (days.dt.dayofyear.to_numpy() - 1) * 24 + df["HR"].to_numpy()
+    if "_UTC" in path.name:
+        hour = hour + int(round(lon / 15))  # Local solar time, as LST exports
+    keep = ~days.isna().to_numpy()
+
+    values = df[list(WEATHER_VARIABLES.values())].to_numpy(dtype=float)
+    values[values == POWER_FILL_VALUE] = np.nan
+    out = pd.DataFrame(values[keep], columns=list(WEATHER_VARIABLES))
+    out.insert(0, "hour", np.mod(hour[keep], HOURS_PER_YEAR).astype(np.int64))
+    return out
+
+
+def _hourly_sums(export: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """(hours, variables) sums and observation counts of one export."""
+    sums = np.zeros((HOURS_PER_YEAR, len(WEATHER_VARIABLES)))
+    counts = np.zeros((HOURS_PER_YEAR, len(WEATHER_VARIABLES)), dtype=np.int64)
+    values = export[list(WEATHER_VARIABLES)].to_numpy()
+    observed = ~np.isnan(values)
+    hours = export["hour"].to_numpy()
+    for v in range(values.shape[1]):
+        np.add.at(sums[:, v], hours[observed[:, v]], values[observed[:, v], v])
+        np.add.at(counts[:, v], hours[observed[:, v]], 1)
+    return sums, counts
+
+
+def _cell_locations(index: Dict) -> np.ndarray:
+    """
+    (cells, 2) latitude/longitude of the site each cell's data came from
+    (the cell centre for stores built before sites were recorded).
+    """
+    cells = np.array(index["cells"], dtype=float).reshape(-1, 2)
+    centres = np.column_stack(
+        [
+            (cells[:, 0] + 0.5) * index["resolution"] - 90,
+            (cells[:, 1] + 0.5) * index["resolution"] - 180,
+        ]
+    )
+    recorded = np.array(index.get("locations", []), dtype=float).reshape(-1, 2)
+    return np.vstack([recorded, centres[len(recorded) :]])
+
+
+def _read_index(store_dir: Path) -> Dict:
+    path = store_dir / INDEX_NAME
+    if not path.exists():
+        return {
+            "resolution": GRID_RESOLUTION_DEG,
+            "hours": HOURS_PER_YEAR,
+            "variables": list(WEATHER_VARIABLES),
+            "cells": [],
+            "locations": [],
+            "sources": [],
+        }
+    with open(path) as f:
+        return json.load(f)
+
+
+class WeatherStore:
+    """Read-only view of a built store."""
+
+    def __init__(self, store_dir: Path = WEATHER_STORE_DIR):
+        self.store_dir = Path(store_dir)
+        self.index = _read_index(self.store_dir)
+        self.resolution = self.index["resolution"]
+        self.variables = self.index["variables"]
+        self.rows = {tuple(cell): row for row, cell in enumerate(self.index["cells"])}
+        self.locations = _cell_locations(self.index)
+        shape = (len(self.rows), self.index["hours"], len(self.variables))
+        self.values = (
+            np.memmap(self.store_dir / VALUES_NAME, np.float32, "r", shape=shape)
+            if self.rows
+            else np.full(shape, np.nan, dtype=np.float32)
+        )
+        self._midday: Dict[int, np.ndarray] = {}
+
+    def row(self, lat: float, lon: float) -> Optional[int]:
+        return self.rows.get(tuple(cell_keys(lat, lon, self.resolution)[0]))
+
+    def climate(self, lat: float, lon: float) -> Optional[np.ndarray]:
+        """(hours, variables) typical year of the cell holding lat/lon."""
+        row = self.row(lat, lon)
+        return None if row is None else self.values[row]
+
+    def midday(self, row: int) -> np.ndarray:
+        """
+        Typical local-noon value of every variable in a stored cell (mean of
+        its stored noon hours; NaN for variables it has none of).
+        """
+        if row not in self._midday:
+            noon = np.asarray(self.values[row, 12::24], dtype=np.float64)
+            observed = ~np.isnan(noon)
+            with np.errstate(invalid="ignore"):
+                self._midday[row] = np.where(
+                    observed.any(axis=0),
+                    np.where(observed, noon, 0).sum(axis=0) / observed.sum(axis=0),
+                    np.nan,
+                )
+        return self._midday[row]
+
+
+_cache: Dict[str, tuple] = {}
+
+
+def load_weather_store(store_dir: Path = WEATHER_STORE_DIR) -> Optional[WeatherStore]:
+    """
+    The store at store_dir, or None if none has been built. The in-process
+    copy is reused until a build rewrites the index.
+    """
+    path = Path(store_dir) / INDEX_NAME
+    if not path.exists():
+        return None
+    stat = path.stat()
+    key = str(path.resolve())
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(key)
+    if cached is None or cached[0] != signature:
+        cached = (signature, WeatherStore(store_dir))
+        _cache[key] = cached
+    return cached[1]
+
+
+def add_exports(
+    paths: Iterable[Path],
+    store_dir: Path = WEATHER_STORE_DIR,
+    locations: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> Dict:
+    """
+    Fold POWER hourly exports into the store, creating it if needed.
+
+    Args:
+        paths: Export CSVs; exports already recorded in the store are skipped
+        store_dir: Store directory
+        locations: Optional {path: (lat, lon)} for exports whose header and
+            file name do not give their location
+
+    Returns:
+        Dict with the cells added and updated
+    """
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    index = _read_index(store_dir)
+    if index["variables"] != list(WEATHER_VARIABLES):
+        raise ValueError(
+            f"Store in {store_dir} holds {index['variables']}; rebuild it to "
+            f"store {list(WEATHER_VARIABLES)}"
+        )
+    resolution = index["resolution"]
+    rows = {tuple(cell): row for row, cell in enumerate(index["cells"])}
+    site_locations = _cell_locations(index).tolist()
+    sources = set(index["sources"])
+
+    # Per-cell sums and counts of this build's exports
+    pending: Dict[Tuple[int, int], List[np.ndarray]] = {}
+    skipped = []
+    for path in paths:
+        path = Path(path)
+        if path.name in sources:
+            skipped.append(path.name)
+            continue
+        location = (locations or {}).get(str(path)) or export_location(path)
+        if location is None:
+            raise ValueError(f"No location for {path.name}; pass it in locations")
+        sums, counts = _hourly_sums(read_export(path, location[1]))
+        cell = tuple(int(k) for k in cell_keys(*location, resolution)[0])
+        if cell in pending:
+            pending[cell][0] += sums
+            pending[cell][1] += counts
+        else:
+            pending[cell] = [sums, counts, list(location)]
+        sources.add(path.name)
+        print(f"  {path.name}: cell {cell} ({int(counts[:, 0].sum())} hours)")
+
+    shape = (HOURS_PER_YEAR, len(WEATHER_VARIABLES))
+    updated = [cell for cell in pending if cell in rows]
+    added = [cell for cell in pending if cell not in rows]
+
+    if updated:
+        n = len(rows)
+        values = np.memmap(
+            store_dir / VALUES_NAME, np.float32, "r+", shape=(n,) + shape
+        )
+        counts = np.memmap(store_dir / COUNTS_NAME, np.uint16, "r+", shape=(n,) + shape)
+        for cell in updated:
+            row = rows[cell]
+            new_sums, new_counts, _ = pending[cell]
+            old_counts = counts[row].astype(np.int64)
+            total = old_counts + new_counts
+            old_sums = np.where(old_counts > 0, values[row], 0) * old_counts
+            with np.errstate(invalid="ignore"):
+                values[row] = np.where(total > 0, (old_sums + new_sums) / total, np.nan)
+            counts[row] = np.minimum(total, np.iinfo(np.uint16).max)
+        values.flush()
+        counts.flush()
+        del values, counts
+
+    # New cells go at the end of the files, so existing rows never move
+    with open(store_dir / VALUES_NAME, "ab") as values_file, open(
+        store_dir / COUNTS_NAME, "ab"
+    ) as counts_file:
+        for cell in added:
+            sums, counts, location = pending[cell]
+            with np.errstate(invalid="ignore"):
+                means = np.where(counts > 0, sums / counts, np.nan)
+            values_file.write(means.astype(np.float32).tobytes())
+            counts_file.write(np.minimum(counts, 65535).astype(np.uint16).tobytes())
+            rows[cell] = len(rows)
+            site_locations.append(location)
+
+    # Readers map as many cells as the index lists, so it is written last
+    index["cells"] = [
+        list(cell) for cell, _ in sorted(rows.items(), key=lambda x: x[1])
+    ]
+    index["locations"] = site_locations
+    index["sources"] = sorted(sources)
+    tmp_path = store_dir / (INDEX_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, store_dir / INDEX_NAME)
+
+    from weather_interpolation import build_site_index
+
+    build_site_index(store_dir)
+
+    return {
+        "store": str(store_dir),
+        "cells": len(rows),
+        "cells_added": [list(c) for c in added],
+        "cells_updated": [list(c) for c in updated],
+        "skipped_exports": skipped,
+    }
+
+
+def default_exports(data_dir: Path = DATA_DIR) -> List[Path]:
+    """Raw POWER hourly exports in data_dir (prepared CSVs excluded)."""
+    return sorted(
+        p
+        for p in Path(data_dir).glob("POWER_Point_Hourly_*.csv")
+        if not p.stem.endswith("_prepared")
+    )
+
+
+def main():
+    """
+    CLI:
+      python weather_store.py build [export.csv | directory ...]
+          Add exports (default: dataForML/) to the store
+    Lookups for arbitrary sites are in weather_interpolation.
+    """
+    args = sys.argv[1:]
+    if not args or args[0] != "build":
+        print(main.__doc__)
+        sys.exit(1)
+
+    paths = []
+    for arg in args[1:] or [str(DATA_DIR)]:
+        paths += default_exports(arg) if os.path.isdir(arg) else [Path(arg)]
+    print(f"Adding {len(paths)} export(s) to {WEATHER_STORE_DIR}")
+    print(json.dumps(add_exports(paths), indent=2))
+
+
+if __name__ == "__main__":
+    main()
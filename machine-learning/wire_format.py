@@ -0,0 +1,152 @@
+"""
+Service Wire Formats
+Alternative request/response encodings for the stdin/stdout ML services, for
+large batches where building and parsing one JSON object per row costs more
+than the model itself.
+
+Formats (selected with --format, default "json"):
+  - json: The original row-oriented format, e.g.
+        {"sensor_data": [{"ghi": 800, "dni": 600}, ...]}
+  - columnar: JSON with one array per field instead of one object per row,
+        {"sensor_data": {"ghi": [800, ...], "dni": [600, ...]}}
+    Responses carry their per-row results the same way.
+  - binary: A length-prefixed frame whose columns are NumPy .npy payloads:
+        MAGIC (4 bytes) | header length (uint32) | header JSON
+        | per column: payload length (uint64) | .npy bytes
+    The header holds the column names and every non-columnar field (e.g.
+    totals and model_info). Errors are always written as plain JSON, so a
+    reader can tell them apart by the missing MAGIC.
+"""
+
+import io
+import json
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+FORMATS = ("json", "columnar", "binary")
+DEFAULT_FORMAT = "json"
+
+FRAME_MAGIC = b"SOLW"
+_HEADER_LENGTH = struct.Struct("<I")
+_PAYLOAD_LENGTH = struct.Struct("<Q")
+
+
+def parse_format_flag(argv: List[str]) -> Tuple[str, List[str]]:
+    """
+    Extract "--format <name>" / "--format=<name>" from argv.
+
+    Returns:
+        (format, argv without the flag)
+    """
+    fmt = DEFAULT_FORMAT
+    remaining = []
+    args = iter(argv)
+    for arg in args:
+        if arg == "--format":
+            fmt = next(args, DEFAULT_FORMAT)
+        elif arg.startswith("--format="):
+            fmt = arg.split("=", 1)[1]
+        else:
+            remaining.append(arg)
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown wire format: {fmt}. Use one of {FORMATS}")
+    return fmt, remaining
+
+
+def encode_frame(columns: Dict[str, np.ndarray], meta: Optional[Dict] = None) -> bytes:
+    """Encode named arrays (plus JSON-serializable metadata) as a binary frame."""
+    header = json.dumps({"columns": list(columns), "meta": meta or {}}).encode("utf-8")
+    parts = [FRAME_MAGIC, _HEADER_LENGTH.pack(len(header)), header]
+    for values in columns.values():
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(values), allow_pickle=False)
+        payload = buffer.getvalue()
+        parts.append(_PAYLOAD_LENGTH.pack(len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def decode_frame(data: bytes) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """
+    Decode a binary frame.
+
+    Returns:
+        (columns, meta) where columns maps each name to its NumPy array
+    """
+    if data[: len(FRAME_MAGIC)] != FRAME_MAGIC:
+        raise ValueError("Input is not a binary wire frame")
+    view = memoryview(data)
+    offset = len(FRAME_MAGIC)
+    (header_length,) = _HEADER_LENGTH.unpack_from(view, offset)
+    offset += _HEADER_LENGTH.size
+    header = json.loads(bytes(view[offset : offset + header_length]))
+    offset += header_length
+
+    columns = {}
+    for name in header["columns"]:
+        (length,) = _PAYLOAD_LENGTH.unpack_from(view, offset)
+        offset += _PAYLOAD_LENGTH.size
+        if offset + length > len(data):
+            raise ValueError(f"Binary wire frame is truncated in column '{name}'")
+        columns[name] = np.load(
+            io.BytesIO(view[offset : offset + length]), allow_pickle=False
+        )
+        offset += length
+    return columns, header["meta"]
+
+
+def read_request(fmt: str, data_key: str, stdin=None) -> Dict:
+    """
+    Read a service request from stdin.
+
+    For the columnar and binary formats, request[data_key] is a dict of NumPy
+    arrays (one per field) rather than a list of row objects. Both are
+    accepted by pd.DataFrame, so services can handle either.
+    """
+    stdin = stdin or sys.stdin
+    if fmt == "binary":
+        columns, meta = decode_frame(stdin.buffer.read())
+        return {**meta, data_key: columns}
+
+    request = json.loads(stdin.read())
+    if fmt == "columnar" and isinstance(request.get(data_key), dict):
+        request[data_key] = {
+            name: np.asarray(values) for name, values in request[data_key].items()
+        }
+    return request
+
+
+def _json_column(values) -> List:
+    """Array as a JSON-safe list (NaN, e.g. an unscored reading, becomes null)."""
+    values = np.asarray(values)
+    if values.dtype.kind == "f" and np.isnan(values).any():
+        return [None if np.isnan(v) else v for v in values.tolist()]
+    return values.tolist()
+
+
+def write_response(result: Dict, fmt: str, results_key: str = "results", stdout=None):
+    """
+    Write a service response.
+
+    In the columnar and binary formats result[results_key] must be a dict of
+    per-row arrays; json keeps the original indented row-oriented output.
+    """
+    stdout = stdout or sys.stdout
+    if fmt == "json" or results_key not in result:
+        stdout.write(json.dumps(result, indent=2) + "\n")
+    elif fmt == "columnar":
+        columns = {
+            name: _json_column(values) for name, values in result[results_key].items()
+        }
+        stdout.write(
+            json.dumps({**result, results_key: columns}, separators=(",", ":")) + "\n"
+        )
+    else:
+        meta = {key: value for key, value in result.items() if key != results_key}
+        stdout.flush()
+        stdout.buffer.write(encode_frame(result[results_key], meta))
+        stdout.buffer.flush()
@@ -5,4 +5,6 @@ module.exports = {
   MONGO_URI: process.env.MONGO_URI,
   NODE_ENV: process.env.NODE_ENV || 'development',
   JWT_SECRET: process.env.JWT_SECRET,
+  // Unix socket of machine-learning/ml_gateway.py; unset = spawn per request
+  ML_GATEWAY_SOCKET: process.env.ML_GATEWAY_SOCKET,
 };
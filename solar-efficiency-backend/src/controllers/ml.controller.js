@@ -1,6 +1,7 @@
 const fs = require('fs');
 const path = require('path');
 const { spawn } = require('child_process');
+const mlGateway = require('../utils/mlGatewayClient');
 
 /**
  * Predict solar power output using the trained ML model
@@ -20,8 +21,20 @@ exports.predict = async (req, res, next) => {
 
 /**
  * Helper function to call Python ML service
+ * Goes through the ML gateway when ML_GATEWAY_SOCKET is set, falling back to
+ * spawning the script if the gateway cannot be reached
  */
 function callPythonService(scriptName, inputData) {
+  if (mlGateway.isEnabled(scriptName)) {
+    return mlGateway.callGateway(scriptName, inputData).catch((error) => {
+      console.error(`${error.message}; spawning ${scriptName} instead`);
+      return spawnPythonService(scriptName, inputData);
+    });
+  }
+  return spawnPythonService(scriptName, inputData);
+}
+
+function spawnPythonService(scriptName, inputData) {
   return new Promise((resolve, reject) => {
     const pythonScriptPath = path.join(__dirname, '..', '..', '..', 'machine-learning', scriptName);
     
@@ -140,3 +153,48 @@ exports.predictMaintenance = async (req, res, next) => {
     });
   }
 };
+
+/**
+ * Plan cleaning crew routes for panels that need cleaning
+ * POST /api/ml/maintenance-routes
+ * Body: { panel_data: [{panel_id, latitude, longitude, days_since_cleaning, ...}, ...],
+ *         crew_size?: 25, max_distance_km?: 10 }
+ */
+exports.planMaintenanceRoutes = async (req, res, next) => {
+  try {
+    const { panel_data, crew_size, max_distance_km } = req.body;
+    
+    if (!panel_data || !Array.isArray(panel_data) || panel_data.length === 0) {
+      return res.status(400).json({
+        success: false,
+        message: 'panel_data array is required with coordinates and maintenance fields'
+      });
+    }
+    
+    const input = { panel_data };
+    if (crew_size !== undefined) input.crew_size = crew_size;
+    if (max_distance_km !== undefined) input.max_distance_km = max_distance_km;
+    
+    const result = await callPythonService('route_planner.py', input);
+    
+    if (result.error) {
+      return res.status(400).json({
+        success: false,
+        message: result.error,
+        details: result
+      });
+    }
+    
+    return res.status(200).json({
+      success: true,
+      data: result
+    });
+  } catch (error) {
+    console.error('Error planning maintenance routes:', error);
+    return res.status(500).json({
+      success: false,
+      message: 'Failed to plan maintenance routes',
+      error: error.message
+    });
+  }
+};
@@ -11,4 +11,7 @@ router.post('/anomaly-detect', controller.detectAnomalies);
 // Predict maintenance needs
 router.post('/maintenance-predict', controller.predictMaintenance);
 
+// Plan cleaning crew routes
+router.post('/maintenance-routes', controller.planMaintenanceRoutes);
+
 module.exports = router;
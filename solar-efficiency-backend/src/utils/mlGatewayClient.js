@@ -0,0 +1,106 @@
+/**
+ * Client for the local ML gateway (machine-learning/ml_gateway.py)
+ * Sends requests over one shared Unix socket as newline-delimited JSON and
+ * matches responses to callers by id, so concurrent requests can be batched
+ * by the gateway instead of each spawning a Python process.
+ */
+
+const net = require('net');
+const { ML_GATEWAY_SOCKET } = require('../config/env');
+
+const REQUEST_TIMEOUT_MS = 30000;
+
+// Gateway service hosting each ML script
+const SCRIPT_SERVICES = {
+  'predict_service.py': 'predict',
+  'anomaly_detector.py': 'anomaly',
+  'maintenance_predictor.py': 'maintenance'
+};
+
+let socket = null;
+let buffered = '';
+let nextId = 1;
+const pending = new Map();
+
+function failPending(error) {
+  for (const { reject, timer } of pending.values()) {
+    clearTimeout(timer);
+    reject(error);
+  }
+  pending.clear();
+}
+
+function handleLine(line) {
+  let response;
+  try {
+    response = JSON.parse(line);
+  } catch (error) {
+    console.error(`Invalid ML gateway response: ${error.message}`);
+    return;
+  }
+
+  const request = pending.get(response.id);
+  if (!request) return;
+  pending.delete(response.id);
+  clearTimeout(request.timer);
+  request.resolve(response.result);
+}
+
+function connect() {
+  if (socket) return socket;
+
+  socket = net.createConnection(ML_GATEWAY_SOCKET);
+  socket.setEncoding('utf8');
+
+  socket.on('data', (chunk) => {
+    buffered += chunk;
+    let newline;
+    while ((newline = buffered.indexOf('\n')) !== -1) {
+      const line = buffered.slice(0, newline);
+      buffered = buffered.slice(newline + 1);
+      if (line.trim()) handleLine(line);
+    }
+  });
+
+  socket.on('error', (error) => {
+    failPending(new Error(`ML gateway unavailable: ${error.message}`));
+  });
+
+  socket.on('close', () => {
+    socket = null;
+    buffered = '';
+    failPending(new Error('ML gateway connection closed'));
+  });
+
+  return socket;
+}
+
+/**
+ * Whether calls to scriptName should go through the gateway
+ */
+function isEnabled(scriptName) {
+  return Boolean(ML_GATEWAY_SOCKET) && scriptName in SCRIPT_SERVICES;
+}
+
+/**
+ * Send the stdin payload of scriptName to the gateway
+ * Resolves with what the script would have printed
+ */
+function callGateway(scriptName, inputData) {
+  return new Promise((resolve, reject) => {
+    const id = nextId++;
+    const timer = setTimeout(() => {
+      pending.delete(id);
+      reject(new Error('ML gateway request timed out'));
+    }, REQUEST_TIMEOUT_MS);
+
+    pending.set(id, { resolve, reject, timer });
+    connect().write(JSON.stringify({
+      id,
+      service: SCRIPT_SERVICES[scriptName],
+      payload: inputData
+    }) + '\n');
+  });
+}
+
+module.exports = { isEnabled, callGateway };